@@ -0,0 +1,114 @@
+"""
+Benchmark contraction hierarchy routing against bounded CSR Dijkstra searches
+
+Builds a perturbed grid road network (jittered nodes, 10% of the edges
+removed) with random villages and shelters, then times for every village:
+
+- the paths to all shelters: CSRGraph.dijkstra with the distance limit
+  RouteFinder uses versus one ContractionHierarchy.one_to_many query over the
+  shelter buckets, with its paths unpacked
+- RouteFinder.find_best_routes with the csr backend versus a hierarchy file
+
+Run from the repository root:
+
+    python -m benchmarks.route_hierarchy --grid 150 --villages 200 --shelters 50
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from src.route_finder import RouteFinder
+
+
+def write_grid_network(directory, size, n_villages, n_shelters, seed=0):
+    """Write roads, villages and shelters GeoJSON files of a perturbed grid network"""
+    rng = np.random.default_rng(seed)
+    coords = np.indices((size, size)).reshape(2, -1).T[:, ::-1] * 1e-3 + (106.8, -6.2)
+    coords += rng.normal(0, 1e-4, coords.shape)
+    index = np.arange(size * size).reshape(size, size)
+    source = np.concatenate((index[:, :-1].ravel(), index[:-1, :].ravel()))
+    target = np.concatenate((index[:, 1:].ravel(), index[1:, :].ravel()))
+    keep = rng.random(len(source)) > 0.1
+    source, target = source[keep], target[keep]
+
+    roads = gpd.GeoDataFrame({
+        'highway': rng.choice(['primary', 'secondary', 'residential', 'service', 'path'], len(source)),
+        'flood_risk': rng.random(len(source))
+    }, geometry=shapely.linestrings(np.stack((coords[source], coords[target]), axis=1)), crs='EPSG:4326')
+
+    def squares(count, prefix):
+        centres = coords[rng.choice(len(coords), count, replace=False)] + 2e-4
+        return gpd.GeoDataFrame({'name': [f'{prefix} {i}' for i in range(count)]},
+                                geometry=shapely.box(*(centres - 1e-4).T, *(centres + 1e-4).T),
+                                crs='EPSG:4326')
+
+    paths = [os.path.join(directory, name) for name in ('roads.geojson', 'villages.geojson', 'shelters.geojson')]
+    roads.to_file(paths[0])
+    squares(n_villages, 'Village').to_file(paths[1])
+    squares(n_shelters, 'Shelter').to_file(paths[2])
+    return paths
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark contraction hierarchy routing')
+    parser.add_argument('--grid', type=int, default=150, help='Grid side in nodes (default: 150)')
+    parser.add_argument('--villages', type=int, default=200, help='Number of villages (default: 200)')
+    parser.add_argument('--shelters', type=int, default=50, help='Number of shelters (default: 50)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_grid_network(directory, args.grid, args.villages, args.shelters)
+        hierarchy_file = os.path.join(directory, 'roads.ch.npz')
+
+        csr, csr_setup = timed(RouteFinder, *paths, backend='csr')
+        ch, ch_setup = timed(RouteFinder, *paths, backend='csr', hierarchy=hierarchy_file)
+        _, ch_reload = timed(RouteFinder, *paths, backend='csr', hierarchy=hierarchy_file)
+        print(f"Network: {csr.graph.number_of_nodes()} nodes, {csr.graph.number_of_edges()} edges, "
+              f"{len(csr.villages)} villages, {len(csr.shelter_targets)} shelters")
+        print(f"Setup: csr {csr_setup:.2f} s, hierarchy build + customize {ch_setup:.2f} s, "
+              f"hierarchy reload {ch_reload:.2f} s")
+
+        # Search alone: distances and node paths to every shelter
+        shelters = np.array([node for node, _ in csr.shelter_targets])
+        csr_distances, csr_search = [], 0.0
+        ch_distances, ch_search = [], 0.0
+        for village_node in csr.village_nodes:
+            _, seconds = timed(csr._csr_paths_to_targets, village_node, shelters)
+            csr_search += seconds
+            dist, _ = csr.graph.dijkstra(village_node)
+            csr_distances.append(dist[shelters])
+            start = time.perf_counter()
+            distances, hop_paths = ch.hierarchy.one_to_many(ch._to_hierarchy[village_node], ch._shelter_buckets)
+            ch.hierarchy.unpack([path for path in hop_paths if path is not None])
+            ch_search += time.perf_counter() - start
+            ch_distances.append(distances)
+        assert np.allclose(csr_distances, ch_distances), "Hierarchy distances differ from Dijkstra"
+
+        csr_routes, csr_time = timed(csr.find_best_routes)
+        ch_routes, ch_time = timed(ch.find_best_routes)
+        assert (csr_routes['shelter_name'].values == ch_routes['shelter_name'].values).all(), \
+            "Hierarchy routes differ from CSR routes"
+
+        n = len(csr.villages)
+        print(f"Paths to all shelters per village: csr dijkstra with limit {csr_search / n * 1e3:.2f} ms, "
+              f"hierarchy one_to_many + unpack {ch_search / n * 1e3:.2f} ms")
+        print(f"find_best_routes per village: csr {csr_time / n * 1e3:.2f} ms, "
+              f"hierarchy {ch_time / n * 1e3:.2f} ms")
+        print(f"Total: csr {csr_setup + csr_time:.2f} s, hierarchy first run {ch_setup + ch_time:.2f} s, "
+              f"hierarchy rerun {ch_reload + ch_time:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -88,11 +88,27 @@ def main():
     "batch_size": 20,
     "parallel": true,
     "workers": 4,
+    "max_concurrent_requests": 4,
+    "hazard_cache": null,
+    "snap_points": true,
+    "hazard_raster_dir": null,
+    "hazard_checkpoint_dir": null,
+    "point_method": "centroid",
+    "road_sample_spacing": null,
+    "road_risk_aggregation": "max",
+    "osm_pbf": null,
     "debug": false,
     "generate_routes": true,
     "max_routes": 3,
     "output_respondor_format": true,
-    "use_existing_network": false
+    "use_existing_network": false,
+    "graph_backend": "networkx",
+    "use_contraction_hierarchy": false,
+    "network_cache": true,
+    "poi_match_method": "index",
+    "poi_max_snap_distance": null,
+    "route_snap": "node",
+    "subnetwork_method": "paths"
 }""")
         sys.exit(1)
 
@@ -112,12 +128,28 @@ def main():
         'batch_size': 20,
         'parallel': True,
         'workers': 4,
+        'max_concurrent_requests': 4,
+        'hazard_cache': None,
+        'snap_points': True,
+        'hazard_raster_dir': None,
+        'hazard_checkpoint_dir': None,
+        'point_method': 'centroid',
+        'road_sample_spacing': None,
+        'road_risk_aggregation': 'max',
+        'osm_pbf': None,
         'debug': False,
         'generate_routes': True,
         'max_routes': 3,
         'risk_category': 'INDEKS_BAHAYA_GEMPABUMI',
         'use_existing_network': False,
-        'output_respondor_format': True
+        'output_respondor_format': True,
+        'graph_backend': 'networkx',
+        'use_contraction_hierarchy': False,
+        'network_cache': True,
+        'poi_match_method': 'index',
+        'poi_max_snap_distance': None,
+        'route_snap': 'node',
+        'subnetwork_method': 'paths'
     }
     
     for key, default_value in defaults.items():
@@ -141,21 +173,37 @@ def main():
     print(f"Route generation: {'enabled' if config['generate_routes'] else 'disabled'}")
     
     # Process network data if available
-    network_processor = NetworkProcessor(debug=config['debug'])
+    network_processor = NetworkProcessor(debug=config['debug'], backend=config['graph_backend'],
+                                         network_cache=config['network_cache'])
     roads_from_network = None
+    hierarchy = None
     
     if config.get('use_existing_network', False):
         if 'network_pycgr_file' in config and os.path.exists(config['network_pycgr_file']):
             print(f"Processing existing network file: {config['network_pycgr_file']}")
             
-            # Create NetworkX graph from PYCGR file
-            graph = network_processor.create_networkx_from_pycgr(config['network_pycgr_file'])
+            # Create graph from PYCGR file (networkx or CSR backend)
+            graph = network_processor.create_graph_from_pycgr(config['network_pycgr_file'])
+            
+            # Load (or build and save) the contraction hierarchy next to the PYCGR file
+            if config['use_contraction_hierarchy']:
+                hierarchy = network_processor.load_contraction_hierarchy(
+                    config['network_pycgr_file'], graph
+                )
             
             # Match POIs to network nodes
-            matched_pois = network_processor.match_pois_to_network(config['poi_file'], graph)
+            matched_pois = network_processor.match_pois_to_network(
+                config['poi_file'], graph,
+                method=config['poi_match_method'],
+                max_distance=config['poi_max_snap_distance']
+            )
             
             # Create subnetwork based on POIs
-            subnetwork = network_processor.create_subnetwork(matched_pois, graph)
+            subnetwork = network_processor.create_subnetwork(
+                matched_pois, graph,
+                method=config['subnetwork_method'],
+                workers=config['workers'] if config['parallel'] else 1
+            )
             
             # Save subnetwork as GeoJSON for route processing
             subnetwork_path = os.path.join(config['output_dir'], 'roads.geojson')
@@ -176,7 +224,16 @@ def main():
         debug=config['debug'],
         hazard_types=config['hazard_types'],
         parallel=config['parallel'],
-        workers=config['workers']
+        workers=config['workers'],
+        max_concurrent_requests=config['max_concurrent_requests'],
+        hazard_cache=config['hazard_cache'],
+        snap_points=config['snap_points'],
+        hazard_raster_dir=config['hazard_raster_dir'],
+        checkpoint_dir=config['hazard_checkpoint_dir'],
+        point_method=config['point_method'],
+        road_sample_spacing=config['road_sample_spacing'],
+        road_risk_aggregation=config['road_risk_aggregation'],
+        osm_pbf=config['osm_pbf']
     )
     
     # Process POIs from CSV file
@@ -208,14 +265,23 @@ def main():
                 finder = RouteFinder(
                     roads_file=poi_files['roads'],
                     villages_file=poi_files['villages'],
-                    shelters_file=poi_files['shelter']
+                    shelters_file=poi_files['shelter'],
+                    backend='csr' if hierarchy is not None else config['graph_backend'],
+                    hierarchy=hierarchy,
+                    snap=config['route_snap']
                 )
                 
                 # Find routes
                 if config['parallel']:
                     print(f"Using parallel processing with {config['workers']} workers")
-                    # For now, use sequential processing (parallel version would need modification)
-                    routes = finder.find_best_routes(max_routes=config['max_routes'])
+                    routes = finder.find_best_routes_parallel(
+                        max_routes=config['max_routes'],
+                        workers=config['workers']
+                    )
+                    for stats in finder.worker_stats:
+                        print(f"  Worker {stats['worker']}: {stats['villages']} villages, "
+                              f"{stats['routes']} routes in {stats['seconds']:.2f}s "
+                              f"({stats['villages_per_second']:.1f} villages/s)")
                 else:
                     routes = finder.find_best_routes(max_routes=config['max_routes'])
                 
@@ -26,7 +26,38 @@ def main():
     parser.add_argument('--parallel', action='store_true',
                       help='Enable parallel processing')
     parser.add_argument('--workers', type=int, default=4,
-                      help='Number of worker processes for parallel processing (default: 4)')
+                      help='Number of worker threads/processes for parallel processing (default: 4)')
+    parser.add_argument('--max-concurrent-requests', type=int, default=4,
+                      help='Maximum INARISK batch requests in flight per hazard (default: 4)')
+    parser.add_argument('--hazard-cache', type=str, default=None,
+                      help='SQLite file caching INARISK samples between runs (default: no cache)')
+    parser.add_argument('--hazard-raster-dir', type=str, default=None,
+                      help='Directory of local hazard rasters (<LAYER>.tif or <LAYER>.npy) to sample instead of the INARISK API')
+    parser.add_argument('--checkpoint-dir', type=str, default=None,
+                      help='Journal completed INARISK batches here so interrupted runs resume; unfetched values become NaN')
+    parser.add_argument('--stream-buildings', action='store_true',
+                      help='Process buildings tile by tile in bounded memory and write them to buildings.gpkg')
+    parser.add_argument('--osm-pbf', type=str, default=None,
+                      help='Read POIs and roads from a local .osm.pbf extract instead of Overpass (requires pyosmium)')
+    parser.add_argument('--tiled', action='store_true',
+                      help='Split the area into tiles fetched in parallel by --workers threads and cached per tile')
+    parser.add_argument('--tile-cache-dir', type=str, default=None,
+                      help='Directory of cached OSM tiles (default: <output-dir>/tile_cache)')
+    parser.add_argument('--tile-cache-ttl-days', type=float, default=7,
+                      help='Days before cached Overpass tiles are fetched again; 0 never expires them (default: 7)')
+    parser.add_argument('--tile-size', type=float, default=2.0,
+                      help='Tile size in kilometers for --tiled and --stream-buildings (default: 2.0)')
+    parser.add_argument('--chunk-size', type=int, default=5000,
+                      help='Buildings assessed and written per chunk when streaming (default: 5000)')
+    parser.add_argument('--point-method', type=str, default='centroid', choices=['centroid', 'point_on_surface'],
+                      help='Point of each geometry sampled for hazard risk (default: centroid)')
+    parser.add_argument('--no-snap', action='store_true',
+                      help='Query every POI location instead of one point per 30 m hazard grid cell')
+    parser.add_argument('--road-sample-spacing', type=float, default=None,
+                      help='Sample roads every N meters along their length instead of at one point')
+    parser.add_argument('--road-risk-aggregation', type=str, default='max',
+                      choices=['max', 'mean', 'length_weighted'],
+                      help='How road samples are combined into one risk per road (default: max)')
 
     args = parser.parse_args()
     
@@ -36,7 +67,22 @@ def main():
         debug=args.debug,
         hazard_types=args.hazards,
         parallel=args.parallel,
-        workers=args.workers
+        workers=args.workers,
+        max_concurrent_requests=args.max_concurrent_requests,
+        hazard_cache=args.hazard_cache,
+        snap_points=not args.no_snap,
+        hazard_raster_dir=args.hazard_raster_dir,
+        checkpoint_dir=args.checkpoint_dir,
+        point_method=args.point_method,
+        road_sample_spacing=args.road_sample_spacing,
+        road_risk_aggregation=args.road_risk_aggregation,
+        stream_buildings=args.stream_buildings,
+        tile_size_km=args.tile_size,
+        chunk_size=args.chunk_size,
+        tiled=args.tiled,
+        tile_cache_dir=args.tile_cache_dir,
+        tile_cache_ttl_days=args.tile_cache_ttl_days,
+        osm_pbf=args.osm_pbf
     )
     pois = collector.collect_pois(
         args.lat, 
@@ -4,48 +4,6 @@ import time
 from datetime import datetime
 from src.route_finder import RouteFinder
 import multiprocessing as mp
-import pandas as pd
-from itertools import product
-
-def process_village_routes(args):
-    """Process routes for a single village"""
-    village, shelters, finder, max_routes = args
-    village_routes = []
-    
-    village_center = village.geometry.centroid
-    village_point = (village_center.x, village_center.y)
-    village_node = finder._find_nearest_node(village_point)
-    
-    for _, shelter in shelters.iterrows():
-        if shelter.geometry.geom_type != 'Polygon':
-            continue
-            
-        shelter_center = shelter.geometry.centroid
-        shelter_point = (shelter_center.x, shelter_center.y)
-        shelter_node = finder._find_nearest_node(shelter_point)
-        
-        try:
-            path = finder.find_single_route(
-                village_node, 
-                shelter_node, 
-                village['name'] if 'name' in village else 'Unknown Village',
-                shelter['name'] if 'name' in shelter else 'Unknown Shelter'
-            )
-            if path:
-                village_routes.append(path)
-        except:
-            continue
-    
-    # Sort routes by combined score and take top N
-    if village_routes:
-        village_routes.sort(key=lambda x: (
-            x['total_distance'] * 
-            (1 + x['average_risk']) * 
-            (1 / x['worst_road_type'])
-        ))
-        return village_routes[:max_routes] if max_routes > 0 else village_routes
-    
-    return []
 
 def main():
     parser = argparse.ArgumentParser(description='Find best evacuation routes from villages to shelters')
@@ -59,6 +17,15 @@ def main():
                       help='Enable parallel processing')
     parser.add_argument('--workers', type=int, default=None,
                       help='Number of worker processes (default: CPU count - 1)')
+    parser.add_argument('--graph-backend', type=str, default='networkx',
+                      choices=['networkx', 'csr'],
+                      help='Routing graph backend: networkx or compact CSR arrays (default: networkx)')
+    parser.add_argument('--hierarchy-file', type=str, default=None,
+                      help='Contraction hierarchy file for fast path queries, built on first use '
+                           '(implies --graph-backend csr)')
+    parser.add_argument('--snap', type=str, default='node', choices=['node', 'edge'],
+                      help='Attach villages and shelters to the nearest node, or to their projection '
+                           'on the nearest road segment (default: node)')
     parser.add_argument('--debug', action='store_true',
                       help='Enable debug mode with detailed progress output')
     
@@ -90,7 +57,10 @@ def main():
     finder = RouteFinder(
         roads_file=os.path.join(args.input_dir, 'roads.geojson'),
         villages_file=os.path.join(args.input_dir, 'villages.geojson'),
-        shelters_file=os.path.join(args.input_dir, 'shelter.geojson')
+        shelters_file=os.path.join(args.input_dir, 'shelter.geojson'),
+        backend='csr' if args.hierarchy_file else args.graph_backend,
+        hierarchy=args.hierarchy_file,
+        snap=args.snap
     )
     
     if args.debug:
@@ -104,21 +74,13 @@ def main():
         if args.debug:
             print(f"Using {n_workers} worker processes")
         
-        # Prepare arguments for parallel processing
-        process_args = [
-            (village, finder.shelters, finder, args.max_routes)
-            for _, village in finder.villages.iterrows()
-        ]
-        
-        # Execute parallel processing
-        with mp.Pool(n_workers) as pool:
-            all_routes = pool.map(process_village_routes, process_args)
-        
-        # Flatten results
-        routes = pd.DataFrame([
-            route for village_routes in all_routes
-            for route in village_routes
-        ])
+        # Workers share the finder built here; only village indices are sent per task
+        routes = finder.find_best_routes_parallel(max_routes=args.max_routes, workers=n_workers)
+        if args.debug:
+            for stats in finder.worker_stats:
+                print(f"Worker {stats['worker']}: {stats['villages']} villages, "
+                      f"{stats['routes']} routes in {stats['seconds']:.2f}s "
+                      f"({stats['villages_per_second']:.1f} villages/s)")
     else:
         # Sequential processing
         routes = finder.find_best_routes(max_routes=args.max_routes)
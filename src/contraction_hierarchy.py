@@ -0,0 +1,614 @@
+"""
+Customizable contraction hierarchy for repeated shortest-path queries on a fixed network
+
+Preprocessing contracts the nodes of a CSRGraph in nested dissection order and
+stores the resulting upward graph (original edges plus shortcuts). It only
+depends on the network topology, so it is built once per network and persisted.
+Customization assigns the weights of one metric (e.g. a hazard scenario) to the
+upward graph in a single bottom-up pass, after which point-to-point queries only
+scan the elimination tree ancestors of both endpoints.
+"""
+
+import heapq
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import dijkstra
+from typing import List, Optional, Tuple
+
+from .csr_graph import CSRGraph
+from .spatial_index import NodeIndex
+
+
+# Index pairs of upward lists up to this size are computed once and reused
+PAIR_CACHE_SIZE = 64
+_PAIR_CACHE = {}
+
+
+class ContractionHierarchy:
+    """
+    Contraction order and upward graph of a road network, plus the weights of
+    the metric it was last customized with
+
+    Node indices are the node indices of the CSRGraph the hierarchy was built
+    from; coords (and node_ids, when present) allow other graphs over the same
+    network to be mapped onto it.
+    """
+
+    def __init__(self, rank: np.ndarray, up_offsets: np.ndarray, up_targets: np.ndarray,
+                 coords: np.ndarray, node_ids: Optional[np.ndarray] = None):
+        self.rank = rank
+        self.up_offsets = up_offsets
+        self.up_targets = up_targets
+        self.coords = coords
+        self.node_ids = node_ids
+        self.arc_weight = None
+        # Shortcut arcs a->b are replaced by the arcs v->a and v->b of the
+        # triangle they were relaxed over, -1 for original edges
+        self.arc_down = None
+        # Customization edge whose weight an original arc carries, -1 for none
+        self.arc_edge = None
+        self._arc_tails = np.repeat(np.arange(len(rank), dtype=np.int64), np.diff(up_offsets))
+        self._arc_keys = self._arc_tails * len(rank) + up_targets
+        # Elimination tree: the parent of a node is its lowest-ranked upward neighbour
+        self._parent = np.full(len(rank), -1, dtype=np.int64)
+        has_up = np.flatnonzero(np.diff(up_offsets))
+        if len(has_up):
+            lowest = np.minimum.reduceat(rank[up_targets], up_offsets[has_up])
+            self._parent[has_up] = np.argsort(rank)[lowest]
+        self._parent = self._parent.tolist()
+        self._level = None
+        # Scratch array of chain positions reused by every upward search
+        self._position = np.zeros(len(rank), dtype=np.int64)
+
+    def number_of_nodes(self) -> int:
+        return len(self.rank)
+
+    def number_of_arcs(self) -> int:
+        return len(self.up_targets)
+
+    # Subgraphs up to this size are not dissected further
+    LEAF_SIZE = 256
+
+    # Largest number of triangles enumerated at once during customization
+    TRIANGLE_CHUNK = 1 << 21
+
+    @classmethod
+    def build(cls, graph: CSRGraph, debug: bool = False) -> 'ContractionHierarchy':
+        """
+        Contract every node of a graph in nested dissection order
+
+        The order comes from nested_dissection_order. Contracting a node
+        connects all of its remaining neighbours to each other, so the upward
+        neighbours of every node form a clique and any metric can later be
+        customized without witness searches. Separator nodes are contracted
+        last, which keeps that fill-in close to linear on road networks.
+
+        Args:
+            graph (CSRGraph): Network to preprocess
+            debug (bool): Print progress information
+
+        Returns:
+            ContractionHierarchy: Uncustomized hierarchy
+        """
+        n = graph.number_of_nodes()
+        rank = nested_dissection_order(graph, cls.LEAF_SIZE)
+        order = np.argsort(rank).tolist()
+        rank_list = rank.tolist()
+        offsets = graph.offsets.tolist()
+        targets = graph.targets.tolist()
+
+        # Symbolic elimination: the fill-in of a node only has to be passed on
+        # to its lowest-ranked upward neighbour (its elimination tree parent)
+        upward = [None] * n
+        pending = [None] * n
+        for contracted, v in enumerate(order):
+            rank_v = rank_list[v]
+            up = {u for u in targets[offsets[v]:offsets[v + 1]] if rank_list[u] > rank_v}
+            if pending[v] is not None:
+                up |= pending[v]
+                pending[v] = None
+            if up:
+                parent = min(up, key=rank_list.__getitem__)
+                rest = up - {parent}
+                if rest:
+                    if pending[parent] is None:
+                        pending[parent] = rest
+                    else:
+                        pending[parent] |= rest
+            upward[v] = sorted(up)
+
+            if debug and (contracted + 1) % 100000 == 0:
+                print(f"Contracted {contracted + 1} of {n} nodes...")
+
+        up_offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum([len(up) for up in upward], out=up_offsets[1:])
+        up_targets = np.fromiter((u for up in upward for u in up), dtype=np.int64,
+                                 count=int(up_offsets[-1]))
+
+        if debug:
+            print(f"Built contraction hierarchy with {len(up_targets)} upward arcs "
+                  f"for {graph.number_of_edges()} edges")
+
+        return cls(rank, up_offsets, up_targets, graph.coords.copy(),
+                   None if graph.node_ids is None else graph.node_ids.copy())
+
+    def save(self, path: str, **metadata):
+        """Persist the hierarchy, and the metric it was customized with if any, to an .npz file"""
+        arrays = {
+            'rank': self.rank,
+            'up_offsets': self.up_offsets,
+            'up_targets': self.up_targets,
+            'coords': self.coords
+        }
+        if self.node_ids is not None:
+            arrays['node_ids'] = self.node_ids
+        if self.arc_weight is not None:
+            arrays.update(arc_weight=self.arc_weight, arc_down=self.arc_down, arc_edge=self.arc_edge)
+        for key, value in metadata.items():
+            arrays[f'meta_{key}'] = np.asarray(value)
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> Tuple['ContractionHierarchy', dict]:
+        """Load a hierarchy saved with save(), returning it with its metadata"""
+        with np.load(path) as data:
+            hierarchy = cls(data['rank'], data['up_offsets'], data['up_targets'], data['coords'],
+                            data['node_ids'] if 'node_ids' in data else None)
+            if 'arc_weight' in data:
+                hierarchy.arc_weight = data['arc_weight']
+                hierarchy.arc_down = data['arc_down']
+                hierarchy.arc_edge = data['arc_edge']
+            metadata = {key[len('meta_'):]: data[key].item()
+                        for key in data.files if key.startswith('meta_')}
+        return hierarchy, metadata
+
+    def match_nodes(self, coords, tolerance: float = 1e-6) -> np.ndarray:
+        """Map node coordinates of another graph onto hierarchy nodes (-1 if none)"""
+        distances, indices = NodeIndex(self.coords).query(coords, max_distance=tolerance)
+        return np.where(np.isfinite(distances), indices, -1)
+
+    def _arc_index(self, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+        return np.searchsorted(self._arc_keys, lower * self.number_of_nodes() + upper)
+
+    def customized(self, source, target, weight) -> 'ContractionHierarchy':
+        """
+        Return a copy of the hierarchy customized with one metric
+
+        Edges are given as hierarchy node indices. Network edges that are not
+        listed keep an infinite weight and are never used by queries.
+
+        Args:
+            source, target: Edge endpoints as hierarchy node indices
+            weight: Edge weights
+
+        Returns:
+            ContractionHierarchy: Hierarchy sharing this topology, ready for queries
+        """
+        hierarchy = ContractionHierarchy(self.rank, self.up_offsets, self.up_targets,
+                                         self.coords, self.node_ids)
+        hierarchy._level = self._level
+        hierarchy._customize(np.asarray(source, dtype=np.int64), np.asarray(target, dtype=np.int64),
+                             np.asarray(weight, dtype=np.float64))
+        return hierarchy
+
+    def _customize(self, source, target, weight):
+        n = self.number_of_nodes()
+        arc_weight = np.full(self.number_of_arcs(), np.inf)
+        arc_down = np.full((self.number_of_arcs(), 2), -1, dtype=np.int64)
+
+        # Original edges go on the arc from their lower- to their higher-ranked end
+        swap = self.rank[source] > self.rank[target]
+        lower = np.where(swap, target, source)
+        upper = np.where(swap, source, target)
+        edge_arcs = np.minimum(self._arc_index(lower, upper), max(len(self._arc_keys) - 1, 0))
+        if len(edge_arcs) and (self._arc_keys[edge_arcs] != lower * n + upper).any():
+            raise ValueError("Edges do not belong to the network of this contraction hierarchy")
+        # Parallel edges: the arc keeps the lightest one
+        order = np.lexsort((weight, edge_arcs))
+        lightest = order[np.r_[True, edge_arcs[order][1:] != edge_arcs[order][:-1]]] if len(order) else order
+        arc_weight[edge_arcs[lightest]] = weight[lightest]
+        arc_edge = np.full(self.number_of_arcs(), -1, dtype=np.int64)
+        arc_edge[edge_arcs[lightest]] = lightest
+
+        # Lower triangles (v; a, b): arcs v->a and v->b both support a->b. They
+        # are processed bottom-up: a triangle at v may only run once every arc
+        # leaving v is final, i.e. after all triangles at lower levels
+        up_offsets = self.up_offsets
+        level = self._levels()
+
+        # Triangles are enumerated a chunk of same-level nodes at a time, so
+        # memory follows the chunk size rather than the total triangle count
+        degree = np.diff(up_offsets)
+        nodes = np.flatnonzero(degree > 1)
+        nodes = nodes[np.argsort(level[nodes], kind='stable')]
+        triangles = degree[nodes] * (degree[nodes] - 1) // 2
+        chunk, chunk_triangles = [], 0
+        for position, v in enumerate(nodes.tolist()):
+            chunk.append(v)
+            chunk_triangles += int(triangles[position])
+            last = position + 1 == len(nodes)
+            if last or chunk_triangles >= self.TRIANGLE_CHUNK or level[nodes[position + 1]] != level[v]:
+                self._relax_triangles(chunk, arc_weight, arc_down)
+                chunk, chunk_triangles = [], 0
+
+        self.arc_weight = arc_weight
+        self.arc_down = arc_down
+        self.arc_edge = arc_edge
+
+    def _levels(self) -> np.ndarray:
+        """Level of every node: 0 without lower neighbours, else one above the highest of them"""
+        if self._level is None:
+            level = np.zeros(self.number_of_nodes(), dtype=np.int64)
+            for v in np.argsort(self.rank):
+                ups = self.up_targets[self.up_offsets[v]:self.up_offsets[v + 1]]
+                if len(ups):
+                    np.maximum.at(level, ups, level[v] + 1)
+            self._level = level
+        return self._level
+
+    def _relax_triangles(self, nodes: List[int], arc_weight: np.ndarray, arc_down: np.ndarray):
+        """Relax the arcs a->b over every lower triangle (v; a, b) of the given nodes"""
+        starts = self.up_offsets[nodes]
+        degree = self.up_offsets[np.asarray(nodes) + 1] - starts
+        triangle_v, arc_a, arc_b = [], [], []
+        for v, start, size in zip(nodes, starts.tolist(), degree.tolist()):
+            first, second = self._pairs(size)
+            triangle_v.append(np.full(len(first), v, dtype=np.int64))
+            arc_a.append(start + first)
+            arc_b.append(start + second)
+        triangle_v = np.concatenate(triangle_v)
+        arc_a = np.concatenate(arc_a)
+        arc_b = np.concatenate(arc_b)
+
+        node_a = self.up_targets[arc_a]
+        node_b = self.up_targets[arc_b]
+        swap = self.rank[node_a] > self.rank[node_b]
+        top = self._arc_index(np.where(swap, node_b, node_a), np.where(swap, node_a, node_b))
+
+        candidate = arc_weight[arc_a] + arc_weight[arc_b]
+        previous = arc_weight[top]
+        np.minimum.at(arc_weight, top, candidate)
+        improved = (candidate < previous) & (candidate == arc_weight[top])
+        # The path runs from the lower-ranked end down to v and up to the other
+        arc_down[top[improved], 0] = np.where(swap, arc_b, arc_a)[improved]
+        arc_down[top[improved], 1] = np.where(swap, arc_a, arc_b)[improved]
+
+    @staticmethod
+    def _pairs(size: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Index pairs (i, j), i < j, of an upward list of the given size"""
+        if size > PAIR_CACHE_SIZE:
+            return np.triu_indices(size, 1)
+        pairs = _PAIR_CACHE.get(size)
+        if pairs is None:
+            pairs = _PAIR_CACHE[size] = np.triu_indices(size, 1)
+        return pairs
+
+    def _upward_search(self, source: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Shortest upward distances from a node to its elimination tree ancestors
+
+        Every upward arc of an ancestor leads to another ancestor, so the search
+        only touches the ancestor chain: its arcs are gathered into a small
+        graph over chain positions that is searched with scipy's Dijkstra.
+
+        Returns:
+            tuple: (chain, dist, pred) with the ancestors in rank order
+            (chain[0] is source), their distances, and the chain position of
+            their predecessor (negative for none)
+        """
+        chain = []
+        v = int(source)
+        while v >= 0:
+            chain.append(v)
+            v = self._parent[v]
+        chain = np.array(chain, dtype=np.int64)
+
+        # Chain positions of arc heads; entries of other nodes are never read
+        self._position[chain] = np.arange(len(chain))
+        starts = self.up_offsets[chain]
+        counts = self.up_offsets[chain + 1] - starts
+        indptr = np.zeros(len(chain) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        arcs = np.arange(indptr[-1]) + np.repeat(starts - indptr[:-1], counts)
+        upward = sp.csr_array((self.arc_weight[arcs], self._position[self.up_targets[arcs]], indptr),
+                              shape=(len(chain), len(chain)))
+        dist, pred = dijkstra(upward, indices=0, return_predecessors=True)
+        return chain, dist, pred
+
+    def bucket_targets(self, targets) -> dict:
+        """
+        Upward searches from a set of targets, for one_to_many queries
+
+        Every target's distance to each of its ancestors is stored in the
+        bucket of that ancestor, so a query only has to search upwards from
+        its source and scan the buckets of the source's ancestors.
+
+        Args:
+            targets: Target hierarchy node indices
+
+        Returns:
+            dict: Buckets (node, target position and distance of every entry,
+            sorted by node) and the ancestor chain, chain ranks and chain
+            predecessors of every target
+        """
+        if self.arc_weight is None:
+            raise ValueError("Contraction hierarchy must be customized before querying")
+        targets = np.asarray(targets, dtype=np.int64)
+        searches = [self._upward_search(target) for target in targets.tolist()]
+        node = np.concatenate([chain for chain, _, _ in searches] + [np.zeros(0, dtype=np.int64)])
+        target = np.repeat(np.arange(len(targets)), [len(chain) for chain, _, _ in searches])
+        dist = np.concatenate([dist for _, dist, _ in searches] + [np.zeros(0)])
+        searches = [(chain.tolist(), self.rank[chain], pred.tolist()) for chain, _, pred in searches]
+        reached = np.isfinite(dist)
+        order = np.argsort(node[reached], kind='stable')
+        node, target, dist = node[reached][order], target[reached][order], dist[reached][order]
+        nodes, starts = np.unique(node, return_index=True)
+        return {
+            'targets': targets,
+            'nodes': nodes,
+            'offsets': np.append(starts, len(node)),
+            'target': target,
+            'dist': dist,
+            'searches': searches
+        }
+
+    def one_to_many(self, source: int, buckets: dict) -> Tuple[np.ndarray, List[Optional[List[int]]]]:
+        """
+        Shortest paths from one node to every target of bucket_targets
+
+        Paths are returned as hierarchy paths whose arcs may be shortcuts;
+        unpack() expands them into node paths of the network and
+        path_totals() sums arc_totals() along them without expanding.
+
+        Returns:
+            Tuple[np.ndarray, List[Optional[List[int]]]]: distance and
+            hierarchy path per target, inf and None for targets that cannot
+            be reached
+        """
+        if self.arc_weight is None:
+            raise ValueError("Contraction hierarchy must be customized before querying")
+        n_targets = len(buckets['targets'])
+        distances = np.full(n_targets, np.inf)
+        hop_paths = [None] * n_targets
+        chain, dist, pred = self._upward_search(source)
+
+        # Bucket entries of the source's reachable ancestors, meeting there
+        nodes = buckets['nodes']
+        bucket = np.searchsorted(nodes, chain)
+        in_bucket = bucket < len(nodes)
+        in_bucket[in_bucket] = nodes[bucket[in_bucket]] == chain[in_bucket]
+        found = np.flatnonzero(in_bucket & np.isfinite(dist))
+        bucket = bucket[found]
+        starts = buckets['offsets'][bucket]
+        counts = buckets['offsets'][bucket + 1] - starts
+        entries = np.arange(counts.sum()) + np.repeat(starts - np.cumsum(counts) + counts, counts)
+        meeting = np.repeat(found, counts)
+        total = dist[meeting] + buckets['dist'][entries]
+        target = buckets['target'][entries]
+
+        # Best meeting position per target
+        order = np.lexsort((total, target))
+        best = order[np.r_[True, target[order][1:] != target[order][:-1]]] if len(order) else order
+        distances[target[best]] = total[best]
+
+        # Upward halves from the source and the target to the meeting node
+        chain_list = chain.tolist()
+        pred = pred.tolist()
+        forward_paths = {}
+        for target_pos, position in zip(target[best].tolist(), meeting[best].tolist()):
+            forward = forward_paths.get(position)
+            if forward is None:
+                forward = [position]
+                while pred[forward[-1]] >= 0:
+                    forward.append(pred[forward[-1]])
+                forward = forward_paths[position] = [chain_list[p] for p in reversed(forward)]
+            target_chain, target_rank, target_pred = buckets['searches'][target_pos]
+            backward = [int(np.searchsorted(target_rank, self.rank[chain_list[position]]))]
+            while target_pred[backward[-1]] >= 0:
+                backward.append(target_pred[backward[-1]])
+            hop_paths[target_pos] = forward + [target_chain[p] for p in backward[1:]]
+        return distances, hop_paths
+
+    def query(self, source: int, target: int) -> Tuple[float, Optional[List[int]]]:
+        """
+        Shortest path between two hierarchy nodes
+
+        Returns:
+            Tuple[float, Optional[List[int]]]: (distance, node path), or
+            (inf, None) if the nodes are not connected
+        """
+        distances, hop_paths = self.one_to_many(source, self.bucket_targets([target]))
+        if hop_paths[0] is None:
+            return np.inf, None
+        return float(distances[0]), self.unpack(hop_paths)[0]
+
+    def arc_totals(self, edge_values, how: str = 'sum') -> np.ndarray:
+        """
+        Total of an edge attribute along every arc of the customized hierarchy
+
+        Args:
+            edge_values: One value per edge given to customized()
+            how (str): 'sum' or 'min' of the values of the unpacked edges
+
+        Returns:
+            np.ndarray: Value per arc, NaN for arcs that are never used
+        """
+        if how not in ('sum', 'min'):
+            raise ValueError("how must be 'sum' or 'min'")
+        combine = np.add if how == 'sum' else np.minimum
+        values = np.full(self.number_of_arcs(), np.nan)
+        original = self.arc_edge >= 0
+        values[original] = np.asarray(edge_values, dtype=np.float64)[self.arc_edge[original]]
+
+        # Shortcuts combine their two lower arcs, whose tails are at lower levels
+        shortcuts = np.flatnonzero(self.arc_down[:, 0] >= 0)
+        tail_level = self._levels()[self._arc_tails[shortcuts]]
+        order = np.argsort(tail_level, kind='stable')
+        shortcuts, tail_level = shortcuts[order], tail_level[order]
+        bounds = np.flatnonzero(np.r_[True, tail_level[1:] != tail_level[:-1], True])
+        for start, stop in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            arcs = shortcuts[start:stop]
+            values[arcs] = combine(values[self.arc_down[arcs, 0]], values[self.arc_down[arcs, 1]])
+        return values
+
+    def path_totals(self, hop_paths: List[List[int]], arc_values: np.ndarray, how: str = 'sum') -> np.ndarray:
+        """Sum (or minimum) of arc_totals() values along hierarchy paths, 0 (inf) for single nodes"""
+        if how not in ('sum', 'min'):
+            raise ValueError("how must be 'sum' or 'min'")
+        totals = np.full(len(hop_paths), 0.0 if how == 'sum' else np.inf)
+        if not hop_paths:
+            return totals
+        arcs, _, bounds = self._hop_arcs(hop_paths)
+        nonempty = bounds[1:] > bounds[:-1]
+        if nonempty.any():
+            combine = np.add if how == 'sum' else np.minimum
+            totals[nonempty] = combine.reduceat(arc_values[arcs], bounds[:-1][nonempty])
+        return totals
+
+    def _hop_arcs(self, hop_paths: List[List[int]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Arcs along hierarchy paths, whether each is traversed downwards, and each path's arc range"""
+        lengths = np.array([len(path) for path in hop_paths])
+        nodes = np.fromiter((v for path in hop_paths for v in path), dtype=np.int64, count=lengths.sum())
+        inner = np.ones(len(nodes), dtype=bool)
+        inner[np.cumsum(lengths) - 1] = False
+        tail, head = nodes[:-1][inner[:-1]], nodes[1:][inner[:-1]]
+        reverse = self.rank[tail] > self.rank[head]
+        arcs = self._arc_index(np.where(reverse, head, tail), np.where(reverse, tail, head))
+        return arcs, reverse, np.r_[0, np.cumsum(lengths - 1)]
+
+    def unpack(self, hop_paths: List[List[int]]) -> List[List[int]]:
+        """
+        Expand hierarchy paths into node paths of the network
+
+        All paths are expanded together as one sequence of (arc, reversed)
+        pieces: every round replaces each shortcut by its two lower arcs, the
+        first always traversed downwards and the second upwards.
+        """
+        if not hop_paths:
+            return []
+        arc, reverse, bounds = self._hop_arcs(hop_paths)
+        while True:
+            down = self.arc_down[arc]
+            shortcut = down[:, 0] >= 0
+            if not shortcut.any():
+                break
+            counts = 1 + shortcut
+            starts = np.cumsum(counts) - counts
+            down, swap = down[shortcut], reverse[shortcut]
+            arc, reverse = np.repeat(arc, counts), np.repeat(reverse, counts)
+            first = starts[shortcut]
+            arc[first] = np.where(swap, down[:, 1], down[:, 0])
+            arc[first + 1] = np.where(swap, down[:, 0], down[:, 1])
+            reverse[first] = True
+            reverse[first + 1] = False
+            bounds = np.r_[starts, len(arc)][bounds]
+
+        ends = np.where(reverse, self._arc_tails[arc], self.up_targets[arc]).tolist()
+        return [[path[0]] + ends[start:stop]
+                for path, start, stop in zip(hop_paths, bounds[:-1].tolist(), bounds[1:].tolist())]
+
+
+# Cut positions tried along every direction, as fractions of the subgraph size
+CUT_FRACTIONS = np.array([0.35, 0.4, 0.45, 0.5, 0.55, 0.6, 0.65])
+
+
+def nested_dissection_order(graph: CSRGraph, leaf_size: int = 256) -> np.ndarray:
+    """
+    Contraction rank of every node from geometric nested dissection
+
+    Each subgraph is split in two halves along the best of four coordinate
+    directions (x, y and both diagonals). The endpoints on one side of the
+    edges crossing the cut form a vertex separator, which is ranked above
+    both halves; the halves are then dissected recursively until they have
+    at most leaf_size nodes.
+
+    Args:
+        graph (CSRGraph): Network to order
+        leaf_size (int): Largest subgraph ranked without further dissection
+
+    Returns:
+        np.ndarray: rank[v] in 0..n-1, higher ranks contracted later
+    """
+    n = graph.number_of_nodes()
+    coords = np.asarray(graph.coords, dtype=np.float64)
+    offsets = np.asarray(graph.offsets, dtype=np.int64)
+    targets = np.asarray(graph.targets, dtype=np.int64)
+    directions = np.array([[1.0, 0.0], [0.0, 1.0], [1.0, 1.0], [1.0, -1.0]])
+
+    rank = np.full(n, -1, dtype=np.int64)
+    inside = np.zeros(n, dtype=bool)
+    position = np.zeros(n, dtype=np.int64)
+    # (nodes, highest free rank + 1) of every subgraph still to be ordered
+    stack = [(np.arange(n, dtype=np.int64), n)]
+    while stack:
+        nodes, top = stack.pop()
+        if len(nodes) <= leaf_size:
+            rank[_minimum_degree_order(nodes, offsets, targets)] = np.arange(top - len(nodes), top)
+            continue
+
+        # Arcs between the subgraph's nodes
+        degree = offsets[nodes + 1] - offsets[nodes]
+        arc_source = np.repeat(nodes, degree)
+        arc_index = (np.arange(int(degree.sum()))
+                     - np.repeat(np.cumsum(degree) - degree, degree)
+                     + np.repeat(offsets[nodes], degree))
+        arc_target = targets[arc_index]
+        inside[nodes] = True
+        internal = inside[arc_target]
+        inside[nodes] = False
+        arc_source, arc_target = arc_source[internal], arc_target[internal]
+
+        # Smallest vertex separator over the directions and cut positions
+        best = None
+        projection = coords[nodes] @ directions.T
+        cuts = np.unique((len(nodes) * CUT_FRACTIONS).astype(np.int64))
+        for direction in range(len(directions)):
+            order = np.argsort(projection[:, direction], kind='stable')
+            position[nodes[order]] = np.arange(len(nodes))
+            source_position, target_position = position[arc_source], position[arc_target]
+            low_end = np.where(source_position < target_position, arc_source, arc_target)
+            high_end = np.where(source_position < target_position, arc_target, arc_source)
+            low_position = np.minimum(source_position, target_position)
+            high_position = np.maximum(source_position, target_position)
+            for cut in cuts.tolist():
+                crossing = (low_position < cut) & (high_position >= cut)
+                for ends in (low_end, high_end):
+                    separator = np.unique(ends[crossing])
+                    if best is None or len(separator) < len(best[2]):
+                        best = (order, cut, separator)
+        order, cut, separator = best
+
+        in_separator = np.zeros(len(nodes), dtype=bool)
+        in_separator[np.searchsorted(nodes, separator)] = True
+        first = order[:cut]
+        second = order[cut:]
+        first = np.sort(nodes[first[~in_separator[first]]])
+        second = np.sort(nodes[second[~in_separator[second]]])
+
+        rank[separator] = np.arange(top - len(separator), top)
+        top -= len(separator)
+        stack.append((first, top))
+        stack.append((second, top - len(first)))
+    return rank
+
+
+def _minimum_degree_order(nodes: np.ndarray, offsets: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """Minimum-degree contraction order of the subgraph induced by nodes"""
+    members = set(nodes.tolist())
+    adjacency = {v: {u for u in targets[offsets[v]:offsets[v + 1]].tolist() if u in members}
+                 for v in members}
+    heap = [(len(neighbors), v) for v, neighbors in adjacency.items()]
+    heapq.heapify(heap)
+    order = []
+    while heap:
+        degree, v = heapq.heappop(heap)
+        if v not in adjacency or degree != len(adjacency[v]):
+            continue
+        neighbors = adjacency.pop(v)
+        order.append(v)
+        for u in neighbors:
+            adjacency[u].discard(v)
+            adjacency[u].update(w for w in neighbors if w != u)
+            heapq.heappush(heap, (len(adjacency[u]), u))
+    return np.array(order, dtype=np.int64)
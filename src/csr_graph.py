@@ -0,0 +1,285 @@
+"""
+Compact array-backed road graph (CSR layout) used as an alternative to networkx
+"""
+
+import json
+import os
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.csgraph import dijkstra
+from typing import Dict, List, Optional
+
+
+class CSRGraph:
+    """
+    Undirected graph stored as compressed sparse row arrays
+
+    Nodes are integer indices 0..n-1 with an (n, 2) array of (x, y) coordinates
+    and optional external ids. Every undirected edge is stored as two arcs;
+    arc i runs from the node whose offsets range contains i to targets[i] and
+    carries float64 weight, distance and risk values, an int16 highway code
+    into highway_types, plus any extra per-arc columns.
+    """
+
+    CORE_COLUMNS = ('weight', 'distance', 'risk')
+
+    def __init__(self, coords: np.ndarray, offsets: np.ndarray, targets: np.ndarray,
+                 columns: Dict[str, np.ndarray], highway: np.ndarray,
+                 highway_types: List, node_ids: Optional[np.ndarray] = None):
+        self.coords = coords
+        self.offsets = offsets
+        self.targets = targets
+        self.columns = columns
+        self.highway = highway
+        self.highway_types = list(highway_types)
+        self.node_ids = node_ids
+        self._matrix = None
+        self._id_order = None
+
+    @property
+    def weight(self) -> np.ndarray:
+        return self.columns['weight']
+
+    @property
+    def distance(self) -> np.ndarray:
+        return self.columns['distance']
+
+    @property
+    def risk(self) -> np.ndarray:
+        return self.columns['risk']
+
+    def number_of_nodes(self) -> int:
+        return len(self.coords)
+
+    def number_of_edges(self) -> int:
+        return len(self.targets) // 2
+
+    @classmethod
+    def from_edges(cls, coords, source, target, weight, distance=None, risk=None,
+                   highway=None, node_ids=None, extra_columns: Dict = None) -> 'CSRGraph':
+        """
+        Build a graph from node coordinates and an undirected edge list
+
+        Edges are given as node indices into coords. Self-loops are dropped and
+        repeated edges keep the attributes of their last occurrence, matching
+        the behaviour of repeated nx.Graph.add_edge calls.
+
+        Args:
+            coords: (n, 2) node coordinates
+            source, target: Edge endpoint node indices
+            weight: Routing weight per edge
+            distance, risk: Optional per-edge columns (default weight and 0)
+            highway: Optional per-edge highway labels (or a pd.Categorical of them)
+            node_ids: Optional external node ids
+            extra_columns: Optional additional per-edge columns
+
+        Returns:
+            CSRGraph: The assembled graph
+        """
+        coords = np.ascontiguousarray(coords, dtype=np.float64).reshape(-1, 2)
+        source = np.asarray(source, dtype=np.int64)
+        target = np.asarray(target, dtype=np.int64)
+        n_edges = len(source)
+
+        columns = {
+            'weight': np.asarray(weight),
+            'distance': np.asarray(distance) if distance is not None else np.asarray(weight),
+            'risk': np.asarray(risk) if risk is not None else np.zeros(n_edges),
+        }
+        for name, values in (extra_columns or {}).items():
+            columns[name] = np.asarray(values)
+
+        if highway is None:
+            highway_codes, highway_types = np.full(n_edges, -1, dtype=np.int16), []
+        elif isinstance(highway, pd.Categorical):
+            highway_codes = highway.codes.astype(np.int16)
+            highway_types = list(highway.categories)
+        else:
+            highway_codes, highway_types = pd.factorize(pd.Series(highway, dtype=object))
+            highway_codes = highway_codes.astype(np.int16)
+            highway_types = list(highway_types)
+
+        # Keep the last occurrence of every undirected edge and drop self-loops
+        low = np.minimum(source, target)
+        high = np.maximum(source, target)
+        reversed_keys = (low * len(coords) + high)[::-1]
+        _, first_in_reversed = np.unique(reversed_keys, return_index=True)
+        keep = np.sort(n_edges - 1 - first_in_reversed)
+        keep = keep[low[keep] != high[keep]]
+
+        # Store both directions of every edge, grouped by source node
+        arc_source = np.concatenate((source[keep], target[keep]))
+        arc_target = np.concatenate((target[keep], source[keep]))
+        arc_edge = np.concatenate((keep, keep))
+        order = np.lexsort((arc_target, arc_source))
+        arc_source, arc_target, arc_edge = arc_source[order], arc_target[order], arc_edge[order]
+
+        index_dtype = np.int32 if len(arc_target) < np.iinfo(np.int32).max else np.int64
+        offsets = np.zeros(len(coords) + 1, dtype=index_dtype)
+        np.cumsum(np.bincount(arc_source, minlength=len(coords)), out=offsets[1:])
+
+        arc_columns = {}
+        for name, values in columns.items():
+            values = values[arc_edge]
+            if name in cls.CORE_COLUMNS:
+                values = values.astype(np.float64)
+            arc_columns[name] = values
+
+        return cls(
+            coords=coords,
+            offsets=offsets,
+            targets=arc_target.astype(index_dtype),
+            columns=arc_columns,
+            highway=highway_codes[arc_edge],
+            highway_types=highway_types,
+            node_ids=np.asarray(node_ids) if node_ids is not None else None
+        )
+
+    @classmethod
+    def from_segments(cls, start, end, weight, distance=None, risk=None,
+                      highway=None, extra_columns: Dict = None) -> 'CSRGraph':
+        """Build a graph whose nodes are the distinct segment endpoint coordinates"""
+        start = np.asarray(start, dtype=np.float64).reshape(-1, 2)
+        end = np.asarray(end, dtype=np.float64).reshape(-1, 2)
+        coords, inverse = np.unique(np.vstack((start, end)), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        return cls.from_edges(coords, inverse[:len(start)], inverse[len(start):], weight,
+                              distance=distance, risk=risk, highway=highway,
+                              extra_columns=extra_columns)
+
+    def save(self, directory: str):
+        """
+        Write the graph as one .npy file per array plus a graph.json manifest
+
+        Every file is written to a temporary name and renamed into place, so
+        processes that memory-mapped an earlier version keep a consistent copy.
+        """
+        os.makedirs(directory, exist_ok=True)
+        arrays = {'coords': self.coords, 'offsets': self.offsets, 'targets': self.targets,
+                  'highway': self.highway}
+        if self.node_ids is not None:
+            arrays['node_ids'] = self.node_ids
+        for name, values in self.columns.items():
+            arrays[f'column_{name}'] = values
+
+        for name, values in arrays.items():
+            tmp_path = os.path.join(directory, f'{name}.npy.tmp')
+            with open(tmp_path, 'wb') as f:
+                np.save(f, np.ascontiguousarray(values))
+            os.replace(tmp_path, os.path.join(directory, f'{name}.npy'))
+
+        manifest = {'columns': list(self.columns), 'highway_types': self.highway_types,
+                    'node_ids': self.node_ids is not None}
+        tmp_path = os.path.join(directory, 'graph.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, os.path.join(directory, 'graph.json'))
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: Optional[str] = 'r') -> 'CSRGraph':
+        """
+        Load a graph written by save()
+
+        With the default mmap_mode='r' the arrays are memory-mapped read-only,
+        so loading is near-instant and processes loading the same directory
+        share its pages through the OS page cache.
+        """
+        with open(os.path.join(directory, 'graph.json')) as f:
+            manifest = json.load(f)
+
+        def load_array(name):
+            return np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode)
+
+        return cls(
+            coords=load_array('coords'),
+            offsets=load_array('offsets'),
+            targets=load_array('targets'),
+            columns={name: load_array(f'column_{name}') for name in manifest['columns']},
+            highway=load_array('highway'),
+            highway_types=manifest['highway_types'],
+            node_ids=load_array('node_ids') if manifest['node_ids'] else None
+        )
+
+    def node_key(self, node: int):
+        """External key of a node: its id if ids are set, else its coordinate tuple"""
+        if self.node_ids is not None:
+            return self.node_ids[node].item()
+        return tuple(self.coords[node].tolist())
+
+    def node_keys(self, nodes) -> list:
+        return [self.node_key(node) for node in nodes]
+
+    def index_of(self, ids) -> np.ndarray:
+        """Map external node ids to node indices (-1 where unknown)"""
+        ids = np.asarray(ids)
+        if self._id_order is None:
+            self._id_order = np.argsort(self.node_ids, kind='stable')
+        sorted_ids = self.node_ids[self._id_order]
+        pos = np.clip(np.searchsorted(sorted_ids, ids), 0, len(sorted_ids) - 1)
+        found = sorted_ids[pos] == ids
+        return np.where(found, self._id_order[pos], -1)
+
+    def neighbors(self, node: int) -> np.ndarray:
+        return self.targets[self.offsets[node]:self.offsets[node + 1]]
+
+    def edge_index(self, u: int, v: int) -> int:
+        """Arc index of edge (u, v), or -1 if the nodes are not adjacent"""
+        start, stop = self.offsets[u], self.offsets[u + 1]
+        pos = start + np.searchsorted(self.targets[start:stop], v)
+        if pos < stop and self.targets[pos] == v:
+            return int(pos)
+        return -1
+
+    def path_edges(self, path) -> np.ndarray:
+        """Arc indices of consecutive node pairs along a path"""
+        return np.array([self.edge_index(u, v) for u, v in zip(path[:-1], path[1:])],
+                        dtype=np.int64)
+
+    def edge_list(self):
+        """Return (source, target, arc) arrays with one row per undirected edge"""
+        sources = np.repeat(np.arange(self.number_of_nodes()), np.diff(self.offsets))
+        once = sources < self.targets
+        return sources[once], self.targets[once], np.flatnonzero(once)
+
+    def to_scipy(self, weight: str = 'weight') -> sp.csr_array:
+        """Sparse adjacency matrix sharing the CSR index arrays"""
+        if weight == 'weight' and self._matrix is not None:
+            return self._matrix
+        n = self.number_of_nodes()
+        matrix = sp.csr_array((self.columns[weight], self.targets, self.offsets), shape=(n, n))
+        if weight == 'weight':
+            self._matrix = matrix
+        return matrix
+
+    def dijkstra(self, sources, weight: str = 'weight', limit: float = np.inf):
+        """
+        Shortest-path distances and predecessors from one or more sources
+
+        Args:
+            sources: A node index or array of node indices
+            weight (str): Arc column to use as edge length
+            limit (float): Do not expand nodes farther than this
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (dist, pred) with one row per source;
+            unreachable nodes have dist inf and pred -9999
+        """
+        return dijkstra(self.to_scipy(weight), directed=True, indices=sources,
+                        return_predecessors=True, limit=limit)
+
+    @staticmethod
+    def path_from_predecessors(pred: np.ndarray, target: int) -> List[int]:
+        """Walk a predecessor row back from a reachable target to its source"""
+        path = [int(target)]
+        while pred[path[-1]] >= 0:
+            path.append(int(pred[path[-1]]))
+        path.reverse()
+        return path
+
+    def shortest_path(self, source: int, target: int, weight: str = 'weight') -> Optional[List[int]]:
+        """Shortest path between two node indices, None if disconnected"""
+        dist, pred = self.dijkstra(source, weight=weight)
+        if not np.isfinite(dist[target]):
+            return None
+        return self.path_from_predecessors(pred, target)
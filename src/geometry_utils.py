@@ -0,0 +1,183 @@
+"""
+Vectorized geometry helpers shared by the collectors
+"""
+
+import numpy as np
+import shapely
+from typing import NamedTuple, Tuple
+from .spatial_index import EARTH_RADIUS_M
+
+POINT_METHODS = ('centroid', 'point_on_surface')
+LINE_AGGREGATIONS = ('max', 'mean', 'length_weighted')
+
+# Geometry types whose representative point is computed; other types fall back
+# to the lower-left corner of their bounds
+_REPRESENTED_TYPES = [
+    shapely.GeometryType.POINT,
+    shapely.GeometryType.LINESTRING,
+    shapely.GeometryType.POLYGON,
+    shapely.GeometryType.MULTIPOLYGON
+]
+
+
+def representative_points(geometries, method: str = 'centroid') -> Tuple[np.ndarray, np.ndarray]:
+    """
+    One representative point per geometry, computed on the whole array at once
+
+    Args:
+        geometries: GeoSeries or array of shapely geometries in lon/lat
+        method (str): 'centroid', or 'point_on_surface' for a point guaranteed
+            to lie inside polygons (and on lines)
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Contiguous float64 (lat, lon) arrays
+    """
+    if method not in POINT_METHODS:
+        raise ValueError(f"method must be one of {POINT_METHODS}")
+
+    geometries = np.asarray(getattr(geometries, 'values', geometries), dtype=object)
+    if method == 'centroid':
+        points = shapely.centroid(geometries)
+    else:
+        points = shapely.point_on_surface(geometries)
+    lon = shapely.get_x(points)
+    lat = shapely.get_y(points)
+
+    other = ~np.isin(shapely.get_type_id(geometries), _REPRESENTED_TYPES)
+    if other.any():
+        bounds = shapely.bounds(geometries[other])
+        lon[other] = bounds[:, 0]
+        lat[other] = bounds[:, 1]
+
+    return (np.ascontiguousarray(lat, dtype=np.float64),
+            np.ascontiguousarray(lon, dtype=np.float64))
+
+
+class LineSamples(NamedTuple):
+    """
+    Sample points along line geometries
+
+    Every line is cut into pieces of at most the sampling spacing; lat/lon are
+    the distinct piece end points, and piece_start/piece_end index into them.
+    """
+    lat: np.ndarray
+    lon: np.ndarray
+    piece_start: np.ndarray
+    piece_end: np.ndarray
+    piece_length: np.ndarray
+    piece_row: np.ndarray
+
+
+def line_samples(geometries, spacing_m: float) -> LineSamples:
+    """
+    Sample (Multi)LineStrings every spacing_m metres along their length
+
+    Every segment is split into equal pieces no longer than spacing_m and the
+    piece end points are sampled, so each vertex is a sample and long segments
+    get evenly spaced extra samples. Points shared by consecutive pieces,
+    segments or lines meeting at a vertex are sampled only once.
+
+    Args:
+        geometries: GeoSeries or array of shapely geometries in lon/lat
+        spacing_m (float): Maximum distance between samples in metres
+
+    Returns:
+        LineSamples: Sample points and pieces; piece_row is the position of
+        the geometry each piece belongs to (non-line geometries have none)
+    """
+    geometries = np.asarray(getattr(geometries, 'values', geometries), dtype=object)
+    parts, part_rows = shapely.get_parts(geometries, return_index=True)
+    is_line = shapely.get_type_id(parts) == shapely.GeometryType.LINESTRING
+    parts, part_rows = parts[is_line], part_rows[is_line]
+
+    coords, coord_part = shapely.get_coordinates(parts, return_index=True)
+    same_part = coord_part[1:] == coord_part[:-1]
+    start, end = coords[:-1][same_part], coords[1:][same_part]
+    segment_row = part_rows[coord_part[1:][same_part]]
+
+    # Great-circle segment lengths and the number of pieces per segment
+    lon0, lat0 = np.radians(start[:, 0]), np.radians(start[:, 1])
+    lon1, lat1 = np.radians(end[:, 0]), np.radians(end[:, 1])
+    a = np.sin((lat1 - lat0) / 2) ** 2 + np.cos(lat0) * np.cos(lat1) * np.sin((lon1 - lon0) / 2) ** 2
+    length = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+    n_pieces = np.maximum(1, np.ceil(length / spacing_m)).astype(np.int64)
+
+    # Piece k of a segment runs from fraction k/n to (k+1)/n
+    segment = np.repeat(np.arange(len(start)), n_pieces)
+    k = np.arange(len(segment)) - np.repeat(np.cumsum(n_pieces) - n_pieces, n_pieces)
+    n = n_pieces[segment]
+    delta = end[segment] - start[segment]
+    piece_start = start[segment] + delta * (k / n)[:, None]
+    piece_end = start[segment] + delta * ((k + 1) / n)[:, None]
+    # Use the exact vertex as the last end point so neighbouring segments share it
+    last = k + 1 == n
+    piece_end[last] = end[segment[last]]
+
+    unique, inverse = np.unique(np.vstack((piece_start, piece_end)), axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    return LineSamples(
+        lat=np.ascontiguousarray(unique[:, 1]),
+        lon=np.ascontiguousarray(unique[:, 0]),
+        piece_start=inverse[:len(segment)],
+        piece_end=inverse[len(segment):],
+        piece_length=length[segment] / n,
+        piece_row=segment_row[segment]
+    )
+
+
+def aggregate_line_samples(values: np.ndarray, samples: LineSamples, n_rows: int,
+                           how: str = 'max') -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Aggregate sampled values per line geometry
+
+    Args:
+        values: (n_samples, k) values at the sample points of `samples`
+        samples (LineSamples): Samples from line_samples
+        n_rows (int): Number of geometries that were sampled
+        how (str): 'max', 'mean' of the distinct samples, or 'length_weighted'
+            (trapezoidal average over the pieces, by piece length)
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (n_rows, k) aggregated values and a
+        boolean mask of the rows that had samples; NaN samples are ignored
+    """
+    if how not in LINE_AGGREGATIONS:
+        raise ValueError(f"how must be one of {LINE_AGGREGATIONS}")
+
+    values = np.asarray(values, dtype=np.float64).reshape(len(samples.lat), -1)
+    sampled = np.bincount(samples.piece_row, minlength=n_rows) > 0
+    result = np.full((n_rows, values.shape[1]), np.nan)
+
+    if how == 'max':
+        rows = np.concatenate((samples.piece_row, samples.piece_row))
+        points = np.concatenate((samples.piece_start, samples.piece_end))
+        np.fmax.at(result, rows, values[points])
+    elif how == 'mean':
+        # Every distinct sample of a row counts once
+        pairs = np.unique(np.column_stack((
+            np.concatenate((samples.piece_row, samples.piece_row)),
+            np.concatenate((samples.piece_start, samples.piece_end))
+        )), axis=0)
+        for column in range(values.shape[1]):
+            sample_values = values[pairs[:, 1], column]
+            valid = ~np.isnan(sample_values)
+            total = np.bincount(pairs[valid, 0], weights=sample_values[valid], minlength=n_rows)
+            count = np.bincount(pairs[valid, 0], minlength=n_rows)
+            result[:, column] = np.where(count > 0, total / np.maximum(count, 1), np.nan)
+    else:
+        piece_values = (values[samples.piece_start] + values[samples.piece_end]) / 2
+        for column in range(values.shape[1]):
+            valid = ~np.isnan(piece_values[:, column])
+            weight = np.bincount(samples.piece_row[valid], weights=samples.piece_length[valid],
+                                 minlength=n_rows)
+            total = np.bincount(samples.piece_row[valid],
+                                weights=piece_values[valid, column] * samples.piece_length[valid],
+                                minlength=n_rows)
+            # Zero-length lines fall back to the plain mean of their samples
+            count = np.bincount(samples.piece_row[valid], minlength=n_rows)
+            plain = np.bincount(samples.piece_row[valid], weights=piece_values[valid, column],
+                                minlength=n_rows)
+            result[:, column] = np.where(weight > 0, total / np.where(weight > 0, weight, 1),
+                                         np.where(count > 0, plain / np.maximum(count, 1), np.nan))
+
+    return result, sampled
@@ -0,0 +1,47 @@
+"""
+Shortest-path searches over networkx road graphs shared by routing and subnetwork extraction
+"""
+
+import heapq
+from itertools import count
+
+
+def dijkstra_to_targets(graph, source, targets, weight: str = 'weight'):
+    """
+    Single-source Dijkstra that stops once every target node is settled
+
+    Edges without the weight attribute count as 1, as in networkx. Ties are
+    broken by insertion order so paths are deterministic.
+
+    Args:
+        graph: networkx graph (anything indexable as graph[node] -> {neighbor: edge})
+        source: Source node
+        targets: Nodes to settle before stopping
+        weight (str): Edge attribute holding the edge cost
+
+    Returns:
+        tuple: (dist, pred) dicts of settled distances and predecessors, with
+        pred[source] = None
+    """
+    remaining = set(targets)
+    dist = {}
+    pred = {source: None}
+    seen = {source: 0}
+    tiebreak = count()
+    heap = [(0, next(tiebreak), source)]
+
+    while heap and remaining:
+        d, _, node = heapq.heappop(heap)
+        if node in dist:
+            continue
+        dist[node] = d
+        remaining.discard(node)
+
+        for neighbor, edge in graph[node].items():
+            new_dist = d + edge.get(weight, 1)
+            if neighbor not in dist and new_dist < seen.get(neighbor, float('inf')):
+                seen[neighbor] = new_dist
+                pred[neighbor] = node
+                heapq.heappush(heap, (new_dist, next(tiebreak), neighbor))
+
+    return dist, pred
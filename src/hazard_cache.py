@@ -0,0 +1,148 @@
+"""
+Persistent on-disk cache of INARISK hazard samples
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+
+
+class HazardCache:
+    """
+    SQLite cache of hazard values keyed by hazard layer and grid cell
+
+    Points are given in Spherical Mercator metres (EPSG:3857) and snapped to
+    square cells of `resolution` metres, so repeated or overlapping runs reuse
+    values sampled anywhere in the same raster cell. Entries older than
+    ttl_days are ignored and purged; with max_entries set, the oldest entries
+    are evicted once the cache grows past it.
+    """
+
+    def __init__(self, path: str, resolution: float = 30.0, ttl_days: float = 30,
+                 max_entries: int = None):
+        self.path = path
+        self.resolution = resolution
+        self.ttl = ttl_days * 86400 if ttl_days else None
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS samples (
+                    layer TEXT NOT NULL,
+                    cell_x INTEGER NOT NULL,
+                    cell_y INTEGER NOT NULL,
+                    value REAL NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    PRIMARY KEY (layer, cell_x, cell_y)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS samples_fetched_at ON samples (fetched_at)")
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        del state['_local']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread (and per process after a fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=60)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def cells(self, meter_points) -> np.ndarray:
+        """Grid cell (cell_x, cell_y) of every point, as an (n, 2) int64 array"""
+        meter_points = np.asarray(meter_points, dtype=np.float64).reshape(-1, 2)
+        return np.floor(meter_points / self.resolution).astype(np.int64)
+
+    def get_many(self, layer: str, cells) -> np.ndarray:
+        """
+        Look up cached values for grid cells
+
+        Returns:
+            np.ndarray: Cached value per cell, NaN where missing or expired
+        """
+        cells = np.asarray(cells, dtype=np.int64).reshape(-1, 2)
+        values = np.full(len(cells), np.nan)
+        if len(cells) == 0:
+            return values
+
+        unique_cells, inverse = np.unique(cells, axis=0, return_inverse=True)
+        min_fetched = time.time() - self.ttl if self.ttl else 0.0
+
+        conn = self._connection()
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS lookup (idx INTEGER, cell_x INTEGER, cell_y INTEGER)")
+        conn.execute("DELETE FROM lookup")
+        conn.executemany("INSERT INTO lookup VALUES (?, ?, ?)",
+                         zip(range(len(unique_cells)), unique_cells[:, 0].tolist(), unique_cells[:, 1].tolist()))
+        rows = conn.execute("""
+            SELECT lookup.idx, samples.value FROM lookup
+            JOIN samples ON samples.layer = ? AND samples.cell_x = lookup.cell_x
+                AND samples.cell_y = lookup.cell_y
+            WHERE samples.fetched_at >= ?
+        """, (layer, min_fetched)).fetchall()
+        conn.commit()
+
+        unique_values = np.full(len(unique_cells), np.nan)
+        if rows:
+            idx, found = zip(*rows)
+            unique_values[list(idx)] = found
+        values = unique_values[inverse.reshape(-1)]
+
+        with self._lock:
+            hit_count = int(np.count_nonzero(~np.isnan(values)))
+            self.hits += hit_count
+            self.misses += len(values) - hit_count
+        return values
+
+    def put_many(self, layer: str, cells, values):
+        """Store sampled values for grid cells"""
+        cells = np.asarray(cells, dtype=np.int64).reshape(-1, 2)
+        now = time.time()
+        conn = self._connection()
+        conn.executemany(
+            "INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?, ?)",
+            ((layer, cell_x, cell_y, value, now)
+             for (cell_x, cell_y), value in zip(cells.tolist(), np.asarray(values, dtype=np.float64).tolist()))
+        )
+        if self.max_entries:
+            conn.execute("""
+                DELETE FROM samples WHERE rowid IN (
+                    SELECT rowid FROM samples ORDER BY fetched_at, rowid
+                    LIMIT MAX(0, (SELECT COUNT(*) FROM samples) - ?)
+                )
+            """, (self.max_entries,))
+        conn.commit()
+
+    def purge_expired(self) -> int:
+        """Delete expired entries, returning how many were removed"""
+        if not self.ttl:
+            return 0
+        conn = self._connection()
+        removed = conn.execute("DELETE FROM samples WHERE fetched_at < ?", (time.time() - self.ttl,)).rowcount
+        conn.commit()
+        return removed
+
+    def stats(self) -> dict:
+        """Hit/miss counters of this instance and the number of cached entries"""
+        entries = self._connection().execute("SELECT COUNT(*) FROM samples").fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries}
@@ -0,0 +1,160 @@
+"""
+Local hazard index rasters sampled in-process instead of through the INARISK ImageServer
+"""
+
+import json
+import os
+import numpy as np
+from pyproj import Transformer
+
+RASTER_EXTENSIONS = ('.tif', '.tiff', '.npy')
+
+
+class HazardRaster:
+    """
+    Single-band north-up hazard grid with bilinear sampling
+
+    Values are any 2D array supporting slicing (an in-memory array or a
+    np.memmap), or an open rasterio dataset from which windows are read on
+    demand, so country-sized grids never have to fit in memory. transform is
+    (x_origin, pixel_width, y_origin, pixel_height) of the top-left corner in
+    the raster CRS, with a negative pixel_height for north-up grids.
+    """
+
+    TILE_SIZE = 1024
+
+    def __init__(self, values, transform, crs: str = 'EPSG:3857', nodata: float = None):
+        self.values = values
+        self.transform = tuple(float(v) for v in transform)
+        self.crs = crs
+        self.nodata = nodata
+        if hasattr(values, 'read'):
+            self.height, self.width = values.height, values.width
+        else:
+            self.height, self.width = values.shape
+        self._transformer = None
+        if str(crs).upper() not in ('EPSG:4326', 'WGS84'):
+            self._transformer = Transformer.from_crs('EPSG:4326', crs, always_xy=True)
+
+    @classmethod
+    def open(cls, path: str) -> 'HazardRaster':
+        """Open a GeoTIFF or a .npy grid depending on the file extension"""
+        if path.lower().endswith('.npy'):
+            return cls.from_npy(path)
+        return cls.from_geotiff(path)
+
+    @classmethod
+    def from_geotiff(cls, path: str) -> 'HazardRaster':
+        """Open a GeoTIFF exported from INARISK (requires rasterio)"""
+        try:
+            import rasterio
+        except ImportError as e:
+            raise ImportError("Reading GeoTIFF hazard rasters requires rasterio; "
+                              "install it or convert the raster to .npy") from e
+
+        dataset = rasterio.open(path)
+        t = dataset.transform
+        if t.b != 0 or t.d != 0:
+            raise ValueError(f"Rotated raster transforms are not supported: {path}")
+        return cls(dataset, (t.c, t.a, t.f, t.e), crs=dataset.crs.to_string(), nodata=dataset.nodata)
+
+    @classmethod
+    def from_npy(cls, path: str) -> 'HazardRaster':
+        """
+        Memory-map a .npy grid described by a JSON sidecar next to it
+
+        The sidecar <name>.json holds "transform" as [x_origin, pixel_width,
+        y_origin, pixel_height] and optionally "crs" (default EPSG:3857) and
+        "nodata".
+        """
+        with open(os.path.splitext(path)[0] + '.json') as f:
+            meta = json.load(f)
+        values = np.load(path, mmap_mode='r')
+        if values.ndim != 2:
+            raise ValueError(f"Hazard grid must be 2D, got shape {values.shape}: {path}")
+        return cls(values, meta['transform'], crs=meta.get('crs', 'EPSG:3857'),
+                   nodata=meta.get('nodata'))
+
+    def save_npy(self, path: str):
+        """Write the grid as a .npy file with its JSON sidecar"""
+        np.save(path, np.asarray(self._read(0, self.height, 0, self.width)))
+        with open(os.path.splitext(path)[0] + '.json', 'w') as f:
+            json.dump({'transform': list(self.transform), 'crs': self.crs, 'nodata': self.nodata}, f)
+
+    def _read(self, row_start: int, row_stop: int, col_start: int, col_stop: int) -> np.ndarray:
+        if hasattr(self.values, 'read'):
+            from rasterio.windows import Window
+            return self.values.read(1, window=Window(col_start, row_start,
+                                                     col_stop - col_start, row_stop - row_start))
+        return self.values[row_start:row_stop, col_start:col_stop]
+
+    def sample(self, lat, lon) -> np.ndarray:
+        """
+        Bilinearly interpolate the grid at WGS84 points
+
+        Pixel values are taken at pixel centres, as ArcGIS RSP_BilinearInterpolation
+        does. Nodata neighbours are left out of the weighting.
+
+        Args:
+            lat, lon: Arrays of point coordinates in degrees
+
+        Returns:
+            np.ndarray: Interpolated value per point, NaN outside the grid or
+            where all four neighbours are nodata
+        """
+        lat = np.asarray(lat, dtype=np.float64).reshape(-1)
+        lon = np.asarray(lon, dtype=np.float64).reshape(-1)
+        if self._transformer is not None:
+            x, y = self._transformer.transform(lon, lat)
+        else:
+            x, y = lon, lat
+
+        x_origin, pixel_width, y_origin, pixel_height = self.transform
+        col = (np.asarray(x) - x_origin) / pixel_width
+        row = (np.asarray(y) - y_origin) / pixel_height
+        result = np.full(len(lat), np.nan)
+        inside = (col >= 0) & (col < self.width) & (row >= 0) & (row < self.height)
+
+        # Upper-left neighbour and fractional offset relative to pixel centres
+        col_f = np.clip(col - 0.5, 0, self.width - 1)
+        row_f = np.clip(row - 0.5, 0, self.height - 1)
+        col0 = np.minimum(np.floor(col_f).astype(np.int64), max(self.width - 2, 0))
+        row0 = np.minimum(np.floor(row_f).astype(np.int64), max(self.height - 2, 0))
+        dx = col_f - col0
+        dy = row_f - row0
+
+        # Read one window per tile of the grid that contains query points
+        tile = np.where(inside, (row0 // self.TILE_SIZE) * (self.width // self.TILE_SIZE + 1)
+                        + col0 // self.TILE_SIZE, -1)
+        for tile_id in np.unique(tile[inside]):
+            idx = np.flatnonzero(tile == tile_id)
+            r_start, c_start = row0[idx].min(), col0[idx].min()
+            window = np.asarray(self._read(r_start, min(row0[idx].max() + 2, self.height),
+                                           c_start, min(col0[idx].max() + 2, self.width)),
+                                 dtype=np.float64)
+            r = row0[idx] - r_start
+            c = col0[idx] - c_start
+            r1 = np.minimum(r + 1, window.shape[0] - 1)
+            c1 = np.minimum(c + 1, window.shape[1] - 1)
+
+            corners = np.stack((window[r, c], window[r, c1], window[r1, c], window[r1, c1]))
+            weights = np.stack(((1 - dx[idx]) * (1 - dy[idx]), dx[idx] * (1 - dy[idx]),
+                                (1 - dx[idx]) * dy[idx], dx[idx] * dy[idx]))
+            valid = np.isfinite(corners)
+            if self.nodata is not None:
+                valid &= corners != self.nodata
+            weights = np.where(valid, weights, 0.0)
+            total = weights.sum(axis=0)
+            values = (np.where(valid, corners, 0.0) * weights).sum(axis=0)
+            result[idx] = np.where(total > 0, values / np.where(total > 0, total, 1.0), np.nan)
+
+        return result
+
+
+def find_layer_raster(raster_dir: str, layer: str):
+    """Path of the local raster for a hazard layer in raster_dir, or None"""
+    for extension in RASTER_EXTENSIONS:
+        path = os.path.join(raster_dir, layer + extension)
+        if os.path.exists(path):
+            return path
+    return None
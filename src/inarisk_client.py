@@ -1,15 +1,87 @@
 import math
 import json
+import os
+import hashlib
 import time
+import threading
 import requests
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 from datetime import datetime
 from tqdm import tqdm
+from .hazard_cache import HazardCache
+from .hazard_raster import HazardRaster, find_layer_raster
+
+class AdaptiveRateLimiter:
+    """
+    Thread-safe token bucket whose refill rate adapts to server health
+
+    The rate grows additively after every successful request and is halved
+    when the server answers 429 or 5xx, pausing all callers for Retry-After
+    seconds when the server provides it.
+    """
+    
+    def __init__(self, rate: float = 1.0, min_rate: float = 0.2, max_rate: float = 10.0,
+                 increase: float = 0.25, capacity: float = 1.0):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.capacity = capacity
+        self._tokens = 1.0
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+    
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+    
+    def on_throttle(self, retry_after: float = None):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
 
 class INARISKClient:
     """Client for INARISK API to get hazard risk data."""
     
-    def __init__(self, debug: bool = False):
-        self.api_url = "https://gis.bnpb.go.id/server/rest/services/inarisk"
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+    
+    def __init__(self, debug: bool = False, api_url: str = None, max_concurrency: int = 4,
+                 requests_per_second: float = 1.0, max_requests_per_second: float = 10.0,
+                 max_retries: int = 3, timeout: float = 30, cache_path: str = None,
+                 grid_resolution: float = 30.0, cache_ttl_days: float = 30,
+                 cache_max_entries: int = None, raster_dir: str = None,
+                 checkpoint_dir: str = None, batch_retry_rounds: int = 1):
+        self.api_url = api_url or "https://gis.bnpb.go.id/server/rest/services/inarisk"
         self.hazard_layers = {
             "earthquake": "INDEKS_BAHAYA_GEMPABUMI",
             "flood": "INDEKS_BAHAYA_BANJIR",
@@ -17,89 +89,337 @@ class INARISKClient:
             "landslide": "INDEKS_BAHAYA_TANAHLONGSOR"
         }
         self.debug = debug
+        # Hazard raster cell size in metres (EPSG:3857) used for snapping and caching
+        self.grid_resolution = grid_resolution
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        
+        # Pooled keep-alive session shared by all concurrent batch requests
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1,
+                              pool_maxsize=self.max_concurrency * len(self.hazard_layers))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.rate_limiter = AdaptiveRateLimiter(
+            rate=requests_per_second,
+            max_rate=max_requests_per_second,
+            capacity=self.max_concurrency
+        )
+        
+        # Optional persistent cache of samples keyed by layer and grid cell
+        self.cache = None
+        if cache_path:
+            self.cache = HazardCache(cache_path, resolution=grid_resolution,
+                                     ttl_days=cache_ttl_days, max_entries=cache_max_entries)
+        
+        # Optional directory of local hazard rasters (<LAYER>.tif or <LAYER>.npy)
+        # sampled in-process instead of calling the ImageServer
+        self.raster_dir = raster_dir
+        self._rasters = {}
+        
+        # Optional journal of completed batches so interrupted runs resume where
+        # they stopped; in this mode points that could not be fetched are NaN
+        self.checkpoint_dir = checkpoint_dir
+        self.batch_retry_rounds = batch_retry_rounds
+        if checkpoint_dir and not os.path.exists(checkpoint_dir):
+            os.makedirs(checkpoint_dir)
+        # Number of points per hazard layer left without a value by the last
+        # request, for reporting; each call decides on its own counts
+        self.failures = {}
+        self._failures_lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_rasters'] = {}
+        del state['_failures_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._failures_lock = threading.Lock()
+
+    def local_raster(self, hazard_layer: str):
+        """Open (once) the local raster of a hazard layer, None if there is none"""
+        if not self.raster_dir:
+            return None
+        if hazard_layer not in self._rasters:
+            path = find_layer_raster(self.raster_dir, hazard_layer)
+            self._rasters[hazard_layer] = HazardRaster.open(path) if path else None
+            if path is None:
+                print(f"No local raster for {hazard_layer} in {self.raster_dir}, using the INARISK API")
+        return self._rasters[hazard_layer]
 
     def lat_lon_to_meters(self, lat, lon):
-        """Convert latitude/longitude to Spherical Mercator (EPSG:3857)."""
+        """Convert latitude/longitude (scalars or arrays) to Spherical Mercator (EPSG:3857)."""
         origin_shift = 2 * math.pi * 6378137 / 2.0
-        x = lon / 180.0 * origin_shift
-        y = math.log(math.tan(((lat * math.pi / 180) + math.pi / 2.0) / 2)) * 180 / math.pi
+        x = np.asarray(lon) / 180.0 * origin_shift
+        y = np.log(np.tan(((np.asarray(lat) * math.pi / 180) + math.pi / 2.0) / 2)) * 180 / math.pi
         y = y / 180.0 * origin_shift
         return x, y
     
+    def meters_to_lat_lon(self, x, y):
+        """Convert Spherical Mercator (EPSG:3857) coordinates back to latitude/longitude."""
+        origin_shift = 2 * math.pi * 6378137 / 2.0
+        lon = np.asarray(x) / origin_shift * 180.0
+        lat = np.asarray(y) / origin_shift * 180.0
+        lat = 180 / math.pi * (2 * np.arctan(np.exp(lat * math.pi / 180.0)) - math.pi / 2.0)
+        return lat, lon
+
+    def project_points(self, points) -> np.ndarray:
+        """Project (lat, lon) points to an (n, 2) array of EPSG:3857 (x, y) metres"""
+        lat_lon = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return np.column_stack(self.lat_lon_to_meters(lat_lon[:, 0], lat_lon[:, 1]))
+
+    def snap_points(self, points):
+        """
+        Snap (lat, lon) points to hazard grid cell centres and deduplicate them
+        
+        Returns:
+            tuple: (unique_points, inverse) where unique_points is an (m, 2)
+            array of (lat, lon) cell centres and unique_points[inverse[i]] is
+            the cell of points[i]
+        """
+        if len(points) == 0:
+            return np.zeros((0, 2)), np.zeros(0, dtype=np.int64)
+        
+        cells = np.floor(self.project_points(points) / self.grid_resolution).astype(np.int64)
+        unique_cells, inverse = np.unique(cells, axis=0, return_inverse=True)
+        
+        centres = (unique_cells + 0.5) * self.grid_resolution
+        lat, lon = self.meters_to_lat_lon(centres[:, 0], centres[:, 1])
+        return np.column_stack((lat, lon)), inverse.reshape(-1)
+
     def get_risk_for_points(self, points, hazard_type, batch_size=20):
+        """Get risk values of one hazard for multiple points."""
+        return self.get_risk_matrix(points, [hazard_type], batch_size=batch_size)[:, 0].tolist()
+
+    def get_risk_matrix(self, points, hazard_types, batch_size=20) -> np.ndarray:
+        """
+        Get risk values of several hazards for the same points in one pass
+        
+        Points are projected once, local rasters are sampled in-process and
+        the remaining hazard layers are fetched from INARISK concurrently.
+        
+        Args:
+            points: Sequence or (n, 2) array of (lat, lon) points
+            hazard_types (List[str]): Hazard types, e.g. ['earthquake', 'flood']
+            batch_size (int): Points per INARISK request
+            
+        Returns:
+            np.ndarray: (n, len(hazard_types)) risk values, column j for hazard_types[j]
+        """
         if self.debug:
             start_time = time.time()
             print(f"\nRisk scraping started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
-        """Get risk values for multiple points."""
-        if hazard_type not in self.hazard_layers:
-            raise ValueError(f"Invalid hazard type. Must be one of {list(self.hazard_layers.keys())}")
-            
-        hazard_layer = self.hazard_layers[hazard_type]
-        print(f"Getting {hazard_type} risk for {len(points)} points...")
+        for hazard_type in hazard_types:
+            if hazard_type not in self.hazard_layers:
+                raise ValueError(f"Invalid hazard type. Must be one of {list(self.hazard_layers.keys())}")
         
-        meter_points = [self.lat_lon_to_meters(lat, lon) for lat, lon in points]
-        point_batches = [meter_points[i:i+batch_size] for i in range(0, len(meter_points), batch_size)]
+        lat_lon = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        print(f"Getting {', '.join(hazard_types)} risk for {len(lat_lon)} points...")
         
-        all_results = []
+        risk_values = np.zeros((len(lat_lon), len(hazard_types)))
+        failures = {}
+        remote = []
+        for column, hazard_type in enumerate(hazard_types):
+            raster = self.local_raster(self.hazard_layers[hazard_type])
+            if raster is not None:
+                # Offline mode: points outside the raster or on nodata count as 0.0
+                risk_values[:, column] = np.nan_to_num(raster.sample(lat_lon[:, 0], lat_lon[:, 1]), nan=0.0)
+                failures[self.hazard_layers[hazard_type]] = 0
+            else:
+                remote.append(column)
         
-        for point_batch in tqdm(point_batches, desc="Processing batches", disable=not self.debug):
-            
-            geometry = {
-                "points": point_batch,
-                "spatialReference": {"wkid": 3857}
-            }
+        if remote:
+            meter_points = self.project_points(lat_lon)
+            # One thread per hazard layer, each with up to max_concurrency batches in flight
+            with ThreadPoolExecutor(max_workers=len(remote)) as executor:
+                futures = {
+                    executor.submit(self._fetch_risk, meter_points,
+                                    self.hazard_layers[hazard_types[column]], batch_size): column
+                    for column in remote
+                }
+                journals = []
+                for future in as_completed(futures):
+                    risk_values[:, futures[future]], journal, failed = future.result()
+                    failures[self.hazard_layers[hazard_types[futures[future]]]] = failed
+                    if journal is not None:
+                        journals.append(journal)
             
-            url = f"{self.api_url}/{hazard_layer}/ImageServer/getSamples"
-            params = {
-                "geometryType": "esriGeometryMultipoint",
-                "geometry": json.dumps(geometry),
-                "sampleDistance": "1.25",
-                "returnFirstValueOnly": "true",
-                "interpolation": "RSP_BilinearInterpolation",
-                "f": "pjson"
-            }
+            # Journals are only needed to resume an incomplete run
+            if not any(failures.values()):
+                for journal in journals:
+                    if os.path.exists(journal):
+                        os.remove(journal)
+        
+        with self._failures_lock:
+            self.failures.update(failures)
+        
+        if self.debug:
+            end_time = time.time()
+            execution_time = end_time - start_time
+            print(f"\nRisk scraping completed at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+            print(f"Total risk scraping time: {execution_time:.2f} seconds")
+
+        return risk_values
+
+    def _fetch_risk(self, meter_points, hazard_layer, batch_size):
+        """
+        Sample a hazard layer at projected points through the ImageServer, using the cache when enabled
+        
+        Returns:
+            tuple: (risk_values, journal, failures) where journal is the
+            checkpoint file of this request, or None outside checkpoint mode,
+            and failures the number of points left without a value
+        """
+        risk_values = np.zeros(len(meter_points))
+        
+        # Only points whose grid cell is not cached yet are fetched
+        missing = np.arange(len(meter_points))
+        if self.cache is not None:
+            cells = self.cache.cells(meter_points)
+            cached = self.cache.get_many(hazard_layer, cells)
+            missing = np.flatnonzero(np.isnan(cached))
+            risk_values = np.where(np.isnan(cached), 0.0, cached)
+            if self.debug:
+                print(f"Hazard cache ({hazard_layer}): {len(meter_points) - len(missing)} hits, "
+                      f"{len(missing)} misses")
+        
+        fetch_points = meter_points[missing]
+        point_batches = [fetch_points[i:i+batch_size].tolist() for i in range(0, len(fetch_points), batch_size)]
+        
+        url = f"{self.api_url}/{hazard_layer}/ImageServer/getSamples"
+        batch_results = [None] * len(point_batches)
+        
+        journal = None
+        if self.checkpoint_dir and point_batches:
+            journal = self._journal_path(hazard_layer, fetch_points, batch_size)
+            for batch_idx, values in self._read_journal(journal):
+                if batch_idx < len(point_batches) and len(values) == len(point_batches[batch_idx]):
+                    batch_results[batch_idx] = values
+            resumed = sum(batch is not None for batch in batch_results)
+            if resumed:
+                print(f"Resuming {hazard_layer}: {resumed} of {len(point_batches)} batches already fetched")
+        
+        # In checkpoint mode failed batches get extra rounds before giving up
+        rounds = 1 + (self.batch_retry_rounds if journal else 0)
+        for round_idx in range(rounds):
+            pending = [batch_idx for batch_idx, batch in enumerate(batch_results) if batch is None]
+            if not pending:
+                break
+            if round_idx > 0:
+                print(f"Retrying {len(pending)} failed {hazard_layer} batches...")
             
+            # Up to max_concurrency batches in flight, paced by the adaptive rate limiter
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                futures = {
+                    executor.submit(self._fetch_batch, url, point_batches[batch_idx], batch_idx): batch_idx
+                    for batch_idx in pending
+                }
+                for future in tqdm(as_completed(futures), total=len(futures),
+                                   desc=f"Processing {hazard_layer} batches", disable=not self.debug):
+                    batch_idx = futures[future]
+                    batch_results[batch_idx] = future.result()
+                    if journal is not None and batch_results[batch_idx] is not None:
+                        self._append_journal(journal, batch_idx, batch_results[batch_idx])
+        
+        # Failed batches are not cached; they count as 0.0 risk, or NaN in checkpoint mode
+        fetched = np.full(len(fetch_points), np.nan if self.checkpoint_dir else 0.0)
+        succeeded = np.zeros(len(fetch_points), dtype=bool)
+        for batch_idx, batch in enumerate(batch_results):
+            if batch is not None:
+                start = batch_idx * batch_size
+                fetched[start:start + len(batch)] = batch
+                succeeded[start:start + len(batch)] = True
+        risk_values[missing] = fetched
+        
+        failures = int(np.count_nonzero(~succeeded))
+        if failures:
+            print(f"Warning: {failures} of {len(meter_points)} {hazard_layer} "
+                  f"points could not be fetched" + (", rerun to retry them" if journal else ""))
+        
+        if self.cache is not None and succeeded.any():
+            self.cache.put_many(hazard_layer, cells[missing[succeeded]], fetched[succeeded])
+        return risk_values, journal, failures
+
+    def _journal_path(self, hazard_layer, fetch_points, batch_size):
+        """Journal file identifying one layer, point set and batching"""
+        digest = hashlib.sha1(np.ascontiguousarray(fetch_points).tobytes())
+        digest.update(f"{hazard_layer}:{batch_size}".encode())
+        return os.path.join(self.checkpoint_dir, f"{hazard_layer}_{digest.hexdigest()[:16]}.jsonl")
+
+    def _read_journal(self, path):
+        """Yield (batch_idx, values) of journaled batches, skipping a torn last line"""
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                yield entry['batch'], entry['values']
+
+    def _append_journal(self, path, batch_idx, values):
+        with open(path, 'a') as f:
+            f.write(json.dumps({'batch': batch_idx, 'values': values}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _fetch_batch(self, url, point_batch, batch_idx):
+        """Fetch samples for one batch of projected points, retrying on 429/5xx
+
+        Returns:
+            list: Risk value per point, or None if the batch could not be fetched
+        """
+        geometry = {
+            "points": point_batch,
+            "spatialReference": {"wkid": 3857}
+        }
+        params = {
+            "geometryType": "esriGeometryMultipoint",
+            "geometry": json.dumps(geometry),
+            "sampleDistance": "1.25",
+            "returnFirstValueOnly": "true",
+            "interpolation": "RSP_BilinearInterpolation",
+            "f": "pjson"
+        }
+        
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
             try:
-                # if self.debug:
-                #     print("Sending request to INARISK API...")
-                
-                response = requests.get(url, params=params)
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                if response.status_code in self.RETRY_STATUS_CODES and attempt < self.max_retries:
+                    retry_after = response.headers.get('Retry-After')
+                    self.rate_limiter.on_throttle(
+                        float(retry_after) if retry_after and retry_after.isdigit() else 2 ** attempt
+                    )
+                    continue
                 response.raise_for_status()
                 result = response.json()
+                self.rate_limiter.on_success()
                 
-                if 'samples' in result:
-                    batch_results = []
-                    for i, sample in enumerate(result['samples']):
-                        try:
-                            risk_value = sample.get('value', '')
-                            risk_value = float(risk_value) if risk_value != '' else 0.0
-                        except (ValueError, TypeError):
-                            risk_value = 0.0
-                            
-                        batch_results.append(risk_value)
-                        
-                        # if self.debug:
-                        #     orig_point = points[batch_idx * batch_size + i]
-                        #     print(f"Point {i+1}: ({orig_point[0]:.6f}, {orig_point[1]:.6f}) -> Risk: {risk_value}")
-                    
-                    all_results.extend(batch_results)
-                else:
-                    if self.debug:
-                        print("No samples in response")
-                    all_results.extend([0.0] * len(point_batch))
-                    
             except Exception as e:
+                if isinstance(e, (requests.ConnectionError, requests.Timeout)) and attempt < self.max_retries:
+                    self.rate_limiter.on_throttle(2 ** attempt)
+                    continue
                 if self.debug:
                     print(f"Error in batch {batch_idx+1}: {e}")
-                all_results.extend([0.0] * len(point_batch))
+                return None
             
-            time.sleep(1)  # Rate limiting
-        
-        if self.debug:
-            end_time = time.time()
-            execution_time = end_time - start_time
-            print(f"\nRisk scraping completed at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            print(f"Total risk scraping time: {execution_time:.2f} seconds")
-
-        return all_results
\ No newline at end of file
+            if 'samples' not in result or len(result['samples']) != len(point_batch):
+                if self.debug:
+                    print(f"Missing or incomplete samples in response for batch {batch_idx+1}")
+                return None
+            
+            batch_results = []
+            for sample in result['samples']:
+                try:
+                    risk_value = sample.get('value', '')
+                    risk_value = float(risk_value) if risk_value != '' else 0.0
+                except (ValueError, TypeError):
+                    risk_value = 0.0
+                batch_results.append(risk_value)
+            return batch_results
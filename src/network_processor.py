@@ -5,22 +5,140 @@ Handles PYCGR files and network graph processing similar to respondor-main's osm
 
 import json
 import csv
+import hashlib
+import multiprocessing as mp
 import networkx as nx
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 from shapely.geometry import Point, LineString
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, NamedTuple, Tuple, Optional
 import os
+from itertools import islice
 from networkx.readwrite import json_graph
+from networkx.algorithms.approximation import steiner_tree
+import scipy.sparse as sp
+from scipy.sparse.csgraph import dijkstra, minimum_spanning_tree
+from .csr_graph import CSRGraph
+from .graph_search import dijkstra_to_targets
+from .contraction_hierarchy import ContractionHierarchy
+from .spatial_index import NodeIndex, EdgeIndex, haversine_meters
+
+# Columnar layout of the PYCGR node and edge sections
+PYCGR_NODE_DTYPE = np.dtype([('id', np.int64), ('lat', np.float64), ('lon', np.float64)])
+PYCGR_EDGE_DTYPE = np.dtype([
+    ('source', np.int64), ('target', np.int64), ('length', np.float64),
+    ('street_type', np.int16), ('max_speed', np.float64), ('bidirectional', np.bool_)
+])
+
+
+class PYCGRNetwork(NamedTuple):
+    """
+    Nodes and edges of a PYCGR file as NumPy structured arrays
+
+    nodes has PYCGR_NODE_DTYPE and edges PYCGR_EDGE_DTYPE; edge street types
+    are int16 codes into street_types (-1 when missing).
+    """
+    nodes: np.ndarray
+    edges: np.ndarray
+    street_types: List[str]
+
+
+# Bumped whenever the layout of the binary network cache changes
+NETWORK_CACHE_VERSION = 2
+
+
+# NetworkProcessor, graph and POI nodes used by create_subnetwork worker
+# processes. They are set before the pool starts so forked workers inherit
+# them rather than unpickling the graph
+_SUBNETWORK_STATE = None
+
+
+def _init_subnetwork_worker(state=None):
+    """Pool initializer for start methods that cannot inherit the graph"""
+    global _SUBNETWORK_STATE
+    if state is not None:
+        _SUBNETWORK_STATE = state
+
+
+def _subnetwork_chunk(positions):
+    """Path nodes from a chunk of source POI positions in a worker process"""
+    processor, graph, poi_nodes = _SUBNETWORK_STATE
+    return _subnetwork_sources(processor, graph, poi_nodes, positions)
+
+
+def _subnetwork_sources(processor, graph, poi_nodes, positions):
+    """
+    Union of shortest paths from POIs at positions to every later POI
+
+    Returns:
+        tuple: (path nodes, paths found, unreachable (source, target) pairs)
+    """
+    all_path_nodes = set()
+    path_count = 0
+    missing = []
+    # Distances from the first trees grown to all POIs, bounding later searches
+    hubs = []
+    for i in positions:
+        targets = poi_nodes[i+1:]
+        limit = _tree_search_limit(hubs, i) if isinstance(graph, CSRGraph) else np.inf
+        nodes, target_dist = processor._paths_from_source(graph, poi_nodes[i], targets, limit)
+        all_path_nodes.update(nodes)
+        reached = np.isfinite(target_dist)
+        path_count += int(reached.sum())
+        for target in np.asarray(targets, dtype=object)[~reached].tolist():
+            if isinstance(graph, CSRGraph):
+                missing.append((graph.node_key(poi_nodes[i]), graph.node_key(target)))
+            else:
+                missing.append((poi_nodes[i], target))
+        if isinstance(graph, CSRGraph) and len(hubs) < 16:
+            row = np.full(len(poi_nodes), np.inf)
+            row[i] = 0.0
+            row[i+1:] = target_dist
+            hubs.append(row)
+    return all_path_nodes, path_count, missing
+
+
+def _tree_search_limit(hubs, i: int) -> float:
+    """
+    Search radius from POI i that still reaches every later POI it is connected to
+
+    For every hub POI k whose tree reached i, d(i, j) <= d(k, i) + d(k, j);
+    POIs a hub reached i but not j from lie in another component.
+    """
+    bound = None
+    for row in hubs:
+        if np.isfinite(row[i]):
+            through_hub = row[i] + row[i+1:]
+            bound = through_hub if bound is None else np.minimum(bound, through_hub)
+    if bound is None:
+        return np.inf
+    bound = bound[np.isfinite(bound)]
+    # Slack so floating point rounding never cuts off a target
+    return float(bound.max()) * (1 + 1e-9) + 1e-9 if len(bound) else 0.0
+
 
 class NetworkProcessor:
     """
     Processes network graph files in PYCGR format and JSON format
     Compatible with respondor-main network processing
+
+    backend selects the in-memory graph built from PYCGR files: 'networkx'
+    (nx.Graph keyed by node id) or 'csr' (compact array-backed CSRGraph)
+
+    With network_cache, the parsed arrays and the CSR graph of a PYCGR file
+    are written to a binary <file>.cache directory the first time the file is
+    loaded and memory-mapped on later runs. The cache is rebuilt when the
+    size or content of the PYCGR file changes.
     """
     
-    def __init__(self, debug: bool = False):
+    def __init__(self, debug: bool = False, backend: str = 'networkx',
+                 network_cache: bool = True):
+        if backend not in ('networkx', 'csr'):
+            raise ValueError("backend must be 'networkx' or 'csr'")
         self.debug = debug
+        self.backend = backend
+        self.network_cache = network_cache
 
     def read_pycgr_file(self, pycgr_path: str) -> Tuple[Dict, List]:
         """
@@ -82,6 +200,175 @@ class NetworkProcessor:
             
         return nodes, edges
 
+    def read_pycgr_arrays(self, pycgr_path: str) -> PYCGRNetwork:
+        """
+        Read PYCGR file into structured arrays
+        
+        Both sections are parsed in bulk by the pandas C parser instead of line
+        by line, and street types are read as a categorical so each distinct
+        type is stored once. The graph builders consume the arrays directly.
+        
+        Args:
+            pycgr_path (str): Path to PYCGR file
+            
+        Returns:
+            PYCGRNetwork: (nodes, edges, street_types)
+        """
+        cache_meta = self._load_network_cache_meta(pycgr_path)
+        if cache_meta is not None:
+            cache_dir = self._network_cache_dir(pycgr_path)
+            print(f'Loading cached network: {cache_dir}')
+            return PYCGRNetwork(
+                np.load(os.path.join(cache_dir, 'nodes.npy'), mmap_mode='r'),
+                np.load(os.path.join(cache_dir, 'edges.npy'), mmap_mode='r'),
+                cache_meta['street_types']
+            )
+        
+        print(f'Reading PYCGR file: {pycgr_path}')
+        stat = os.stat(pycgr_path)
+        
+        # Seven comment lines followed by the node and edge counts
+        with open(pycgr_path) as f:
+            header = list(islice(f, 9))
+            total_nodes = int(header[7].strip())
+
+            # The parser skips blank lines when counting nrows but not skiprows,
+            # so the edge section starts after the last non-blank node line
+            edge_start = 9
+            remaining = total_nodes
+            for line in f:
+                if remaining == 0:
+                    break
+                edge_start += 1
+                if line.strip():
+                    remaining -= 1
+
+        csv_options = dict(sep=r'\s+', header=None, engine='c', float_precision='round_trip')
+        nodes_df = pd.read_csv(
+            pycgr_path, skiprows=9, nrows=total_nodes,
+            names=['id', 'lat', 'lon'], usecols=range(3),
+            dtype={'id': np.int64, 'lat': np.float64, 'lon': np.float64},
+            **csv_options
+        )
+        if nodes_df['id'].duplicated().any():
+            # Repeated ids keep their first position and last coordinates
+            nodes_df = nodes_df.groupby('id', sort=False).last().reset_index()
+        
+        edges_df = pd.read_csv(
+            pycgr_path, skiprows=edge_start,
+            names=['source', 'target', 'length', 'street_type', 'max_speed', 'bidirectional'],
+            usecols=range(6), dtype={'street_type': 'category'}, on_bad_lines='skip',
+            **csv_options
+        )
+        
+        # Like read_pycgr_file, edge lines with fewer than six fields or values
+        # that are not numbers (or integer ids) are skipped
+        numeric = ['source', 'target', 'length', 'max_speed', 'bidirectional']
+        edges_df[numeric] = edges_df[numeric].apply(pd.to_numeric, errors='coerce')
+        valid = (edges_df[numeric].notna().all(axis=1)
+                 & (edges_df['source'] % 1 == 0) & (edges_df['target'] % 1 == 0))
+        if not valid.all():
+            print(f"Warning: skipped {int((~valid).sum())} malformed edge lines in {pycgr_path}")
+            edges_df = edges_df[valid]
+            edges_df['street_type'] = edges_df['street_type'].cat.remove_unused_categories()
+        
+        nodes = np.empty(len(nodes_df), dtype=PYCGR_NODE_DTYPE)
+        for name in PYCGR_NODE_DTYPE.names:
+            nodes[name] = nodes_df[name].to_numpy()
+        
+        street_types = edges_df['street_type'].cat
+        edges = np.empty(len(edges_df), dtype=PYCGR_EDGE_DTYPE)
+        for name in ('source', 'target', 'length', 'max_speed'):
+            edges[name] = edges_df[name].to_numpy()
+        edges['street_type'] = street_types.codes.to_numpy()
+        edges['bidirectional'] = edges_df['bidirectional'].to_numpy() != 0
+        
+        if self.debug:
+            print(f"Loaded {len(nodes)} nodes and {len(edges)} edges from PYCGR file")
+            
+        network = PYCGRNetwork(nodes, edges, [str(t) for t in street_types.categories])
+        if self.network_cache:
+            self._write_network_cache(pycgr_path, stat, network)
+            
+        return network
+
+    def _network_cache_dir(self, pycgr_path: str) -> str:
+        return f"{pycgr_path}.cache"
+
+    @staticmethod
+    def _file_sha1(path: str) -> str:
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _save_cache_file(self, path: str, write):
+        """Write a cache file under a temporary name and rename it into place"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+
+    def _save_network_cache_meta(self, cache_dir: str, meta: dict):
+        self._save_cache_file(os.path.join(cache_dir, 'meta.json'),
+                              lambda f: f.write(json.dumps(meta).encode()))
+
+    def _load_network_cache_meta(self, pycgr_path: str) -> Optional[dict]:
+        """
+        Metadata of the binary cache of a PYCGR file, None if missing or stale
+        
+        A cache whose source has the same size but a new modification time
+        (e.g. a copied or touched file) is kept if the content hash still matches.
+        """
+        if not self.network_cache:
+            return None
+        
+        cache_dir = self._network_cache_dir(pycgr_path)
+        try:
+            with open(os.path.join(cache_dir, 'meta.json')) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        stat = os.stat(pycgr_path)
+        if meta.get('version') != NETWORK_CACHE_VERSION or meta.get('source_size') != stat.st_size:
+            return None
+        if meta.get('source_mtime') != stat.st_mtime:
+            if meta.get('source_sha1') != self._file_sha1(pycgr_path):
+                return None
+            meta['source_mtime'] = stat.st_mtime
+            try:
+                self._save_network_cache_meta(cache_dir, meta)
+            except OSError:
+                pass
+        return meta
+
+    def _write_network_cache(self, pycgr_path: str, stat: os.stat_result, network: PYCGRNetwork):
+        """Write the parsed arrays of a PYCGR file to its binary cache"""
+        cache_dir = self._network_cache_dir(pycgr_path)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Invalidate first so a partially rewritten cache is never used
+            if os.path.exists(os.path.join(cache_dir, 'meta.json')):
+                os.remove(os.path.join(cache_dir, 'meta.json'))
+            for name in ('nodes', 'edges'):
+                array = getattr(network, name)
+                self._save_cache_file(os.path.join(cache_dir, f'{name}.npy'),
+                                      lambda f: np.save(f, array))
+            self._save_network_cache_meta(cache_dir, {
+                'version': NETWORK_CACHE_VERSION,
+                'source_mtime': stat.st_mtime,
+                'source_size': stat.st_size,
+                'source_sha1': self._file_sha1(pycgr_path),
+                'street_types': network.street_types,
+                'csr': False
+            })
+            if self.debug:
+                print(f"Saved network cache: {cache_dir}")
+        except OSError as e:
+            print(f"Warning: Could not write network cache {cache_dir}: {e}")
+
     def read_network_json(self, json_path: str) -> nx.Graph:
         """
         Read NetworkX JSON file (adjacency format)
@@ -114,33 +401,205 @@ class NetworkProcessor:
         Returns:
             nx.Graph: NetworkX graph
         """
-        nodes, edges = self.read_pycgr_file(pycgr_path)
+        nodes, edges, street_types = self.read_pycgr_arrays(pycgr_path)
         
         # Create NetworkX graph
         G = nx.Graph()
         
         # Add nodes
-        for node_id, node_data in nodes.items():
-            G.add_node(int(node_id), 
-                      lat=node_data['lat'], 
-                      lon=node_data['lon'])
+        G.add_nodes_from(
+            (node_id, {'lat': lat, 'lon': lon})
+            for node_id, lat, lon in zip(nodes['id'].tolist(), nodes['lat'].tolist(),
+                                         nodes['lon'].tolist())
+        )
         
         # Add edges
-        for edge in edges:
-            source_id = int(edge['source_id'])
-            target_id = int(edge['target_id'])
-            
-            G.add_edge(source_id, target_id,
-                      length=edge['length'],
-                      highway=edge['street_type'],
-                      max_speed=edge['max_speed'],
-                      bidirectional=edge['bidirectional'])
+        G.add_edges_from(
+            (source_id, target_id, {
+                'length': length,
+                'highway': street_types[code] if code >= 0 else None,
+                'max_speed': max_speed,
+                'bidirectional': bidirectional
+            })
+            for source_id, target_id, length, code, max_speed, bidirectional in zip(
+                edges['source'].tolist(),
+                edges['target'].tolist(),
+                edges['length'].tolist(),
+                edges['street_type'].tolist(),
+                edges['max_speed'].tolist(),
+                edges['bidirectional'].tolist()
+            )
+        )
         
         if self.debug:
             print(f"Created NetworkX graph with {G.number_of_nodes()} nodes and {G.number_of_edges()} edges")
             
         return G
 
+    def create_graph_from_pycgr(self, pycgr_path: str):
+        """
+        Create a graph from PYCGR file using the configured backend
+        
+        Args:
+            pycgr_path (str): Path to PYCGR file
+            
+        Returns:
+            nx.Graph or CSRGraph: Network graph
+        """
+        if self.backend == 'csr':
+            return self.create_csr_from_pycgr(pycgr_path)
+        return self.create_networkx_from_pycgr(pycgr_path)
+
+    def create_csr_from_pycgr(self, pycgr_path: str) -> CSRGraph:
+        """
+        Create compact CSR graph from PYCGR file
+        
+        Edge weight and distance are the PYCGR edge length; node ids are kept
+        as external ids so POI matching and subnetworks use the same ids as the
+        networkx backend.
+        
+        The graph is memory-mapped from the network cache when it has been
+        built before.
+        
+        Args:
+            pycgr_path (str): Path to PYCGR file
+            
+        Returns:
+            CSRGraph: Array-backed graph
+        """
+        cache_meta = self._load_network_cache_meta(pycgr_path)
+        if cache_meta is not None and cache_meta.get('csr'):
+            csr_dir = os.path.join(self._network_cache_dir(pycgr_path), 'csr')
+            G = CSRGraph.load(csr_dir)
+            print(f"Loaded cached CSR graph with {G.number_of_nodes()} nodes and "
+                  f"{G.number_of_edges()} edges: {csr_dir}")
+            return G
+        
+        nodes, edges, street_types = self.read_pycgr_arrays(pycgr_path)
+        
+        node_ids = nodes['id']
+        coords = np.column_stack((nodes['lon'], nodes['lat']))
+        
+        # Map edge endpoint ids to node indices, dropping edges to unknown nodes
+        order = np.argsort(node_ids)
+        sorted_ids = node_ids[order]
+        endpoints = np.column_stack((edges['source'], edges['target']))
+        pos = np.clip(np.searchsorted(sorted_ids, endpoints), 0, max(len(sorted_ids) - 1, 0))
+        known = (sorted_ids[pos] == endpoints).all(axis=1) if len(sorted_ids) else np.zeros(len(endpoints), bool)
+        endpoints = order[pos[known]]
+        edges = edges[known]
+        
+        G = CSRGraph.from_edges(
+            coords, endpoints[:, 0], endpoints[:, 1], edges['length'],
+            highway=pd.Categorical.from_codes(edges['street_type'], street_types),
+            node_ids=node_ids,
+            extra_columns={
+                'max_speed': edges['max_speed'].astype(np.float32),
+                'bidirectional': edges['bidirectional']
+            }
+        )
+        
+        if self.debug:
+            print(f"Created CSR graph with {G.number_of_nodes()} nodes and {G.number_of_edges()} edges")
+        
+        # Add the graph to the cache written by read_pycgr_arrays
+        cache_meta = self._load_network_cache_meta(pycgr_path)
+        if cache_meta is not None:
+            cache_dir = self._network_cache_dir(pycgr_path)
+            try:
+                G.save(os.path.join(cache_dir, 'csr'))
+                cache_meta['csr'] = True
+                self._save_network_cache_meta(cache_dir, cache_meta)
+            except OSError as e:
+                print(f"Warning: Could not write network cache {cache_dir}: {e}")
+            
+        return G
+
+    def load_contraction_hierarchy(self, pycgr_path: str, graph: CSRGraph = None) -> ContractionHierarchy:
+        """
+        Load the contraction hierarchy stored next to a PYCGR file
+        
+        The hierarchy is saved as <pycgr_path>.ch.npz. It is rebuilt and saved
+        again when missing or when the PYCGR file has changed since it was built.
+        
+        Args:
+            pycgr_path (str): Path to PYCGR file
+            graph (CSRGraph, optional): CSR graph already built from the file
+            
+        Returns:
+            ContractionHierarchy: Uncustomized hierarchy over the PYCGR network
+        """
+        ch_path = f"{pycgr_path}.ch.npz"
+        stat = os.stat(pycgr_path)
+        
+        if os.path.exists(ch_path):
+            hierarchy, metadata = ContractionHierarchy.load(ch_path)
+            if (metadata.get('source_mtime') == stat.st_mtime and
+                    metadata.get('source_size') == stat.st_size):
+                if self.debug:
+                    print(f"Loaded contraction hierarchy: {ch_path}")
+                return hierarchy
+        
+        print(f"Building contraction hierarchy for: {pycgr_path}")
+        if not isinstance(graph, CSRGraph):
+            graph = self.create_csr_from_pycgr(pycgr_path)
+        
+        hierarchy = ContractionHierarchy.build(graph, debug=self.debug)
+        hierarchy.save(ch_path, source_mtime=stat.st_mtime, source_size=stat.st_size)
+        print(f"Saved contraction hierarchy: {ch_path}")
+        
+        return hierarchy
+
+    def csr_to_networkx(self, graph: CSRGraph, nodes=None) -> nx.Graph:
+        """
+        Convert a PYCGR-derived CSR graph (or the subgraph induced by some of
+        its node indices) to a NetworkX graph with the same attributes as
+        create_networkx_from_pycgr
+        
+        Args:
+            graph (CSRGraph): CSR graph built by create_csr_from_pycgr
+            nodes (optional): Node indices to keep; all nodes if omitted
+            
+        Returns:
+            nx.Graph: NetworkX graph keyed by PYCGR node id
+        """
+        keep = np.ones(graph.number_of_nodes(), dtype=bool)
+        if nodes is not None:
+            keep[:] = False
+            keep[np.asarray(list(nodes), dtype=np.int64)] = True
+        
+        lengths = np.asarray(graph.distance, dtype=np.float64)
+        
+        G = nx.Graph()
+        node_index = np.flatnonzero(keep)
+        G.add_nodes_from(
+            (node_id, {'lat': lat, 'lon': lon})
+            for node_id, lon, lat in zip(graph.node_ids[node_index].tolist(),
+                                         graph.coords[node_index, 0].tolist(),
+                                         graph.coords[node_index, 1].tolist())
+        )
+        
+        sources, targets, arcs = graph.edge_list()
+        inside = keep[sources] & keep[targets]
+        sources, targets, arcs = sources[inside], targets[inside], arcs[inside]
+        G.add_edges_from(
+            (source_id, target_id, {
+                'length': length,
+                'highway': graph.highway_types[code] if code >= 0 else None,
+                'max_speed': max_speed,
+                'bidirectional': bidirectional
+            })
+            for source_id, target_id, length, code, max_speed, bidirectional in zip(
+                graph.node_ids[sources].tolist(),
+                graph.node_ids[targets].tolist(),
+                lengths[arcs].tolist(),
+                graph.highway[arcs].tolist(),
+                graph.columns['max_speed'][arcs].astype(np.float64).tolist(),
+                graph.columns['bidirectional'][arcs].tolist()
+            )
+        )
+        return G
+
     def create_roads_geodataframe(self, graph: nx.Graph) -> gpd.GeoDataFrame:
         """
         Convert NetworkX graph to GeoDataFrame of road segments
@@ -184,17 +643,39 @@ class NetworkProcessor:
             
         return roads_gdf
 
-    def match_pois_to_network(self, pois_csv_path: str, graph: nx.Graph) -> pd.DataFrame:
+    def match_pois_to_network(self, pois_csv_path: str, graph, method: str = 'index',
+                              k: int = 1, max_distance: float = None) -> pd.DataFrame:
         """
         Match POIs from CSV file to nearest network nodes
         
+        The default 'index' method queries all POIs at once against a KD-tree
+        of the node coordinates on the unit sphere, so matches are by true
+        great-circle distance at any latitude. 'edge' projects every POI onto
+        its nearest edge through an STRtree instead; node_id is then the
+        nearer end of that edge, and the edge, the position of the projection
+        along it and the projected point are reported so routing can start
+        from the projection. 'scan' is the original pairwise search by
+        Euclidean distance in degrees.
+        
         Args:
             pois_csv_path (str): Path to POIs CSV file
-            graph (nx.Graph): Network graph
+            graph (nx.Graph or CSRGraph): Network graph
+            method (str): 'index', 'edge' or 'scan'
+            k (int): With 'index', also report the k nearest candidate nodes
+                per POI in candidate_node_ids / candidate_distances
+            max_distance (float, optional): With 'index' or 'edge', leave POIs
+                farther than this many meters from the network unmatched
+                (node_id <NA>)
             
         Returns:
-            pd.DataFrame: POIs with matched node IDs
+            pd.DataFrame: POIs with matched node IDs and distance_to_node
+            (meters for 'index' and 'edge', degrees for 'scan'); with 'edge'
+            also edge_source_id, edge_target_id, edge_fraction (0 at the
+            source), snap_lat, snap_lng and distance_to_edge (meters)
         """
+        if method not in ('index', 'edge', 'scan'):
+            raise ValueError("method must be 'index', 'edge' or 'scan'")
+        
         print(f"Matching POIs to network nodes...")
         
         # Read POIs
@@ -210,12 +691,119 @@ class NetworkProcessor:
                         'lng': float(row[3])
                     })
         
+        if method == 'scan':
+            return self._match_pois_by_scan(pois, graph)
+        
+        # Node (lon, lat) coordinates and ids
+        if isinstance(graph, CSRGraph):
+            node_coords = graph.coords
+            node_ids = graph.node_ids
+        else:
+            node_ids = np.array(list(graph.nodes), dtype=object)
+            node_coords = np.array([(data['lon'], data['lat']) for _, data in graph.nodes(data=True)],
+                                   dtype=np.float64).reshape(-1, 2)
+        
+        matched_df = pd.DataFrame(pois, columns=['name', 'category', 'lat', 'lng'])
+        if method == 'edge':
+            return self._match_pois_to_edges(matched_df, graph, node_coords, node_ids, max_distance)
+        
+        index = NodeIndex(node_coords, metric='haversine')
+        distances, indices = index.query(matched_df[['lng', 'lat']].to_numpy(dtype=np.float64),
+                                         k=k, max_distance=max_distance)
+        distances = distances.reshape(len(matched_df), k)
+        indices = indices.reshape(len(matched_df), k)
+        
+        # Missing neighbours (beyond max_distance) have distance inf and index len(index)
+        found = np.isfinite(distances)
+        candidate_ids = np.asarray(node_ids)[np.where(found, indices, 0)]
+        
+        matched_df['node_id'] = self._node_id_column(candidate_ids[:, 0], found[:, 0])
+        matched_df['distance_to_node'] = np.where(found[:, 0], distances[:, 0], np.nan)
+        if k > 1:
+            matched_df['candidate_node_ids'] = [
+                candidate_ids[i][found[i]].tolist() for i in range(len(matched_df))
+            ]
+            matched_df['candidate_distances'] = [
+                distances[i][found[i]].tolist() for i in range(len(matched_df))
+            ]
+        
+        unmatched = int((~found[:, 0]).sum())
+        if unmatched:
+            print(f"Warning: {unmatched} POIs are farther than {max_distance} m from the network "
+                  f"and were not matched")
+        
+        if self.debug:
+            print(f"Matched {len(matched_df) - unmatched} POIs to network nodes")
+            print(f"Average distance to nearest node: {matched_df['distance_to_node'].mean():.1f} meters")
+        
+        return matched_df
+
+    @staticmethod
+    def _node_id_column(ids: np.ndarray, found: np.ndarray) -> pd.Series:
+        """Node ids as a column, <NA> where not found (nullable Int64 for integer ids)"""
+        column = pd.Series(ids).infer_objects()
+        if pd.api.types.is_integer_dtype(column):
+            column = column.astype('Int64')
+        return column.where(found)
+
+    def _match_pois_to_edges(self, matched_df: pd.DataFrame, graph, node_coords: np.ndarray,
+                             node_ids, max_distance: float = None) -> pd.DataFrame:
+        """Project POIs onto their nearest network edge (see match_pois_to_network)"""
+        if isinstance(graph, CSRGraph):
+            sources, targets, _ = graph.edge_list()
+        else:
+            position = {node: i for i, node in enumerate(graph.nodes)}
+            edges = list(graph.edges())
+            sources = np.array([position[u] for u, _ in edges], dtype=np.int64)
+            targets = np.array([position[v] for _, v in edges], dtype=np.int64)
+        
+        poi_coords = matched_df[['lng', 'lat']].to_numpy(dtype=np.float64)
+        index = EdgeIndex(node_coords[sources], node_coords[targets], metric='haversine')
+        edge, fraction, projected, distance = index.snap(poi_coords, max_distance=max_distance)
+        
+        found = edge >= 0
+        safe_edge = np.where(found, edge, 0)
+        node_ids = np.asarray(node_ids)
+        edge_sources, edge_targets = sources[safe_edge], targets[safe_edge]
+        nearest = np.where(fraction <= 0.5, edge_sources, edge_targets)
+        
+        matched_df['node_id'] = self._node_id_column(node_ids[nearest], found)
+        matched_df['distance_to_node'] = np.where(
+            found,
+            haversine_meters(poi_coords[:, 0], poi_coords[:, 1],
+                             node_coords[nearest, 0], node_coords[nearest, 1]),
+            np.nan
+        )
+        matched_df['edge_source_id'] = self._node_id_column(node_ids[edge_sources], found)
+        matched_df['edge_target_id'] = self._node_id_column(node_ids[edge_targets], found)
+        matched_df['edge_fraction'] = fraction
+        matched_df['snap_lat'] = projected[:, 1]
+        matched_df['snap_lng'] = projected[:, 0]
+        matched_df['distance_to_edge'] = np.where(found, distance, np.nan)
+        
+        unmatched = int((~found).sum())
+        if unmatched:
+            print(f"Warning: {unmatched} POIs are farther than {max_distance} m from the network "
+                  f"and were not matched")
+        
+        if self.debug:
+            print(f"Matched {len(matched_df) - unmatched} POIs to network edges")
+            print(f"Average distance to nearest edge: {matched_df['distance_to_edge'].mean():.1f} meters")
+        
+        return matched_df
+
+    def _match_pois_by_scan(self, pois: List[Dict], graph) -> pd.DataFrame:
+        """Match POIs by a pairwise scan of all nodes with Euclidean distance in degrees"""
         # Create coordinate lists for network nodes
         node_coords = []
         node_ids = []
-        for node_id, node_data in graph.nodes(data=True):
-            node_coords.append((node_data['lat'], node_data['lon']))
-            node_ids.append(node_id)
+        if isinstance(graph, CSRGraph):
+            node_coords = list(zip(graph.coords[:, 1].tolist(), graph.coords[:, 0].tolist()))
+            node_ids = graph.node_ids.tolist()
+        else:
+            for node_id, node_data in graph.nodes(data=True):
+                node_coords.append((node_data['lat'], node_data['lon']))
+                node_ids.append(node_id)
         
         # Match each POI to nearest network node
         matched_pois = []
@@ -246,53 +834,261 @@ class NetworkProcessor:
         
         return matched_df
 
-    def create_subnetwork(self, pois_df: pd.DataFrame, graph: nx.Graph) -> nx.Graph:
+    def create_subnetwork(self, pois_df: pd.DataFrame, graph, method: str = 'paths',
+                          workers: int = 1) -> nx.Graph:
         """
         Create subnetwork containing shortest paths between all POI pairs
         
+        'paths' (default) grows one shortest-path tree per POI, stopped once
+        every later POI is settled, and reads the paths to all of them from
+        it, instead of running one search per pair ('pairwise', the original
+        approach). Both give the union of shortest paths between all pairs
+        (up to ties between equally short paths). 'steiner' instead keeps an
+        approximate Steiner tree (Mehlhorn) connecting the POIs: a much
+        smaller backbone from one multi-source search.
+        
         Args:
             pois_df (pd.DataFrame): POIs with node_id column
-            graph (nx.Graph): Full network graph
+            graph (nx.Graph or CSRGraph): Full network graph
+            method (str): 'paths', 'steiner' or 'pairwise'
+            workers (int): Worker processes sharing the source POIs with 'paths'
             
         Returns:
             nx.Graph: Subnetwork graph
         """
+        if method not in ('paths', 'steiner', 'pairwise'):
+            raise ValueError("method must be 'paths', 'steiner' or 'pairwise'")
+        
         print("Creating subnetwork from POI shortest paths...")
         
-        # Get unique node IDs that correspond to POIs
-        poi_node_ids = pois_df['node_id'].unique().tolist()
+        # Get unique node IDs that correspond to POIs (unmatched POIs have none)
+        poi_node_ids = pois_df['node_id'].dropna().unique().tolist()
         
         if self.debug:
             print(f"Creating subnetwork for {len(poi_node_ids)} POI nodes")
         
-        # Find all shortest paths between POI nodes
+        # POI nodes as CSR node indices or networkx node ids
+        if isinstance(graph, CSRGraph):
+            poi_nodes = graph.index_of(poi_node_ids).tolist()
+        else:
+            poi_nodes = poi_node_ids
+        
+        if method == 'steiner':
+            all_path_nodes = self._steiner_nodes(graph, poi_nodes)
+        elif method == 'pairwise':
+            all_path_nodes = self._pairwise_path_nodes(graph, poi_nodes)
+        else:
+            all_path_nodes = self._tree_path_nodes(graph, poi_nodes, workers)
+        
+        # Keep both ends of the edges POIs were projected onto
+        if 'edge_source_id' in pois_df.columns:
+            edge_ends = pd.concat((pois_df['edge_source_id'], pois_df['edge_target_id'])).dropna()
+            edge_ends = edge_ends.unique().tolist()
+            if isinstance(graph, CSRGraph):
+                edge_ends = graph.index_of(edge_ends).tolist()
+            all_path_nodes.update(edge_ends)
+        
+        # Create subgraph with all nodes from shortest paths
+        if isinstance(graph, CSRGraph):
+            subgraph = self.csr_to_networkx(graph, all_path_nodes)
+        else:
+            subgraph = graph.subgraph(all_path_nodes).copy()
+        
+        print(f"Created subnetwork with {subgraph.number_of_nodes()} nodes and {subgraph.number_of_edges()} edges")
+        print(f"Original network: {graph.number_of_nodes()} nodes, {graph.number_of_edges()} edges")
+        print(f"Reduction: {(1 - subgraph.number_of_nodes()/graph.number_of_nodes())*100:.1f}% nodes, "
+              f"{(1 - subgraph.number_of_edges()/graph.number_of_edges())*100:.1f}% edges")
+        
+        return subgraph
+
+    def _pairwise_path_nodes(self, graph, poi_nodes: List) -> set:
+        """Union of shortest paths between POI pairs, one search per pair"""
         all_path_nodes = set()
         path_count = 0
         
-        for i, source_node in enumerate(poi_node_ids):
-            for target_node in poi_node_ids[i+1:]:  # Avoid duplicate pairs
-                try:
-                    path = nx.shortest_path(graph, source_node, target_node, weight='length')
-                    all_path_nodes.update(path)
+        if isinstance(graph, CSRGraph):
+            # One shortest-path tree per source covers all of its pairs;
+            # the CSR edge weight of a PYCGR graph is the edge length
+            for i, source_index in enumerate(poi_nodes):
+                dist, pred = graph.dijkstra(source_index)
+                for target_index in poi_nodes[i+1:]:
+                    if not np.isfinite(dist[target_index]):
+                        if self.debug:
+                            print(f"No path found between nodes {graph.node_key(source_index)} "
+                                  f"and {graph.node_key(target_index)}")
+                        continue
+                    all_path_nodes.update(graph.path_from_predecessors(pred, target_index))
                     path_count += 1
                     
                     if self.debug and path_count % 100 == 0:
                         print(f"Processed {path_count} paths...")
+        else:
+            for i, source_node in enumerate(poi_nodes):
+                for target_node in poi_nodes[i+1:]:  # Avoid duplicate pairs
+                    try:
+                        path = nx.shortest_path(graph, source_node, target_node, weight='length')
+                        all_path_nodes.update(path)
+                        path_count += 1
+                    
+                        if self.debug and path_count % 100 == 0:
+                            print(f"Processed {path_count} paths...")
                         
-                except nx.NetworkXNoPath:
-                    if self.debug:
-                        print(f"No path found between nodes {source_node} and {target_node}")
-                    continue
+                    except nx.NetworkXNoPath:
+                        if self.debug:
+                            print(f"No path found between nodes {source_node} and {target_node}")
+                        continue
         
-        # Create subgraph with all nodes from shortest paths
-        subgraph = graph.subgraph(all_path_nodes).copy()
+        return all_path_nodes
+
+    def _tree_path_nodes(self, graph, poi_nodes: List, workers: int = 1) -> set:
+        """Union of shortest paths between POI pairs, one pruned tree per source POI"""
+        global _SUBNETWORK_STATE
         
-        print(f"Created subnetwork with {subgraph.number_of_nodes()} nodes and {subgraph.number_of_edges()} edges")
-        print(f"Original network: {graph.number_of_nodes()} nodes, {graph.number_of_edges()} edges")
-        print(f"Reduction: {(1 - subgraph.number_of_nodes()/graph.number_of_nodes())*100:.1f}% nodes, "
-              f"{(1 - subgraph.number_of_edges()/graph.number_of_edges())*100:.1f}% edges")
+        positions = list(range(len(poi_nodes) - 1))
+        n_workers = max(1, min(workers or 1, len(positions)))
         
-        return subgraph
+        if n_workers == 1:
+            results = [_subnetwork_sources(self, graph, poi_nodes, positions)]
+        else:
+            # Interleaved chunks: early sources have more targets than late ones
+            n_chunks = n_workers * 4
+            chunks = [positions[k::n_chunks] for k in range(n_chunks) if positions[k::n_chunks]]
+            state = (self, graph, poi_nodes)
+            if 'fork' in mp.get_all_start_methods():
+                context, initargs = mp.get_context('fork'), ()
+                _SUBNETWORK_STATE = state
+            else:
+                context, initargs = mp.get_context(), (state,)
+            try:
+                with context.Pool(n_workers, initializer=_init_subnetwork_worker,
+                                  initargs=initargs) as pool:
+                    results = pool.map(_subnetwork_chunk, chunks)
+            finally:
+                _SUBNETWORK_STATE = None
+        
+        all_path_nodes = set()
+        path_count = 0
+        for nodes, count, missing in results:
+            all_path_nodes.update(nodes)
+            path_count += count
+            if self.debug:
+                for source, target in missing:
+                    print(f"No path found between nodes {source} and {target}")
+        
+        if self.debug:
+            print(f"Processed {path_count} paths from {len(positions)} source POIs")
+        
+        return all_path_nodes
+
+    def _paths_from_source(self, graph, source, targets: List,
+                           limit: float = np.inf) -> Tuple[set, np.ndarray]:
+        """
+        Nodes on the shortest paths from one source to a set of targets
+        
+        The search stops once every target is settled (networkx) or at the
+        distance limit (CSR).
+        
+        Returns:
+            Tuple[set, np.ndarray]: (path nodes, distance to every target, inf
+            where unreachable)
+        """
+        path_nodes = set()
+        
+        if isinstance(graph, CSRGraph):
+            dist, pred = graph.dijkstra(source, limit=limit)
+            target_dist = dist[np.asarray(targets, dtype=np.int64)]
+            pred = pred.tolist()
+            for target, reached in zip(targets, np.isfinite(target_dist).tolist()):
+                # Paths share their prefix from the source: stop at known nodes
+                node = target
+                while reached and node >= 0 and node not in path_nodes:
+                    path_nodes.add(node)
+                    node = pred[node]
+            return path_nodes, target_dist
+        
+        dist, pred = dijkstra_to_targets(graph, source, targets, weight='length')
+        
+        for target in targets:
+            node = target if target in dist else None
+            while node is not None and node not in path_nodes:
+                path_nodes.add(node)
+                node = pred[node]
+        return path_nodes, np.array([dist.get(target, np.inf) for target in targets], dtype=np.float64)
+
+    def _steiner_nodes(self, graph, poi_nodes: List) -> set:
+        """Nodes of an approximate Steiner tree (Mehlhorn) connecting the POI nodes"""
+        terminals = list(dict.fromkeys(poi_nodes))
+        if isinstance(graph, CSRGraph):
+            return self._csr_steiner_nodes(graph, terminals)
+        
+        # networkx solves one connected component at a time
+        steiner_nodes = set(terminals)
+        terminal_set = set(terminals)
+        for component in nx.connected_components(graph):
+            component_terminals = [node for node in terminals if node in component]
+            if len(component_terminals) < 2:
+                continue
+            tree = steiner_tree(graph.subgraph(component), component_terminals,
+                                weight='length', method='mehlhorn')
+            steiner_nodes.update(tree.nodes)
+            terminal_set.difference_update(component_terminals)
+            if not terminal_set:
+                break
+        return steiner_nodes
+
+    def _csr_steiner_nodes(self, graph: CSRGraph, terminals: List) -> set:
+        """
+        Mehlhorn's Steiner tree approximation on a CSR graph
+        
+        One multi-source Dijkstra assigns every node to its nearest terminal;
+        every edge between two such regions gives a candidate link between
+        their terminals, and the paths behind the minimum spanning tree of
+        those links form the tree.
+        """
+        terminals = np.asarray(terminals, dtype=np.int64)
+        steiner_nodes = set(terminals.tolist())
+        if len(terminals) < 2:
+            return steiner_nodes
+        
+        dist, pred, nearest = dijkstra(graph.to_scipy(), directed=True, indices=terminals,
+                                       return_predecessors=True, min_only=True)
+        
+        terminal_position = np.full(graph.number_of_nodes(), -1, dtype=np.int64)
+        terminal_position[terminals] = np.arange(len(terminals))
+        sources, targets, arcs = graph.edge_list()
+        reached = np.isfinite(dist[sources]) & np.isfinite(dist[targets])
+        a = terminal_position[np.where(reached, nearest[sources], terminals[0])]
+        b = terminal_position[np.where(reached, nearest[targets], terminals[0])]
+        links = np.flatnonzero(reached & (a != b))
+        if len(links) == 0:
+            return steiner_nodes
+        
+        # Shortest link between every pair of terminal regions
+        length = (dist[sources[links]] + graph.weight[arcs[links]].astype(np.float64)
+                  + dist[targets[links]])
+        low, high = np.minimum(a[links], b[links]), np.maximum(a[links], b[links])
+        order = np.lexsort((length, high, low))
+        first = np.r_[True, (low[order][1:] != low[order][:-1]) | (high[order][1:] != high[order][:-1])]
+        best = order[first]
+        
+        n_terminals = len(terminals)
+        # Zero-length links would be dropped as missing entries of the sparse matrix
+        terminal_graph = sp.csr_array(
+            (np.maximum(length[best], np.finfo(np.float64).tiny), (low[best], high[best])),
+            shape=(n_terminals, n_terminals)
+        )
+        tree = minimum_spanning_tree(terminal_graph).tocoo()
+        link_of_pair = {(l, h): link for l, h, link in zip(low[best].tolist(), high[best].tolist(),
+                                                            links[best].tolist())}
+        
+        pred = pred.tolist()
+        for l, h in zip(tree.row.tolist(), tree.col.tolist()):
+            link = link_of_pair[(min(l, h), max(l, h))]
+            for node in (int(sources[link]), int(targets[link])):
+                while node >= 0 and node not in steiner_nodes:
+                    steiner_nodes.add(node)
+                    node = pred[node]
+        return steiner_nodes
 
     def save_network_as_geojson(self, graph: nx.Graph, output_path: str):
         """
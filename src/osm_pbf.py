@@ -0,0 +1,261 @@
+"""
+Local .osm.pbf extracts as an offline replacement for Overpass queries
+"""
+
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from typing import List
+from .spatial_index import EARTH_RADIUS_M
+
+# Highway values osmnx excludes from its 'all' network type
+EXCLUDED_HIGHWAYS = {'abandoned', 'construction', 'no', 'planned', 'platform',
+                     'proposed', 'raceway', 'razed'}
+
+
+def _matches(tags: dict, filters: dict) -> bool:
+    """osmnx tag semantics: a feature matches if any key matches (True, a value or a list)"""
+    for key, wanted in filters.items():
+        value = tags.get(key)
+        if value is None:
+            continue
+        if wanted is True or value == wanted or (isinstance(wanted, list) and value in wanted):
+            return True
+    return False
+
+
+def _overlaps(lons, lats, bbox) -> bool:
+    left, bottom, right, top = bbox
+    return min(lons) <= right and max(lons) >= left and min(lats) <= top and max(lats) >= bottom
+
+
+class PBFExtract:
+    """
+    Reader of features and roads from a local OpenStreetMap extract
+
+    The file is read with pyosmium in a single streaming pass per load. Only
+    objects carrying one of the requested keys reach Python, and objects whose
+    envelope does not overlap the bounding box are dropped before any geometry
+    is built. Every tag set and the road network of a run can be decoded in
+    the same pass (load), and the decoded features are kept in memory so that
+    later queries for any box inside the loaded one (tiles, or each POI type)
+    are sliced through a spatial index instead of reading the extract again.
+    Tag filters follow the osmnx semantics used by the collectors.
+    """
+
+    def __init__(self, path: str):
+        try:
+            import osmium  # noqa: F401
+        except ImportError as e:
+            raise ImportError("Reading .osm.pbf extracts requires pyosmium (pip install osmium)") from e
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"OSM extract not found: {path}")
+        self.path = path
+        # Decoded results by tag set (or 'roads'), as (bbox, GeoDataFrame)
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def load(self, bbox: tuple, tag_sets: List[dict] = (), roads: bool = False):
+        """
+        Decode the features of several tag sets, and optionally the roads, in one pass
+
+        Args:
+            bbox (tuple): (left, bottom, right, top) in degrees
+            tag_sets (List[dict]): osmnx-style tag filters, e.g. [{"building": True}]
+            roads (bool): Also decode the roads returned by road_edges
+        """
+        with self._lock:
+            self._load(bbox, list(tag_sets), roads)
+
+    def read(self, bbox: tuple, tags: dict) -> gpd.GeoDataFrame:
+        """
+        Features matching tags within a bounding box, from a pass that keeps nothing
+
+        Unlike features, the decoded features are not kept in memory, so reading
+        an area tile by tile holds one tile at a time.
+
+        Args:
+            bbox (tuple): (left, bottom, right, top) in degrees
+            tags (dict): osmnx-style tag filter, e.g. {"building": True}
+
+        Returns:
+            gpd.GeoDataFrame: Features as returned by features
+        """
+        with self._lock:
+            if self._covers(_tags_key(tags), bbox):
+                return self._slice(_tags_key(tags), bbox)
+        return self._decode(bbox, [tags], False)[0][0]
+
+    def features(self, bbox: tuple, tags: dict) -> gpd.GeoDataFrame:
+        """
+        Nodes, ways and areas matching tags within a bounding box
+
+        Args:
+            bbox (tuple): (left, bottom, right, top) in degrees
+            tags (dict): osmnx-style tag filter, e.g. {"building": True}
+
+        Returns:
+            gpd.GeoDataFrame: Features indexed by (element, id) with one column
+            per tag, like ox.features_from_bbox; empty if nothing matches
+        """
+        with self._lock:
+            key = _tags_key(tags)
+            if not self._covers(key, bbox):
+                self._load(bbox, [tags], False)
+            return self._slice(key, bbox)
+
+    def road_edges(self, bbox: tuple) -> gpd.GeoDataFrame:
+        """
+        Roads of the osmnx 'all' network type within a bounding box, one row per way
+
+        Args:
+            bbox (tuple): (left, bottom, right, top) in degrees
+
+        Returns:
+            gpd.GeoDataFrame: osmid, highway, name, oneway, length (meters) and
+            LineString geometry per way
+        """
+        with self._lock:
+            if not self._covers('roads', bbox):
+                self._load(bbox, [], True)
+            return self._slice('roads', bbox).reset_index(drop=True)
+
+    def _covers(self, key: str, bbox: tuple) -> bool:
+        if key not in self._loaded:
+            return False
+        left, bottom, right, top = self._loaded[key][0]
+        return left <= bbox[0] and bottom <= bbox[1] and right >= bbox[2] and top >= bbox[3]
+
+    def _slice(self, key: str, bbox: tuple) -> gpd.GeoDataFrame:
+        """Loaded rows of key intersecting bbox, in their original order"""
+        loaded_bbox, data = self._loaded[key]
+        if data.empty or tuple(bbox) == tuple(loaded_bbox):
+            return data.copy()
+        hits = np.sort(data.sindex.query(shapely.box(*bbox), predicate='intersects'))
+        if len(hits) == 0:
+            return gpd.GeoDataFrame()
+        return data.iloc[hits].copy()
+
+    def _load(self, bbox: tuple, tag_sets: List[dict], roads: bool):
+        frames, road_frame = self._decode(bbox, tag_sets, roads)
+        for tags, features in zip(tag_sets, frames):
+            self._loaded[_tags_key(tags)] = (tuple(bbox), features)
+        if road_frame is not None:
+            self._loaded['roads'] = (tuple(bbox), road_frame)
+
+    def _decode(self, bbox: tuple, tag_sets: List[dict], roads: bool):
+        """Features of each tag set and the roads (None unless requested) within bbox, in one pass"""
+        import osmium
+
+        keys = {key for tags in tag_sets for key in tags}
+        if roads:
+            keys.add('highway')
+        if not keys:
+            return [], None
+
+        wkb = osmium.geom.WKBFactory()
+        if tag_sets:
+            processor = osmium.FileProcessor(self.path).with_locations().with_areas()
+        else:
+            processor = osmium.FileProcessor(self.path, osmium.osm.NODE | osmium.osm.WAY).with_locations()
+        processor = processor.with_filter(osmium.filter.KeyFilter(*keys))
+
+        found = [([], [], []) for _ in tag_sets]
+        road_rows, road_geometries = [], []
+        for obj in processor:
+            obj_tags = {tag.k: tag.v for tag in obj.tags}
+            matching = [i for i, tags in enumerate(tag_sets) if _matches(obj_tags, tags)]
+            is_road = roads and obj.is_way() and _is_road(obj_tags)
+            if obj.is_way() and obj.is_closed():
+                # Closed ways are returned as areas
+                matching = []
+            if not matching and not is_road:
+                continue
+            try:
+                if obj.is_node():
+                    if not _overlaps([obj.location.lon], [obj.location.lat], bbox):
+                        continue
+                    element, osm_id, geometry = 'node', obj.id, wkb.create_point(obj)
+                elif obj.is_area():
+                    rings = [node for ring in obj.outer_rings() for node in ring]
+                    if not _overlaps([n.lon for n in rings], [n.lat for n in rings], bbox):
+                        continue
+                    element = 'way' if obj.from_way() else 'relation'
+                    osm_id, geometry = obj.orig_id(), wkb.create_multipolygon(obj)
+                elif obj.is_way():
+                    if not _overlaps([n.lon for n in obj.nodes], [n.lat for n in obj.nodes], bbox):
+                        continue
+                    element, osm_id, geometry = 'way', obj.id, wkb.create_linestring(obj)
+                else:
+                    continue
+            except (osmium.InvalidLocationError, RuntimeError):
+                # Incomplete geometries at the edge of the extract
+                continue
+
+            if is_road:
+                road_geometries.append(geometry)
+                road_rows.append({
+                    'osmid': osm_id,
+                    'highway': obj_tags['highway'],
+                    'name': obj_tags.get('name'),
+                    'oneway': obj_tags.get('oneway') in ('yes', 'true', '1', '-1')
+                })
+            for i in matching:
+                index, rows, geometries = found[i]
+                index.append((element, osm_id))
+                rows.append(obj_tags)
+                geometries.append(geometry)
+
+        frames = [_features_frame(index, rows, geometries, bbox) for index, rows, geometries in found]
+        return frames, _roads_frame(road_rows, road_geometries, bbox) if roads else None
+
+
+def _tags_key(tags: dict) -> str:
+    return json.dumps(tags, sort_keys=True)
+
+
+def _is_road(tags: dict) -> bool:
+    """Ways kept by the osmnx 'all' network type"""
+    return ('highway' in tags and tags['highway'] not in EXCLUDED_HIGHWAYS
+            and tags.get('area') != 'yes' and tags.get('service') != 'private')
+
+
+def _features_frame(index, rows, geometries, bbox) -> gpd.GeoDataFrame:
+    if not rows:
+        return gpd.GeoDataFrame()
+
+    geometries = shapely.from_wkb(geometries)
+    # Single-part areas are plain polygons, as osmnx returns them
+    single = (shapely.get_type_id(geometries) == 6) & (shapely.get_num_geometries(geometries) == 1)
+    geometries[single] = shapely.get_geometry(geometries[single], 0)
+
+    features = gpd.GeoDataFrame(
+        rows,
+        geometry=geometries,
+        crs="EPSG:4326",
+        index=pd.MultiIndex.from_tuples(index, names=['element', 'id'])
+    )
+    return features[features.intersects(shapely.box(*bbox))]
+
+
+def _roads_frame(rows, geometries, bbox) -> gpd.GeoDataFrame:
+    if not rows:
+        return gpd.GeoDataFrame()
+
+    roads = gpd.GeoDataFrame(rows, geometry=shapely.from_wkb(geometries), crs="EPSG:4326")
+    roads = roads[roads.intersects(shapely.box(*bbox))].reset_index(drop=True)
+
+    # Great-circle length of every way, summed over its segments
+    coords, way_idx = shapely.get_coordinates(roads.geometry.values, return_index=True)
+    lon, lat = np.radians(coords[:, 0]), np.radians(coords[:, 1])
+    same_way = way_idx[1:] == way_idx[:-1]
+    a = (np.sin(np.diff(lat) / 2) ** 2
+         + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2) ** 2)
+    segment = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+    roads['length'] = np.bincount(way_idx[1:][same_way], weights=segment[same_way],
+                                  minlength=len(roads))
+    return roads
@@ -0,0 +1,64 @@
+"""
+Regular lat/lon tiling of a collection area for chunked OpenStreetMap extraction
+"""
+
+import math
+import numpy as np
+from typing import List, Tuple
+from .spatial_index import EARTH_RADIUS_M
+
+
+class TileGrid:
+    """
+    Grid of tiles covering the bounding box of a point and distance
+
+    The box is the one ox.features_from_point queries for the same point and
+    distance, split into rows x cols tiles of roughly tile_size_meters.
+    Features fetched per tile are assigned to exactly one tile (the one
+    containing their representative point) so tiles can be processed
+    independently without producing duplicates.
+    """
+
+    def __init__(self, latitude: float, longitude: float, radius_meters: float,
+                 tile_size_meters: float):
+        delta_lat = (radius_meters / EARTH_RADIUS_M) * (180 / math.pi)
+        delta_lon = delta_lat / math.cos(math.radians(latitude))
+        self.north = latitude + delta_lat
+        self.south = latitude - delta_lat
+        self.east = longitude + delta_lon
+        self.west = longitude - delta_lon
+
+        n_tiles = max(1, math.ceil(2 * radius_meters / tile_size_meters))
+        self.rows = n_tiles
+        self.cols = n_tiles
+        self.tile_height = (self.north - self.south) / self.rows
+        self.tile_width = (self.east - self.west) / self.cols
+
+    @property
+    def bounds(self) -> Tuple[float, float, float, float]:
+        """Bounds of the whole grid as (left, bottom, right, top)"""
+        return (self.west, self.south, self.east, self.north)
+
+    def __len__(self):
+        return self.rows * self.cols
+
+    def tiles(self) -> List[Tuple[int, int]]:
+        """All (row, col) tiles, row 0 being the southernmost"""
+        return [(row, col) for row in range(self.rows) for col in range(self.cols)]
+
+    def bbox(self, row: int, col: int) -> Tuple[float, float, float, float]:
+        """Tile bounds as (left, bottom, right, top), the osmnx 2 bbox order"""
+        west = self.west + col * self.tile_width
+        south = self.south + row * self.tile_height
+        return (west, south, west + self.tile_width, south + self.tile_height)
+
+    def owner(self, lon, lat) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Tile (rows, cols) owning each point
+
+        Tiles are half-open on their north and east edges; points outside the
+        grid belong to the nearest edge tile.
+        """
+        rows = np.floor((np.asarray(lat) - self.south) / self.tile_height).astype(np.int64)
+        cols = np.floor((np.asarray(lon) - self.west) / self.tile_width).astype(np.int64)
+        return np.clip(rows, 0, self.rows - 1), np.clip(cols, 0, self.cols - 1)
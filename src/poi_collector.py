@@ -1,18 +1,67 @@
 import osmnx as ox
+from osmnx._errors import InsufficientResponseError
 import geopandas as gpd
+import pandas as pd
+import numpy as np
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Tuple
 import os
-from multiprocessing import Pool, cpu_count
+import threading
+from multiprocessing import cpu_count
 from .inarisk_client import INARISKClient
 from .visualizer import POIVisualizer
 import time
 from datetime import datetime
 from .village_aggregator import VillageAggregator
+from .geometry_utils import representative_points, line_samples, aggregate_line_samples
+from .osm_tiles import TileGrid
+from .osm_pbf import PBFExtract
 
 class POICollector:
+    # Attribute columns kept when streaming buildings, so every chunk has the same schema
+    STREAM_COLUMNS = ['name', 'building', 'building:levels', 'amenity']
+
+    # Union of all tags that make a feature a potential shelter
+    SHELTER_TAGS = {
+        "emergency": ["assembly_point", "shelter"],
+        "amenity": ["shelter", "community_centre", "hospital", "clinic", "place_of_worship"],
+        "building": ["public", "community_centre", "hospital", "clinic",
+                     "mosque", "church", "temple", "religious"]
+    }
+
+    # Village boundaries (admin level 9 is the village level in Indonesia)
+    VILLAGE_TAGS = {
+        "boundary": "administrative",
+        "admin_level": "9",
+        "place": ["village", "suburb", "neighbourhood"]
+    }
+
+    # Tag filters of the POI types fetched as features
+    POI_TAGS = {"buildings": {"building": True}, "villages": VILLAGE_TAGS, "shelter": SHELTER_TAGS}
+
+    # Shelter categories in order of precedence, with the tags that select them
+    SHELTER_CATEGORIES = [
+        ("emergency", {"emergency": ["assembly_point", "shelter"]}),
+        ("community", {"amenity": ["shelter", "community_centre"]}),
+        ("public_building", {"building": ["public", "community_centre"]}),
+        ("healthcare", {"amenity": ["hospital", "clinic"], "building": ["hospital", "clinic"]}),
+        ("worship", {"amenity": ["place_of_worship"],
+                     "building": ["mosque", "church", "temple", "religious"]})
+    ]
+
     def __init__(self, output_dir: str = "pois_output", batch_size: int = 20, 
                  debug: bool = False, hazard_types: List[str] = None,
-                 parallel: bool = False, workers: int = 4):
+                 parallel: bool = False, workers: int = 4,
+                 max_concurrent_requests: int = 4, hazard_cache: str = None,
+                 snap_points: bool = True, hazard_raster_dir: str = None,
+                 checkpoint_dir: str = None, point_method: str = 'centroid',
+                 road_sample_spacing: float = None, road_risk_aggregation: str = 'max',
+                 stream_buildings: bool = False,
+                 tile_size_km: float = 2.0, chunk_size: int = 5000,
+                 tiled: bool = False, tile_cache_dir: str = None, osm_pbf: str = None,
+                 tile_cache_ttl_days: float = 7):
         ox.settings.use_cache = True
         ox.settings.log_console = True
         self.output_dir = output_dir
@@ -21,104 +70,140 @@ class POICollector:
         self.hazard_types = hazard_types or ['earthquake', 'flood', 'volcanic', 'landslide']
         self.parallel = parallel
         self.workers = min(workers, cpu_count())
-        self.inarisk_client = INARISKClient(debug=debug)
+        self.snap_points = snap_points
+        self.point_method = point_method
+        # Sample lines every road_sample_spacing metres instead of at one point
+        self.road_sample_spacing = road_sample_spacing
+        self.road_risk_aggregation = road_risk_aggregation
+        self.stream_buildings = stream_buildings
+        self.tile_size_km = tile_size_km
+        self.chunk_size = chunk_size
+        self.tiled = tiled
+        self.tile_cache_dir = tile_cache_dir or os.path.join(output_dir, "tile_cache")
+        # Overpass tiles older than this are fetched again; PBF tiles follow the extract
+        self.tile_cache_ttl = tile_cache_ttl_days * 86400 if tile_cache_ttl_days else None
+        # Overpass tile requests in flight across all POI types, at most `workers`
+        self._overpass_slots = threading.BoundedSemaphore(self.workers)
+        # Local OSM extract replacing Overpass queries when given
+        self.pbf = PBFExtract(osm_pbf) if osm_pbf else None
+        self.inarisk_client = INARISKClient(debug=debug, max_concurrency=max_concurrent_requests,
+                                            cache_path=hazard_cache, raster_dir=hazard_raster_dir,
+                                            checkpoint_dir=checkpoint_dir)
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
+        if (tiled or stream_buildings) and not os.path.exists(self.tile_cache_dir):
+            os.makedirs(self.tile_cache_dir)
 
     def _process_poi_type(self, args):
-        """Process a single POI type (for parallel processing)"""
+        """Fetch the features of a single POI type"""
         poi_type, latitude, longitude, radius_meters = args
-        tags = {}
-        if poi_type == "buildings":
-            tags["building"] = True
-        elif poi_type == "villages":
+        tags = self.POI_TAGS.get(poi_type, {})
+        if poi_type == "villages":
             # Fetch village boundaries
-            tags = {
-                "boundary": "administrative",
-                "admin_level": "9",  # Level for villages in Indonesia
-                "place": ["village", "suburb", "neighbourhood"]
-            }
-            pois = ox.features_from_point((latitude, longitude), tags, radius_meters)
+            pois = self._features_from_point(latitude, longitude, radius_meters, tags)
             # Filter for polygon geometries only
             pois = pois[pois.geometry.type.isin(['Polygon', 'MultiPolygon'])]
             return poi_type, pois
         elif poi_type == "shelter":
-            pois_list = []
+            # One Overpass query for the union of all shelter tags, classified locally
             try:
-                # Emergency and shelter tags
-                emergency_tags = {"emergency": ["assembly_point", "shelter"]}
-                pois_subset = ox.features_from_point((latitude, longitude), emergency_tags, radius_meters)
-                if not pois_subset.empty:
-                    pois_subset = pois_subset[pois_subset.geometry.type == 'Polygon']
-                    if not pois_subset.empty:
-                        pois_list.append(pois_subset)
+                pois = self._features_from_point(latitude, longitude, radius_meters, self.SHELTER_TAGS)
             except Exception:
-                pass
+                return poi_type, gpd.GeoDataFrame()
+            pois = pois[pois.geometry.type == 'Polygon']
+            if pois.empty:
+                return poi_type, gpd.GeoDataFrame()
+            pois = pois.drop_duplicates(subset='geometry')
+            pois['shelter_category'] = self._classify_shelters(pois)
+            return poi_type, pois
+        elif poi_type == "roads":
+            return poi_type, self._collect_roads(latitude, longitude, radius_meters)
+        
+        pois = self._features_from_point(latitude, longitude, radius_meters, tags)
+        return poi_type, pois
 
-            try:
-                # Community centers
-                amenity_tags = {"amenity": ["shelter", "community_centre"]}
-                pois_subset = ox.features_from_point((latitude, longitude), amenity_tags, radius_meters)
-                if not pois_subset.empty:
-                    pois_subset = pois_subset[pois_subset.geometry.type == 'Polygon']
-                    if not pois_subset.empty:
-                        pois_list.append(pois_subset)
-            except Exception:
-                pass
+    def _features_from_point(self, latitude: float, longitude: float,
+                             radius_meters: float, tags: dict) -> gpd.GeoDataFrame:
+        """
+        Features matching tags around a point, fetched tile by tile in tiled mode
+        
+        In tiled mode the query box is split into tiles of tile_size_km that are
+        fetched concurrently, with at most `workers` Overpass requests in flight
+        across all POI types fetched in parallel, cached per tile and
+        merged with duplicates (features spanning tiles) removed by OSM id.
+        Otherwise this is a single ox.features_from_point query, or a single
+        pass over the local extract when osm_pbf is set.
+        """
+        if self.pbf is not None:
+            bounds = TileGrid(latitude, longitude, radius_meters, 2 * radius_meters).bounds
+            features = self.pbf.features(bounds, tags)
+            if features.empty:
+                raise InsufficientResponseError(f"No features matching {tags} in {self.pbf.path}")
+            return features
+        
+        if not self.tiled:
+            return ox.features_from_point((latitude, longitude), tags, radius_meters)
+        
+        grid = TileGrid(latitude, longitude, radius_meters, self.tile_size_km * 1000)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            tiles = list(executor.map(lambda tile: self._fetch_tile(grid.bbox(*tile), tags), grid.tiles()))
+        
+        tiles = [features for features in tiles if not features.empty]
+        if not tiles:
+            raise InsufficientResponseError(f"No features matching {tags} in any of {len(grid)} tiles")
+        features = pd.concat(tiles)
+        if self.debug:
+            print(f"Merged {len(features)} features from {len(grid)} tiles")
+        return features[~features.index.duplicated()]
 
-            try:
-                # Public buildings
-                building_tags = {"building": ["public", "community_centre"]}
-                pois_subset = ox.features_from_point((latitude, longitude), building_tags, radius_meters)
-                if not pois_subset.empty:
-                    pois_subset = pois_subset[pois_subset.geometry.type == 'Polygon']
-                    if not pois_subset.empty:
-                        pois_list.append(pois_subset)
-            except Exception:
-                pass
+    def _fetch_tile(self, bbox: tuple, tags: dict, keep: bool = True) -> gpd.GeoDataFrame:
+        """
+        Features of one tile, read from the tile cache if it was fetched before
 
-            try:
-                # Hospitals and healthcare facilities
-                healthcare_tags = {
-                    "amenity": ["hospital", "clinic"],
-                    "building": ["hospital", "clinic"]
-                }
-                for key, values in healthcare_tags.items():
-                    for value in values:
-                        pois_subset = ox.features_from_point((latitude, longitude), {key: value}, radius_meters)
-                        if not pois_subset.empty:
-                            pois_subset = pois_subset[pois_subset.geometry.type == 'Polygon']
-                            if not pois_subset.empty:
-                                pois_list.append(pois_subset)
-            except Exception:
-                pass
+        With keep=False a tile missing from the cache gets its own pass over the
+        extract, and nothing beyond the tile is kept in memory.
 
+        Cached tiles are keyed by their source: a PBF tile by the extract's path,
+        size and modification time, so replacing the extract invalidates it, and
+        an Overpass tile by the Overpass URL, expiring after tile_cache_ttl.
+        """
+        if self.pbf is not None:
+            stat = os.stat(self.pbf.path)
+            source = ['pbf', os.path.abspath(self.pbf.path), stat.st_size, stat.st_mtime_ns]
+        else:
+            source = ['overpass', ox.settings.overpass_url]
+        key = hashlib.sha1(json.dumps([source, tags, [round(v, 7) for v in bbox]], sort_keys=True).encode())
+        cache_file = os.path.join(self.tile_cache_dir, f"{key.hexdigest()}.pkl")
+        if os.path.exists(cache_file):
+            expired = (self.pbf is None and self.tile_cache_ttl
+                       and time.time() - os.path.getmtime(cache_file) > self.tile_cache_ttl)
+            if not expired:
+                return pd.read_pickle(cache_file)
+        
+        if self.pbf is not None:
+            features = self.pbf.features(bbox, tags) if keep else self.pbf.read(bbox, tags)
+        else:
             try:
-                # Places of worship
-                worship_tags = {
-                    "amenity": ["place_of_worship"],
-                    "building": ["mosque", "church", "temple", "religious"]
-                }
-                for key, values in worship_tags.items():
-                    for value in values:
-                        pois_subset = ox.features_from_point((latitude, longitude), {key: value}, radius_meters)
-                        if not pois_subset.empty:
-                            pois_subset = pois_subset[pois_subset.geometry.type == 'Polygon']
-                            if not pois_subset.empty:
-                                pois_list.append(pois_subset)
-            except Exception:
-                pass
-            
-            # Combine all results and remove duplicates
-            if pois_list:
-                pois = gpd.pd.concat(pois_list).drop_duplicates(subset='geometry')
-                return poi_type, pois
-            return poi_type, gpd.GeoDataFrame()
-        elif poi_type == "roads":
-            return poi_type, self._collect_roads(latitude, longitude, radius_meters)
+                with self._overpass_slots:
+                    features = ox.features_from_bbox(bbox, tags)
+            except InsufficientResponseError:
+                features = gpd.GeoDataFrame()
         
-        pois = ox.features_from_point((latitude, longitude), tags, radius_meters)
-        return poi_type, pois
+        # Write then rename so an interrupted run never leaves a partial tile behind
+        features.to_pickle(cache_file + ".tmp")
+        os.replace(cache_file + ".tmp", cache_file)
+        return features
+
+    def _classify_shelters(self, pois: gpd.GeoDataFrame) -> np.ndarray:
+        """Shelter category of each feature, the first matching one in SHELTER_CATEGORIES"""
+        conditions = []
+        for _, tags in self.SHELTER_CATEGORIES:
+            matches = np.zeros(len(pois), dtype=bool)
+            for key, values in tags.items():
+                if key in pois.columns:
+                    matches |= pois[key].isin(values).to_numpy()
+            conditions.append(matches)
+        return np.select(conditions, [name for name, _ in self.SHELTER_CATEGORIES], default="other")
 
     def collect_pois(self, latitude: float, longitude: float, radius: float, 
                     poi_types: List[str], assess_risks: bool = True) -> dict:
@@ -129,42 +214,46 @@ class POICollector:
         radius_meters = radius * 1000
         results = {}
 
+        stream = self.stream_buildings and "buildings" in poi_types
+        if self.pbf is not None:
+            # One pass over the extract for all requested types; each type and
+            # tile is then sliced from memory. Streamed buildings are left out
+            # and read tile by tile instead
+            bounds = TileGrid(latitude, longitude, radius_meters, 2 * radius_meters).bounds
+            self.pbf.load(bounds, [self.POI_TAGS[t] for t in poi_types
+                                   if t in self.POI_TAGS and not (stream and t == "buildings")],
+                          roads="roads" in poi_types)
+
+        # Streamed buildings go straight to disk and are not kept in memory
+        if stream:
+            poi_types = [poi_type for poi_type in poi_types if poi_type != "buildings"]
+            self._stream_buildings(latitude, longitude, radius_meters, assess_risks)
+
         if self.parallel:
-            # Prepare arguments for parallel processing
-            args_list = [(poi_type, latitude, longitude, radius_meters) 
-                        for poi_type in poi_types]
-            
-            # Process POI types in parallel
-            with Pool(self.workers) as pool:
-                poi_results = pool.map(self._process_poi_type, args_list)
-                
-            # Convert results to dictionary
-            for poi_type, pois in poi_results:
-                if not pois.empty:
-                    if assess_risks:
-                        pois = self._assess_hazard_risks(pois)
-                        
+            # Threads for the I/O-bound Overpass and INARISK work; each POI type is
+            # assessed as soon as it has been fetched, overlapping with the fetches
+            # of the other types. Villages are aggregated here in the main thread
+            with ThreadPoolExecutor(max_workers=self.workers) as io_pool:
+                futures = [
+                    io_pool.submit(self._collect_poi_type, poi_type, latitude, longitude,
+                                   radius_meters, assess_risks)
+                    for poi_type in poi_types
+                ]
+                for future in as_completed(futures):
+                    poi_type, pois = future.result()
+                    if pois is not None and assess_risks:
                         # Aggregate villages before saving if this is village data
                         if poi_type == "villages":
                             aggregator = VillageAggregator()
                             pois = aggregator.aggregate_villages(pois)
-                        
-                        output_file = os.path.join(self.output_dir, f"{poi_type}.geojson")
-                        pois.to_file(output_file, driver="GeoJSON")
-                        print(f"Saved {len(pois)} {poi_type} to {output_file}")
-                        
-                        results[poi_type] = pois
+                        results[poi_type] = self._save_pois(poi_type, pois)
         else:
             # Original sequential processing
             for poi_type in poi_types:
-                poi_type, pois = self._process_poi_type((poi_type, latitude, longitude, radius_meters))
-                if not pois.empty:
-                    if assess_risks:
-                        pois = self._assess_hazard_risks(pois)
-                    output_file = os.path.join(self.output_dir, f"{poi_type}.geojson")
-                    pois.to_file(output_file, driver="GeoJSON")
-                    print(f"Saved {len(pois)} {poi_type} to {output_file}")
-                    results[poi_type] = pois
+                poi_type, pois = self._collect_poi_type(poi_type, latitude, longitude,
+                                                        radius_meters, assess_risks)
+                if pois is not None:
+                    results[poi_type] = self._save_pois(poi_type, pois)
 
         # Create visualizations after collecting all POIs
         if assess_risks:
@@ -179,48 +268,136 @@ class POICollector:
 
         return results
 
-    def _assess_hazard_risks(self, gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-        points = []
-        for geom in gdf.geometry:
-            if geom.geom_type == 'Point':
-                points.append((geom.y, geom.x))
-            elif geom.geom_type in ['LineString', 'Polygon', 'MultiPolygon']:
-                centroid = geom.centroid
-                points.append((centroid.y, centroid.x))
-            else:
-                points.append((geom.bounds[1], geom.bounds[0]))
+    def _collect_poi_type(self, poi_type: str, latitude: float, longitude: float,
+                          radius_meters: float, assess_risks: bool = True):
+        """
+        Fetch one POI type and assess its hazard risks
         
-        if self.parallel:
-            # Process hazard types in parallel
-            hazard_args = [
-                (points, hazard_type, self.batch_size) 
-                for hazard_type in self.hazard_types 
-                if hazard_type in self.inarisk_client.hazard_layers
-            ]
+        Args:
+            poi_type (str): POI type to collect
+            latitude (float): Latitude of the center point
+            longitude (float): Longitude of the center point
+            radius_meters (float): Search radius in meters
+            assess_risks (bool): Whether to add hazard risk columns
             
-            with Pool(self.workers) as pool:
-                risk_results = pool.starmap(self.inarisk_client.get_risk_for_points, hazard_args)
-                
-            # Add results to GeoDataFrame
-            for hazard_type, risk_values in zip(
-                [h for h in self.hazard_types if h in self.inarisk_client.hazard_layers], 
-                risk_results
-            ):
-                gdf[f'{hazard_type}_risk'] = risk_values
-        else:
-            # Original sequential processing
-            for hazard_type in self.hazard_types:
-                if hazard_type in self.inarisk_client.hazard_layers:
-                    risk_values = self.inarisk_client.get_risk_for_points(
-                        points, hazard_type, batch_size=self.batch_size
-                    )
-                    gdf[f'{hazard_type}_risk'] = risk_values
+        Returns:
+            tuple: (poi_type, GeoDataFrame), or (poi_type, None) if nothing was found
+        """
+        poi_type, pois = self._process_poi_type((poi_type, latitude, longitude, radius_meters))
+        if pois.empty:
+            return poi_type, None
+        if assess_risks:
+            pois = self._assess_hazard_risks(pois)
+        return poi_type, pois
+
+    def _save_pois(self, poi_type: str, pois: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+        output_file = os.path.join(self.output_dir, f"{poi_type}.geojson")
+        pois.to_file(output_file, driver="GeoJSON")
+        print(f"Saved {len(pois)} {poi_type} to {output_file}")
+        return pois
+
+    def _assess_hazard_risks(self, gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+        # Representative (lat, lon) point of every geometry
+        lat, lon = representative_points(gdf.geometry, self.point_method)
+        point_rows = np.arange(len(gdf))
+        
+        # Line geometries are sampled along their length instead of at their
+        # representative point; the samples follow the remaining points
+        samples = None
+        if self.road_sample_spacing:
+            samples = line_samples(gdf.geometry, self.road_sample_spacing)
+            point_rows = np.flatnonzero(np.bincount(samples.piece_row, minlength=len(gdf)) == 0)
+        points = np.column_stack((lat[point_rows], lon[point_rows]))
+        if samples is not None:
+            points = np.vstack((points, np.column_stack((samples.lat, samples.lon))))
+            if self.debug:
+                print(f"Sampling lines every {self.road_sample_spacing} m: {len(samples.lat)} samples "
+                      f"for {len(gdf) - len(point_rows)} lines")
+        
+        # Query each hazard raster cell once and scatter the values back
+        inverse = None
+        if self.snap_points:
+            points, inverse = self.inarisk_client.snap_points(points)
+            if self.debug:
+                print(f"Snapped {len(inverse)} points to {len(points)} unique hazard grid cells")
+        
+        # All hazards in one pass, columns in the order of hazard_types
+        hazard_types = [h for h in self.hazard_types if h in self.inarisk_client.hazard_layers]
+        risk_values = self.inarisk_client.get_risk_matrix(points, hazard_types, batch_size=self.batch_size)
+        if inverse is not None:
+            risk_values = risk_values[inverse]
+        risk_values = self._aggregate_line_risks(risk_values, samples, point_rows, len(gdf))
+        for column, hazard_type in enumerate(hazard_types):
+            gdf[f'{hazard_type}_risk'] = risk_values[:, column]
             
         return gdf
 
+    def _stream_buildings(self, latitude: float, longitude: float,
+                          radius_meters: float, assess_risks: bool = True) -> str:
+        """
+        Fetch, assess and write buildings tile by tile in bounded memory
+        
+        The area is split into tiles of tile_size_km; each tile is fetched on its
+        own (a separate pass over the extract with osm_pbf, cached in
+        tile_cache_dir), and its buildings are assessed and appended to a GeoPackage in
+        chunks of chunk_size rows. A building crossing tile borders is kept only
+        by the tile containing its centroid.
+        
+        Args:
+            latitude (float): Latitude of the center point
+            longitude (float): Longitude of the center point
+            radius_meters (float): Search radius in meters
+            assess_risks (bool): Whether to add hazard risk columns
+            
+        Returns:
+            str: Path of the written GeoPackage
+        """
+        grid = TileGrid(latitude, longitude, radius_meters, self.tile_size_km * 1000)
+        output_file = os.path.join(self.output_dir, "buildings.gpkg")
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        
+        written = 0
+        for tile_idx, (row, col) in enumerate(grid.tiles(), 1):
+            buildings = self._fetch_tile(grid.bbox(row, col), {"building": True}, keep=False)
+            if buildings.empty:
+                continue
+            
+            lat, lon = representative_points(buildings.geometry, 'centroid')
+            owner_row, owner_col = grid.owner(lon, lat)
+            buildings = buildings[(owner_row == row) & (owner_col == col)].reset_index()
+            buildings = buildings.reindex(columns=['element', 'id'] + self.STREAM_COLUMNS + ['geometry'])
+            for column in self.STREAM_COLUMNS:
+                buildings[column] = buildings[column].astype(object).where(buildings[column].notna(), None)
+            
+            for start in range(0, len(buildings), self.chunk_size):
+                chunk = gpd.GeoDataFrame(buildings.iloc[start:start + self.chunk_size], crs=buildings.crs)
+                if assess_risks:
+                    chunk = self._assess_hazard_risks(chunk)
+                chunk.to_file(output_file, driver="GPKG", layer="buildings", mode="a" if written else "w")
+                written += len(chunk)
+            del buildings, lat, lon
+            
+            print(f"Tile {tile_idx}/{len(grid)}: {written} buildings written")
+        
+        print(f"Saved {written} buildings to {output_file}")
+        return output_file
+
+    def _aggregate_line_risks(self, risk_values: np.ndarray, samples, point_rows: np.ndarray,
+                              n_rows: int) -> np.ndarray:
+        """Risk per row: the aggregate of its samples for sampled lines, else the risk of its point"""
+        if samples is None:
+            return risk_values
+        row_risks, _ = aggregate_line_samples(risk_values[len(point_rows):], samples, n_rows,
+                                              self.road_risk_aggregation)
+        row_risks[point_rows] = risk_values[:len(point_rows)]
+        return row_risks
+
     def _collect_roads(self, latitude: float, longitude: float, 
                       radius_meters: float) -> gpd.GeoDataFrame:
         """Collect road network data"""
+        if self.pbf is not None:
+            return self.pbf.road_edges(TileGrid(latitude, longitude, radius_meters, 2 * radius_meters).bounds)
         point = (latitude, longitude)
         roads = ox.graph_from_point(point, dist=radius_meters, network_type='all')
         roads_gdf = ox.graph_to_gdfs(roads, nodes=False)
@@ -1,4 +1,5 @@
 import csv
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 from shapely.geometry import Point, Polygon
@@ -9,6 +10,8 @@ from multiprocessing import Pool, cpu_count
 from .inarisk_client import INARISKClient
 from .visualizer import POIVisualizer
 from .village_aggregator import VillageAggregator
+from .geometry_utils import representative_points, line_samples, aggregate_line_samples
+from .osm_pbf import PBFExtract
 import time
 from datetime import datetime
 
@@ -21,7 +24,12 @@ class CSVPOICollector:
     
     def __init__(self, output_dir: str = "pois_output", batch_size: int = 20, 
                  debug: bool = False, hazard_types: List[str] = None,
-                 parallel: bool = False, workers: int = 4):
+                 parallel: bool = False, workers: int = 4,
+                 max_concurrent_requests: int = 4, hazard_cache: str = None,
+                 snap_points: bool = True, hazard_raster_dir: str = None,
+                 checkpoint_dir: str = None, point_method: str = 'centroid',
+                 road_sample_spacing: float = None, road_risk_aggregation: str = 'max',
+                 osm_pbf: str = None):
         ox.settings.use_cache = True
         ox.settings.log_console = True
         self.output_dir = output_dir
@@ -30,7 +38,16 @@ class CSVPOICollector:
         self.hazard_types = hazard_types or ['earthquake', 'flood', 'volcanic', 'landslide']
         self.parallel = parallel
         self.workers = min(workers, cpu_count())
-        self.inarisk_client = INARISKClient(debug=debug)
+        self.snap_points = snap_points
+        self.point_method = point_method
+        # Sample lines every road_sample_spacing metres instead of at one point
+        self.road_sample_spacing = road_sample_spacing
+        self.road_risk_aggregation = road_risk_aggregation
+        # Local OSM extract replacing Overpass queries when given
+        self.pbf = PBFExtract(osm_pbf) if osm_pbf else None
+        self.inarisk_client = INARISKClient(debug=debug, max_concurrency=max_concurrent_requests,
+                                            cache_path=hazard_cache, raster_dir=hazard_raster_dir,
+                                            checkpoint_dir=checkpoint_dir)
         
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
@@ -214,6 +231,12 @@ class CSVPOICollector:
         min_lat, max_lat, min_lng, max_lng = bounds
         
         try:
+            if self.pbf is not None:
+                print(f"Collecting road network from {self.pbf.path}...")
+                roads_gdf = self.pbf.road_edges((min_lng, min_lat, max_lng, max_lat))
+                print(f"Collected {len(roads_gdf)} road segments")
+                return roads_gdf
+            
             print("Collecting road network from OpenStreetMap...")
             
             # Calculate center and radius for the area
@@ -237,33 +260,55 @@ class CSVPOICollector:
             print(f"Warning: Could not collect road network: {e}")
             return gpd.GeoDataFrame()
 
+    def _aggregate_line_risks(self, risk_values: np.ndarray, samples, point_rows: np.ndarray,
+                              n_rows: int) -> np.ndarray:
+        """Risk per row: the aggregate of its samples for sampled lines, else the risk of its point"""
+        if samples is None:
+            return risk_values
+        row_risks, _ = aggregate_line_samples(risk_values[len(point_rows):], samples, n_rows,
+                                              self.road_risk_aggregation)
+        row_risks[point_rows] = risk_values[:len(point_rows)]
+        return row_risks
+
     def _assess_hazard_risks(self, gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
         """Assess hazard risks for the POIs"""
         print(f"Assessing hazard risks for {len(gdf)} POIs...")
         
-        # Extract coordinate points for risk assessment
-        points = []
-        for geom in gdf.geometry:
-            if geom.geom_type == 'Point':
-                points.append((geom.y, geom.x))  # lat, lon format for INARISK
-            elif geom.geom_type in ['LineString', 'Polygon', 'MultiPolygon']:
-                centroid = geom.centroid
-                points.append((centroid.y, centroid.x))
-            else:
-                # Fallback to bounds
-                bounds = geom.bounds
-                points.append((bounds[1], bounds[0]))  # min_lat, min_lng
+        # Representative (lat, lon) point of every geometry
+        lat, lon = representative_points(gdf.geometry, self.point_method)
+        point_rows = np.arange(len(gdf))
         
-        # Assess risks for each hazard type
-        for hazard_type in self.hazard_types:
-            if hazard_type in self.inarisk_client.hazard_layers:
-                try:
-                    risk_values = self.inarisk_client.get_risk_for_points(
-                        points, hazard_type, batch_size=self.batch_size
-                    )
-                    gdf[f'{hazard_type}_risk'] = risk_values
-                except Exception as e:
-                    print(f"Warning: Could not assess {hazard_type} risk: {e}")
-                    gdf[f'{hazard_type}_risk'] = 0.0
+        # Line geometries are sampled along their length instead of at their
+        # representative point; the samples follow the remaining points
+        samples = None
+        if self.road_sample_spacing:
+            samples = line_samples(gdf.geometry, self.road_sample_spacing)
+            point_rows = np.flatnonzero(np.bincount(samples.piece_row, minlength=len(gdf)) == 0)
+        points = np.column_stack((lat[point_rows], lon[point_rows]))
+        if samples is not None:
+            points = np.vstack((points, np.column_stack((samples.lat, samples.lon))))
+            if self.debug:
+                print(f"Sampling lines every {self.road_sample_spacing} m: {len(samples.lat)} samples "
+                      f"for {len(gdf) - len(point_rows)} lines")
+        
+        # Query each hazard raster cell once and scatter the values back
+        inverse = None
+        if self.snap_points:
+            points, inverse = self.inarisk_client.snap_points(points)
+            print(f"Snapped to {len(points)} unique hazard grid cells")
+        
+        # Assess all hazard types in one pass
+        hazard_types = [h for h in self.hazard_types if h in self.inarisk_client.hazard_layers]
+        try:
+            risk_values = self.inarisk_client.get_risk_matrix(points, hazard_types, batch_size=self.batch_size)
+            if inverse is not None:
+                risk_values = risk_values[inverse]
+            risk_values = self._aggregate_line_risks(risk_values, samples, point_rows, len(gdf))
+        except Exception as e:
+            print(f"Warning: Could not assess hazard risks: {e}")
+            missing_value = np.nan if self.inarisk_client.checkpoint_dir else 0.0
+            risk_values = np.full((len(gdf), len(hazard_types)), missing_value)
+        for column, hazard_type in enumerate(hazard_types):
+            gdf[f'{hazard_type}_risk'] = risk_values[:, column]
         
         return gdf
\ No newline at end of file
@@ -334,8 +334,9 @@ class RespondorOutputFormatter:
                     closest_risks = risk_point['risks']
             
             # Assign average risk value
-            if closest_risks:
-                risk_values = list(closest_risks.values())
+            # Missing (NaN) risk values are left out of the average
+            risk_values = [value for value in closest_risks.values() if pd.notna(value)]
+            if risk_values:
                 avg_risk = sum(risk_values) / len(risk_values)
                 graph.nodes[node_id]['risk'] = avg_risk
             else:
@@ -1,5 +1,6 @@
 import geopandas as gpd
 import networkx as nx
+import shapely
 from shapely.geometry import Point, LineString, mapping
 import pandas as pd
 import numpy as np
@@ -7,153 +8,610 @@ import json
 import folium
 from branca.colormap import LinearColormap
 import os
+import multiprocessing as mp
+import time
+import hashlib
 from src.route_visualizer import RouteVisualizer
+from src.spatial_index import NodeIndex, EdgeIndex, split_edges
+from scipy.sparse.csgraph import connected_components
+from src.csr_graph import CSRGraph
+from src.graph_search import dijkstra_to_targets
+from src.contraction_hierarchy import ContractionHierarchy
+
+# Highway type weights (higher value = better road)
+HIGHWAY_WEIGHTS = {
+    'primary': 1.0,
+    'secondary': 0.9,
+    'tertiary': 0.8,
+    'residential': 0.7,
+    'service': 0.6,
+    'living_street': 0.5,
+    'footway': 0.4,
+    'path': 0.3
+}
+
+# RouteFinder used by worker processes of find_best_routes_parallel. It is set
+# before the pool starts so forked workers inherit it rather than unpickling it
+_WORKER_FINDER = None
+
+def _init_route_worker(finder=None):
+    """Pool initializer for start methods that cannot inherit the RouteFinder"""
+    global _WORKER_FINDER
+    if finder is not None:
+        _WORKER_FINDER = finder
+
+def _route_villages(args):
+    """Find routes for a chunk of village positions in a worker process
+
+    Returns:
+        tuple: (routes, worker pid, villages processed, seconds spent)
+    """
+    village_positions, max_routes, one_to_many = args
+    start = time.perf_counter()
+    routes = []
+    for village_pos in village_positions:
+        routes.extend(_WORKER_FINDER.find_village_routes(village_pos, max_routes, one_to_many))
+    return routes, os.getpid(), len(village_positions), time.perf_counter() - start
 
 class RouteFinder:
-    def __init__(self, roads_file, villages_file, shelters_file):
+    def __init__(self, roads_file, villages_file, shelters_file, backend='networkx',
+                 hierarchy=None, snap='node'):
+        if backend not in ('networkx', 'csr'):
+            raise ValueError("backend must be 'networkx' or 'csr'")
+        if hierarchy is not None and backend != 'csr':
+            raise ValueError("Contraction hierarchy queries require the 'csr' backend")
+        if snap not in ('node', 'edge'):
+            raise ValueError("snap must be 'node' or 'edge'")
+        if hierarchy is not None and snap == 'edge':
+            raise ValueError("Snapping to edges is not supported with a contraction hierarchy")
+        
+        self.backend = backend
         self.roads = gpd.read_file(roads_file)
         self.villages = gpd.read_file(villages_file)
         self.shelters = gpd.read_file(shelters_file)
-        self.G = self._create_road_network()
         
+        # Spatial index over graph nodes, built once and reused for every POI.
+        # The networkx backend uses coordinate tuples as nodes, the CSR backend
+        # uses integer node indices into self.graph
+        if backend == 'csr':
+            self.G = None
+            self.graph = self._create_csr_network()
+            self.node_index = NodeIndex(self.graph.coords)
+        else:
+            self.G = self._create_road_network()
+            nodes = list(self.G.nodes())
+            self.node_index = NodeIndex(nodes, keys=nodes)
+        
+        # Villages and shelters are attached to their nearest node, or with
+        # snap='edge' to their projection onto the nearest road segment
+        if snap == 'edge':
+            self.village_nodes, self.shelter_nodes = self._snap_to_edges()
+        else:
+            self.village_nodes = self._snap_to_nodes(self.villages)
+            self.shelter_nodes = self._snap_to_nodes(self.shelters)
+        self.shelter_targets = self._collect_shelter_targets()
+        self.worker_stats = []
+        
+        # Connected component of every CSR node, bounding the one-to-many searches
+        self.components = None
+        if backend == 'csr':
+            _, self.components = connected_components(self.graph.to_scipy(), directed=False)
+        
+        # Optional contraction hierarchy answering path queries on the CSR graph
+        self.hierarchy = None
+        if hierarchy is not None:
+            self._setup_hierarchy(hierarchy)
+        
+    def _road_edge_arrays(self):
+        """
+        Explode road geometries into per-segment edge columns
+
+        Returns:
+            dict: start/end coordinate arrays (n, 2) and weight, distance,
+            highway_type and risk_score columns, one row per segment
+        """
+        roads = self.roads
+        
+        # Split multi-part geometries, then pair consecutive coordinates of each part
+        parts, part_rows = shapely.get_parts(roads.geometry.values, return_index=True)
+        coords, coord_parts = shapely.get_coordinates(parts, return_index=True)
+        is_segment = coord_parts[:-1] == coord_parts[1:]
+        start = coords[:-1][is_segment]
+        end = coords[1:][is_segment]
+        segment_rows = part_rows[coord_parts[:-1][is_segment]]
+        
+        # Per-road highway type and weight (higher value = better road)
+        if 'highway' in roads.columns:
+            highway = roads['highway'].map(lambda h: h[0] if isinstance(h, list) else h)
+        else:
+            highway = pd.Series('residential', index=roads.index)
+        highway_weight = highway.map(HIGHWAY_WEIGHTS).fillna(0.5).to_numpy(dtype=np.float64)
+        
+        # Risk score is the average of all available risks
+        risk_columns = [col for col in ['earthquake_risk', 'flood_risk', 'volcanic_risk', 'landslide_risk']
+                        if col in roads.columns]
+        if risk_columns:
+            risks = roads[risk_columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+            available = (~np.isnan(risks)).sum(axis=1)
+            risk_sum = np.nansum(risks, axis=1)
+            risk_score = np.divide(risk_sum, available, out=np.zeros(len(roads)), where=available > 0)
+        else:
+            risk_score = np.zeros(len(roads))
+        
+        distance = np.hypot(start[:, 0] - end[:, 0], start[:, 1] - end[:, 1])
+        risk_score = risk_score[segment_rows]
+        
+        # Combined weight: distance * (1/highway_weight) * (1 + risk_score)
+        # Lower weight = better path
+        weight = distance * (1 / highway_weight[segment_rows]) * (1 + risk_score)
+        
+        return {
+            'start': start,
+            'end': end,
+            'weight': weight,
+            'distance': distance,
+            'highway_type': highway.to_numpy(dtype=object)[segment_rows],
+            'risk_score': risk_score
+        }
+
     def _create_road_network(self):
         """Create NetworkX graph from road network"""
         G = nx.Graph()
+        edges = self._road_edge_arrays()
+        
+        G.add_edges_from(
+            (start, end, {
+                'weight': weight,
+                'distance': distance,
+                'highway_type': highway_type,
+                'risk_score': risk_score
+            })
+            for start, end, weight, distance, highway_type, risk_score in zip(
+                map(tuple, edges['start'].tolist()),
+                map(tuple, edges['end'].tolist()),
+                edges['weight'].tolist(),
+                edges['distance'].tolist(),
+                edges['highway_type'],
+                edges['risk_score'].tolist()
+            )
+        )
+        
+        return G
+    
+    def _create_csr_network(self):
+        """Create compact CSR graph from road network"""
+        edges = self._road_edge_arrays()
+        return CSRGraph.from_segments(
+            edges['start'], edges['end'], edges['weight'],
+            distance=edges['distance'],
+            risk=edges['risk_score'],
+            highway=edges['highway_type']
+        )
+    
+    def _setup_hierarchy(self, hierarchy):
+        """
+        Customize a contraction hierarchy with this road network's edge weights
+        
+        hierarchy is either a ContractionHierarchy (e.g. the one stored next to
+        a PYCGR file) or the path of a hierarchy file for this road network,
+        which also keeps the last customization.
+        """
+        sources, targets, arcs = self.graph.edge_list()
+        if isinstance(hierarchy, str):
+            self.hierarchy = self._load_or_build_hierarchy(hierarchy, sources, targets, arcs)
+            to_hierarchy = np.arange(self.graph.number_of_nodes())
+        else:
+            to_hierarchy = hierarchy.match_nodes(self.graph.coords)
+            if (to_hierarchy < 0).any():
+                raise ValueError("Road network nodes are not part of the contraction hierarchy network")
+            self.hierarchy = hierarchy.customized(
+                to_hierarchy[sources], to_hierarchy[targets], self.graph.weight[arcs]
+            )
+        self._to_hierarchy = to_hierarchy
+        self._from_hierarchy = np.full(self.hierarchy.number_of_nodes(), -1, dtype=np.int64)
+        self._from_hierarchy[to_hierarchy] = np.arange(len(to_hierarchy))
         
-        # Highway type weights (higher value = better road)
-        highway_weights = {
-            'primary': 1.0,
-            'secondary': 0.9,
-            'tertiary': 0.8,
-            'residential': 0.7,
-            'service': 0.6,
-            'living_street': 0.5,
-            'footway': 0.4,
-            'path': 0.3
+        # Every village is routed to the same shelters, whose upward searches are
+        # kept in buckets; route metrics per hierarchy arc rank the shelters of a
+        # village before any path is unpacked
+        self._shelter_buckets = self.hierarchy.bucket_targets(
+            to_hierarchy[[node for node, _ in self.shelter_targets]]
+        )
+        road_quality = np.array([HIGHWAY_WEIGHTS.get(highway, 0.5) for highway in self.graph.highway_types]
+                                + [0.5])[self.graph.highway]
+        self._arc_metrics = {
+            'distance': self.hierarchy.arc_totals(self.graph.distance[arcs]),
+            'risk': self.hierarchy.arc_totals(self.graph.risk[arcs]),
+            'edges': self.hierarchy.arc_totals(np.ones(len(arcs))),
+            'quality': self.hierarchy.arc_totals(road_quality[arcs], how='min')
         }
+    
+    def _load_or_build_hierarchy(self, hierarchy_file, sources, targets, arcs):
+        """
+        Customized hierarchy from a hierarchy file built for this road network
         
-        for _, road in self.roads.iterrows():
-            # Get coordinates using coords property for LineString
-            coords = list(road.geometry.coords)
-            
-            # Get road properties from the GeoDataFrame
-            highway_type = road['highway'] if 'highway' in road else 'residential'
-            if isinstance(highway_type, list):
-                highway_type = highway_type[0]
-            
-            highway_weight = highway_weights.get(highway_type, 0.5)
-            
-            # Calculate risk score (average of all available risks)
-            available_risks = []
-            for risk_type in ['earthquake_risk', 'flood_risk', 'volcanic_risk', 'landslide_risk']:
-                if risk_type in road and road[risk_type] is not None:
-                    available_risks.append(road[risk_type])
-            
-            risk_score = sum(available_risks) / len(available_risks) if available_risks else 0
-            
-            # Edge weight combines distance, road type and risk
-            # Lower weight = better path
-            for i in range(len(coords)-1):
-                start = tuple(coords[i])
-                end = tuple(coords[i+1])
-                
-                # Calculate distance between points
-                distance = ((start[0] - end[0])**2 + (start[1] - end[1])**2)**0.5
-                
-                # Combined weight: distance * (1/highway_weight) * (1 + risk_score)
-                weight = distance * (1/highway_weight) * (1 + risk_score)
-                
-                G.add_edge(start, end, 
-                          weight=weight,
-                          distance=distance,
-                          highway_type=highway_type,
-                          risk_score=risk_score)
+        The hierarchy is rebuilt if the network changed and re-customized if
+        the edge weights changed; either way the file is updated.
+        """
+        network_hash = hashlib.sha1(
+            self.graph.coords.tobytes() + sources.tobytes() + targets.tobytes()
+        ).hexdigest()
+        metric_hash = hashlib.sha1(np.ascontiguousarray(self.graph.weight[arcs]).tobytes()).hexdigest()
         
-        return G
+        hierarchy = None
+        if os.path.exists(hierarchy_file):
+            hierarchy, metadata = ContractionHierarchy.load(hierarchy_file)
+            if metadata.get('network_hash') != network_hash:
+                hierarchy = None
+            elif metadata.get('metric_hash') == metric_hash and hierarchy.arc_weight is not None:
+                return hierarchy
+        
+        if hierarchy is None:
+            hierarchy = ContractionHierarchy.build(self.graph)
+        hierarchy = hierarchy.customized(sources, targets, self.graph.weight[arcs])
+        hierarchy.save(hierarchy_file, network_hash=network_hash, metric_hash=metric_hash)
+        return hierarchy
+    
+    def _hierarchy_path(self, source, target):
+        """Shortest path between two CSR nodes from a contraction hierarchy query"""
+        _, path = self.hierarchy.query(self._to_hierarchy[source], self._to_hierarchy[target])
+        if path is None:
+            return None
+        return self._from_hierarchy[path].tolist()
+    
+    def _hierarchy_village_routes(self, village_node, village_name, max_routes):
+        """
+        Candidate routes from one village to every shelter from one hierarchy query
+        
+        Shelters are scored with the route metrics summed along their
+        hierarchy paths; only the paths that can make the best max_routes are
+        unpacked and measured exactly (all of them when max_routes is not
+        positive).
+        """
+        _, hop_paths = self.hierarchy.one_to_many(self._to_hierarchy[village_node], self._shelter_buckets)
+        reached = [pos for pos, path in enumerate(hop_paths) if path is not None]
+        
+        if 0 < max_routes < len(reached):
+            paths = [hop_paths[pos] for pos in reached]
+            totals = {
+                name: self.hierarchy.path_totals(paths, values, how='min' if name == 'quality' else 'sum')
+                for name, values in self._arc_metrics.items()
+            }
+            score = (totals['distance'] * (1 + totals['risk'] / (totals['edges'] + 1))
+                     * (1 / np.minimum(totals['quality'], 1.0)))
+            # Scores differ from the exact ones only by rounding; keep ties at the cut
+            cutoff = np.sort(score)[max_routes - 1]
+            reached = [pos for pos, keep in zip(reached, score <= cutoff * (1 + 1e-9)) if keep]
+        
+        paths = self.hierarchy.unpack([hop_paths[pos] for pos in reached])
+        return [
+            self._build_route(self._from_hierarchy[path].tolist(), village_name, self.shelter_targets[pos][1])
+            for pos, path in zip(reached, paths)
+        ]
     
     def _find_nearest_node(self, point):
         """Find nearest node in graph to given point"""
-        nodes = list(self.G.nodes())
-        distances = [((node[0] - point[0])**2 + (node[1] - point[1])**2)**0.5 
-                    for node in nodes]
-        return nodes[np.argmin(distances)]
+        return self.node_index.nearest([point])[0]
     
-    def find_best_routes(self, max_routes=3):
-        """Find best routes from each village to shelters"""
-        routes = []
+    def find_nearest_nodes(self, points, k=1):
+        """Find the nearest node (k=1) or k nearest nodes for a batch of points"""
+        if k == 1:
+            return self.node_index.nearest(points)
+        return self.node_index.k_nearest(points, k)
+    
+    @staticmethod
+    def _centroid_points(gdf):
+        """(x, y) array of the centroid of every geometry in a GeoDataFrame"""
+        centroids = shapely.centroid(gdf.geometry.values)
+        return np.column_stack((shapely.get_x(centroids), shapely.get_y(centroids))).reshape(-1, 2)
+    
+    def _snap_to_nodes(self, gdf):
+        """Snap the centroid of every geometry in a GeoDataFrame to its nearest node"""
+        if gdf.empty:
+            return []
+        return self.find_nearest_nodes(self._centroid_points(gdf))
+    
+    def _snap_to_edges(self):
+        """
+        Attach village and shelter centroids to the nearest point of the road network
+        
+        Every centroid is projected onto its nearest road segment through an
+        STRtree, and the segment is split at the projection in the routing
+        graph (the roads themselves are unchanged). Split pieces keep the road
+        attributes, with weight and distance in proportion to their length.
+        
+        Returns:
+            tuple: (village_nodes, shelter_nodes) graph nodes of the projections
+        """
+        points = np.vstack((self._centroid_points(self.villages), self._centroid_points(self.shelters)))
+        n_villages = len(self.villages)
+        if len(points) == 0:
+            return [], []
         
-        for _, village in self.villages.iterrows():
-            village_center = village.geometry.centroid
-            village_point = (village_center.x, village_center.y)
-            village_node = self._find_nearest_node(village_point)
+        if self.backend == 'csr':
+            coords = self.graph.coords
+            sources, targets, arcs = self.graph.edge_list()
+        else:
+            nodes = list(self.G.nodes())
+            position = {node: i for i, node in enumerate(nodes)}
+            coords = np.array(nodes, dtype=np.float64).reshape(-1, 2)
+            edges = list(self.G.edges(data=True))
+            sources = np.array([position[u] for u, _, _ in edges], dtype=np.int64)
+            targets = np.array([position[v] for _, v, _ in edges], dtype=np.int64)
+        
+        edge, fraction, projected, _ = EdgeIndex(coords[sources], coords[targets]).snap(points)
+        point_nodes, new_coords, pieces = split_edges(sources, targets, len(coords),
+                                                      edge, fraction, projected)
+        split = np.unique(pieces['edge'])
+        
+        if self.backend == 'csr':
+            graph = self.graph
+            keep = np.ones(len(arcs), dtype=bool)
+            keep[split] = False
+            piece_arcs = arcs[pieces['edge']]
             
-            shelter_routes = []
-            for _, shelter in self.shelters.iterrows():
-                if shelter.geometry.geom_type != 'Polygon':
-                    continue
-                    
-                shelter_center = shelter.geometry.centroid
-                shelter_point = (shelter_center.x, shelter_center.y)
-                shelter_node = self._find_nearest_node(shelter_point)
-                
-                try:
-                    # Find shortest path
-                    path = nx.shortest_path(self.G, village_node, shelter_node, 
-                                         weight='weight')
-                    
-                    # Calculate route metrics
-                    total_distance = 0
-                    total_risk = 0
-                    worst_road = 1.0
-                    
-                    for i in range(len(path)-1):
-                        edge = self.G[path[i]][path[i+1]]
-                        total_distance += edge['distance']
-                        total_risk += edge['risk_score']
-                        
-                        # Track worst road type in route
-                        highway_type = edge['highway_type']
-                        if isinstance(highway_type, list):
-                            highway_type = highway_type[0]
-                        road_quality = {
-                            'primary': 1.0,
-                            'secondary': 0.9,
-                            'tertiary': 0.8,
-                            'residential': 0.7,
-                            'service': 0.6,
-                            'living_street': 0.5,
-                            'footway': 0.4,
-                            'path': 0.3
-                        }.get(highway_type, 0.5)
-                        worst_road = min(worst_road, road_quality)
-                    
-                    avg_risk = total_risk / len(path)
-                    
-                    shelter_routes.append({
-                        'village_name': village['name'] if 'name' in village else 'Unknown Village',
-                        'shelter_name': shelter['name'] if 'name' in shelter else 'Unknown Shelter',
-                        'total_distance': total_distance,
-                        'average_risk': avg_risk,
-                        'worst_road_type': worst_road,
-                        'path': path
-                    })
-                    
-                except nx.NetworkXNoPath:
-                    continue
+            def edge_column(values, scale=False):
+                piece_values = values[piece_arcs].astype(np.float64)
+                if scale:
+                    piece_values *= pieces['fraction']
+                return np.concatenate((values[arcs[keep]].astype(np.float64), piece_values))
             
-            # Sort routes by combined score
-            if shelter_routes:
-                shelter_routes.sort(key=lambda x: (
-                    x['total_distance'] * 
-                    (1 + x['average_risk']) * 
-                    (1 / x['worst_road_type'])
-                ))
-                
-                # Take top N routes
-                routes.extend(shelter_routes[:max_routes])
+            self.graph = CSRGraph.from_edges(
+                np.vstack((coords, new_coords)),
+                np.concatenate((sources[keep], pieces['source'])),
+                np.concatenate((targets[keep], pieces['target'])),
+                edge_column(graph.weight, scale=True),
+                distance=edge_column(graph.distance, scale=True),
+                risk=edge_column(graph.risk),
+                highway=pd.Categorical.from_codes(
+                    np.concatenate((graph.highway[arcs[keep]], graph.highway[piece_arcs])),
+                    graph.highway_types
+                )
+            )
+            self.node_index = NodeIndex(self.graph.coords)
+            node_keys = point_nodes.tolist()
+        else:
+            node_keys = nodes + [tuple(point) for point in new_coords.tolist()]
+            for e in split.tolist():
+                self.G.remove_edge(node_keys[sources[e]], node_keys[targets[e]])
+            self.G.add_edges_from(
+                (node_keys[piece_source], node_keys[piece_target], {
+                    'weight': edges[e][2]['weight'] * piece_fraction,
+                    'distance': edges[e][2]['distance'] * piece_fraction,
+                    'highway_type': edges[e][2]['highway_type'],
+                    'risk_score': edges[e][2]['risk_score']
+                })
+                for e, piece_source, piece_target, piece_fraction in zip(
+                    pieces['edge'].tolist(), pieces['source'].tolist(),
+                    pieces['target'].tolist(), pieces['fraction'].tolist()
+                )
+            )
+            nodes = list(self.G.nodes())
+            self.node_index = NodeIndex(nodes, keys=nodes)
+            node_keys = [node_keys[node] for node in point_nodes.tolist()]
+        
+        return node_keys[:n_villages], node_keys[n_villages:]
+    
+    def _collect_shelter_targets(self):
+        """Snapped node and name of every routable (Polygon) shelter"""
+        shelter_targets = []
+        for shelter_pos, (_, shelter) in enumerate(self.shelters.iterrows()):
+            if shelter.geometry.geom_type != 'Polygon':
+                continue
+            shelter_targets.append((
+                self.shelter_nodes[shelter_pos],
+                shelter['name'] if 'name' in shelter else 'Unknown Shelter'
+            ))
+        return shelter_targets
+    
+    def find_best_routes(self, max_routes=3, one_to_many=True):
+        """Find best routes from each village to shelters
+
+        With one_to_many enabled, a single Dijkstra search is run per village
+        and every shelter path is read from its predecessor tree instead of
+        running one shortest_path query per village/shelter pair.
+        """
+        routes = []
+        for village_pos in range(len(self.villages)):
+            routes.extend(self.find_village_routes(village_pos, max_routes, one_to_many))
         
         return pd.DataFrame(routes)
 
+    def find_best_routes_parallel(self, max_routes=3, workers=None, one_to_many=True):
+        """Find best routes from each village to shelters using worker processes
+
+        Worker processes share this RouteFinder instead of receiving a pickled
+        copy per task: with the fork start method they inherit it from the
+        parent (graph arrays are shared copy-on-write), otherwise it is sent
+        once per worker at start-up. Only village positions are sent per task.
+
+        Per-worker throughput of the run is stored in self.worker_stats.
+        """
+        global _WORKER_FINDER
+        
+        n_workers = workers if workers else max(1, mp.cpu_count() - 1)
+        chunks = [chunk.tolist() for chunk in np.array_split(np.arange(len(self.villages)), n_workers * 4)
+                  if len(chunk)]
+        tasks = [(chunk, max_routes, one_to_many) for chunk in chunks]
+        
+        if 'fork' in mp.get_all_start_methods():
+            context, initargs = mp.get_context('fork'), ()
+            _WORKER_FINDER = self
+        else:
+            context, initargs = mp.get_context(), (self,)
+        
+        try:
+            with context.Pool(n_workers, initializer=_init_route_worker, initargs=initargs) as pool:
+                chunk_results = pool.map(_route_villages, tasks)
+        finally:
+            _WORKER_FINDER = None
+        
+        self.worker_stats = self._summarize_worker_stats(chunk_results)
+        
+        # Chunks come back in submission order, so routes stay in village order
+        return pd.DataFrame([route for chunk_routes, _, _, _ in chunk_results for route in chunk_routes])
+
+    @staticmethod
+    def _summarize_worker_stats(chunk_results):
+        """Aggregate per-chunk timings into per-worker throughput figures"""
+        per_worker = {}
+        for chunk_routes, pid, n_villages, seconds in chunk_results:
+            stats = per_worker.setdefault(pid, {'villages': 0, 'routes': 0, 'seconds': 0.0})
+            stats['villages'] += n_villages
+            stats['routes'] += len(chunk_routes)
+            stats['seconds'] += seconds
+        
+        worker_stats = []
+        for worker, pid in enumerate(sorted(per_worker), 1):
+            stats = per_worker[pid]
+            worker_stats.append({
+                'worker': worker,
+                'pid': pid,
+                **stats,
+                'villages_per_second': stats['villages'] / stats['seconds'] if stats['seconds'] > 0 else 0.0
+            })
+        return worker_stats
+
+    def find_village_routes(self, village_pos, max_routes=3, one_to_many=True):
+        """Find the best routes from one village (by position) to the shelters
+
+        Returns up to max_routes routes sorted by combined score, or all of
+        them when max_routes is not positive.
+        """
+        village = self.villages.iloc[village_pos]
+        village_node = self.village_nodes[village_pos]
+        village_name = village['name'] if 'name' in village else 'Unknown Village'
+        
+        shelter_routes = []
+        if one_to_many and self.hierarchy is not None:
+            shelter_routes = self._hierarchy_village_routes(village_node, village_name, max_routes)
+        elif one_to_many:
+            paths = self._paths_to_targets(
+                village_node, [node for node, _ in self.shelter_targets]
+            )
+            for shelter_node, shelter_name in self.shelter_targets:
+                if shelter_node not in paths:
+                    continue
+                path = paths[shelter_node]
+                shelter_routes.append(
+                    self._build_route(path, village_name, shelter_name)
+                )
+        else:
+            for shelter_node, shelter_name in self.shelter_targets:
+                route = self.find_single_route(
+                    village_node, shelter_node, village_name, shelter_name
+                )
+                if route:
+                    shelter_routes.append(route)
+        
+        # Sort routes by combined score
+        shelter_routes.sort(key=lambda x: (
+            x['total_distance'] * 
+            (1 + x['average_risk']) * 
+            (1 / x['worst_road_type'])
+        ))
+        
+        # Take top N routes
+        return shelter_routes[:max_routes] if max_routes > 0 else shelter_routes
+
+    def _paths_to_targets(self, source, targets):
+        """Shortest paths from source to every reachable target, from one search"""
+        if self.hierarchy is not None:
+            targets = list(dict.fromkeys(targets))
+            buckets = self.hierarchy.bucket_targets(self._to_hierarchy[targets])
+            _, hop_paths = self.hierarchy.one_to_many(self._to_hierarchy[source], buckets)
+            reached = [(target, path) for target, path in zip(targets, hop_paths) if path is not None]
+            paths = self.hierarchy.unpack([path for _, path in reached])
+            return {target: self._from_hierarchy[path].tolist() for (target, _), path in zip(reached, paths)}
+        
+        if self.backend == 'csr':
+            return self._csr_paths_to_targets(source, targets)
+        
+        dist, pred = dijkstra_to_targets(self.G, source, targets)
+        return {target: self._extract_path(pred, target)
+                for target in targets if target in dist}
+
+    def _csr_paths_to_targets(self, source, targets):
+        """CSR shortest paths from source to every reachable target
+        
+        scipy's Dijkstra cannot stop once the targets are settled, so the search
+        is bounded by a distance limit instead. The limit starts at twice the
+        straight-line distance to the farthest target and doubles until every
+        target in the source's connected component has been reached; distances
+        within the limit are exact.
+        """
+        targets = np.unique(np.asarray(targets, dtype=np.int64))
+        targets = targets[self.components[targets] == self.components[source]]
+        if len(targets) == 0:
+            return {}
+        
+        offsets = self.graph.coords[targets] - self.graph.coords[source]
+        limit = 2 * np.hypot(offsets[:, 0], offsets[:, 1]).max()
+        while True:
+            dist, pred = self.graph.dijkstra(source, limit=limit)
+            if np.isfinite(dist[targets]).all():
+                break
+            limit = limit * 2 if limit > 0 else np.inf
+        return {target: self.graph.path_from_predecessors(pred, target) for target in targets.tolist()}
+
+    @staticmethod
+    def _extract_path(pred, target):
+        """Walk a predecessor map back from target to the search source"""
+        path = [target]
+        while pred[path[-1]] is not None:
+            path.append(pred[path[-1]])
+        path.reverse()
+        return path
+
+    def _build_route(self, path, village_name, shelter_name):
+        """Calculate route metrics along a node path"""
+        if self.backend == 'csr':
+            return self._build_csr_route(path, village_name, shelter_name)
+        
+        total_distance = 0
+        total_risk = 0
+        worst_road = 1.0
+        
+        for i in range(len(path)-1):
+            edge = self.G[path[i]][path[i+1]]
+            total_distance += edge['distance']
+            total_risk += edge['risk_score']
+            
+            # Track worst road type in route
+            highway_type = edge['highway_type']
+            if isinstance(highway_type, list):
+                highway_type = highway_type[0]
+            road_quality = HIGHWAY_WEIGHTS.get(highway_type, 0.5)
+            worst_road = min(worst_road, road_quality)
+        
+        avg_risk = total_risk / len(path)
+        
+        return {
+            'village_name': village_name,
+            'shelter_name': shelter_name,
+            'total_distance': total_distance,
+            'average_risk': avg_risk,
+            'worst_road_type': worst_road,
+            'path': path
+        }
+
+    def _build_csr_route(self, path, village_name, shelter_name):
+        """Calculate route metrics along a CSR node index path"""
+        edges = self.graph.path_edges(path)
+        road_quality = [
+            HIGHWAY_WEIGHTS.get(self.graph.highway_types[code], 0.5) if code >= 0 else 0.5
+            for code in self.graph.highway[edges]
+        ]
+        
+        return {
+            'village_name': village_name,
+            'shelter_name': shelter_name,
+            'total_distance': float(self.graph.distance[edges].sum(dtype=np.float64)),
+            'average_risk': float(self.graph.risk[edges].sum(dtype=np.float64)) / len(path),
+            'worst_road_type': min([1.0] + road_quality),
+            'path': self.graph.node_keys(path)
+        }
+
     def save_routes(self, routes_df, output_file):
         """Save routes to GeoJSON"""
         features = []
@@ -198,46 +656,22 @@ class RouteFinder:
     
     def find_single_route(self, village_node, shelter_node, village_name, shelter_name):
         """Find a single route between a village and shelter node"""
+        if self.hierarchy is not None:
+            path = self._hierarchy_path(village_node, shelter_node)
+            if path is None:
+                return None
+            return self._build_route(path, village_name, shelter_name)
+        
+        if self.backend == 'csr':
+            path = self.graph.shortest_path(village_node, shelter_node)
+            if path is None:
+                return None
+            return self._build_route(path, village_name, shelter_name)
+        
         try:
             # Find shortest path
             path = nx.shortest_path(self.G, village_node, shelter_node, weight='weight')
-            
-            # Calculate route metrics
-            total_distance = 0
-            total_risk = 0
-            worst_road = 1.0
-            
-            for i in range(len(path)-1):
-                edge = self.G[path[i]][path[i+1]]
-                total_distance += edge['distance']
-                total_risk += edge['risk_score']
-                
-                # Track worst road type in route
-                highway_type = edge['highway_type']
-                if isinstance(highway_type, list):
-                    highway_type = highway_type[0]
-                road_quality = {
-                    'primary': 1.0,
-                    'secondary': 0.9,
-                    'tertiary': 0.8,
-                    'residential': 0.7,
-                    'service': 0.6,
-                    'living_street': 0.5,
-                    'footway': 0.4,
-                    'path': 0.3
-                }.get(highway_type, 0.5)
-                worst_road = min(worst_road, road_quality)
-            
-            avg_risk = total_risk / len(path)
-            
-            return {
-                'village_name': village_name,
-                'shelter_name': shelter_name,
-                'total_distance': total_distance,
-                'average_risk': avg_risk,
-                'worst_road_type': worst_road,
-                'path': path
-            }
+            return self._build_route(path, village_name, shelter_name)
             
         except nx.NetworkXNoPath:
-            return None
\ No newline at end of file
+            return None
@@ -0,0 +1,279 @@
+"""
+Spatial indexes over road network nodes and edges for fast nearest lookups
+"""
+
+import numpy as np
+import shapely
+from scipy.spatial import cKDTree
+
+# Mean earth radius osmnx uses, so distances, lengths and query boxes agree with it
+EARTH_RADIUS_M = 6371009
+
+
+def haversine_meters(lon0, lat0, lon1, lat1):
+    """Great-circle distance in metres between (lon, lat) points in degrees"""
+    lon0, lat0, lon1, lat1 = (np.radians(np.asarray(c, dtype=np.float64)) for c in (lon0, lat0, lon1, lat1))
+    a = np.sin((lat1 - lat0) / 2) ** 2 + np.cos(lat0) * np.cos(lat1) * np.sin((lon1 - lon0) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+class NodeIndex:
+    """
+    KD-tree over node coordinates answering batched nearest and k-nearest queries
+
+    Coordinates are (x, y) pairs. With metric='euclidean' distances are measured
+    in the coordinate units as given; with metric='haversine' coordinates are
+    (lon, lat) in degrees, indexed on the unit sphere, and distances are
+    great-circle metres.
+    """
+
+    def __init__(self, coords, keys=None, metric: str = 'euclidean'):
+        if metric not in ('euclidean', 'haversine'):
+            raise ValueError("metric must be 'euclidean' or 'haversine'")
+
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        self.keys = list(keys) if keys is not None else None
+        self.metric = metric
+        self.tree = cKDTree(self._to_index_space(self.coords))
+
+    def __len__(self):
+        return len(self.coords)
+
+    def _to_index_space(self, coords):
+        """Map coordinates into the space the tree is built in"""
+        if self.metric == 'euclidean':
+            return coords
+
+        lon = np.radians(coords[:, 0])
+        lat = np.radians(coords[:, 1])
+        cos_lat = np.cos(lat)
+        return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+    def _to_distance(self, chord):
+        """Convert tree distances into metric distances"""
+        if self.metric == 'euclidean':
+            return chord
+        distances = 2 * EARTH_RADIUS_M * np.arcsin(np.clip(chord / 2, 0, 1))
+        return np.where(np.isinf(chord), np.inf, distances)
+
+    def query(self, points, k: int = 1, max_distance: float = None):
+        """
+        Find the k nearest nodes for every query point
+
+        Args:
+            points: Array-like of (x, y) query coordinates
+            k (int): Number of neighbours per point
+            max_distance (float, optional): Ignore nodes farther than this
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (distances, indices) of shape (n,) for
+            k=1 or (n, k) otherwise; missing neighbours have distance inf and
+            index len(self)
+        """
+        if len(self) == 0:
+            raise ValueError("Cannot query an empty node index")
+
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        upper_bound = np.inf
+        if max_distance is not None:
+            upper_bound = max_distance
+            if self.metric == 'haversine':
+                upper_bound = 2 * np.sin(min(max_distance / (2 * EARTH_RADIUS_M), np.pi / 2))
+
+        distances, indices = self.tree.query(
+            self._to_index_space(points), k=k, distance_upper_bound=upper_bound
+        )
+        return self._to_distance(distances), indices
+
+    def nearest(self, points):
+        """Return the key (or index) of the nearest node for every point"""
+        _, indices = self.query(points)
+        return self._lookup(indices)
+
+    def k_nearest(self, points, k: int):
+        """Return the keys (or indices) of the k nearest nodes for every point"""
+        _, indices = self.query(points, k=k)
+        return [self._lookup(row) for row in np.asarray(indices).reshape(-1, k)]
+
+    def _lookup(self, indices):
+        if self.keys is None:
+            return indices
+        return [self.keys[i] if i < len(self.keys) else None for i in indices]
+
+
+class EdgeIndex:
+    """
+    STRtree over straight edge segments answering batched nearest-edge queries
+
+    Every query point is projected onto its nearest segment. With
+    metric='euclidean' distances are measured in the coordinate units as given;
+    with metric='haversine' coordinates are (lon, lat) in degrees, the tree is
+    built on an equirectangular projection at the mean latitude of the edges
+    (accurate for city and regional networks) and distances are great-circle
+    metres to the projected point.
+
+    Edges much longer than typical are indexed as several equal pieces of at
+    most max_piece_length (in index units, default four times the median edge
+    length), so a few long edges do not make their large bounding boxes a
+    candidate for every query.
+    """
+
+    def __init__(self, start, end, metric: str = 'euclidean', max_piece_length: float = None):
+        if metric not in ('euclidean', 'haversine'):
+            raise ValueError("metric must be 'euclidean' or 'haversine'")
+
+        self.start = np.asarray(start, dtype=np.float64).reshape(-1, 2)
+        self.end = np.asarray(end, dtype=np.float64).reshape(-1, 2)
+        self.metric = metric
+        self._x_scale = 1.0
+        if metric == 'haversine' and len(self.start):
+            mean_lat = np.concatenate((self.start[:, 1], self.end[:, 1])).mean()
+            self._x_scale = np.cos(np.radians(mean_lat))
+
+        index_start = self._to_index_space(self.start)
+        index_end = self._to_index_space(self.end)
+        length = np.hypot(*(index_end - index_start).T)
+        if max_piece_length is None:
+            max_piece_length = 4 * np.median(length) if len(length) else 0
+        n_pieces = np.ones(len(length), dtype=np.int64)
+        if max_piece_length > 0:
+            n_pieces = np.maximum(1, np.ceil(length / max_piece_length)).astype(np.int64)
+
+        # Piece k of an edge covers fractions k/n to (k+1)/n of it
+        self._piece_edge = np.repeat(np.arange(len(length)), n_pieces)
+        self._piece_k = np.arange(len(self._piece_edge)) - np.repeat(np.cumsum(n_pieces) - n_pieces, n_pieces)
+        self._piece_n = n_pieces[self._piece_edge]
+        delta = (index_end - index_start)[self._piece_edge]
+        piece_start = index_start[self._piece_edge] + delta * (self._piece_k / self._piece_n)[:, None]
+        piece_end = index_start[self._piece_edge] + delta * ((self._piece_k + 1) / self._piece_n)[:, None]
+
+        self.lines = shapely.linestrings(np.stack((piece_start, piece_end), axis=1))
+        self.tree = shapely.STRtree(self.lines)
+
+    def __len__(self):
+        return len(self.start)
+
+    def _to_index_space(self, coords):
+        return np.column_stack((coords[:, 0] * self._x_scale, coords[:, 1]))
+
+    def snap(self, points, max_distance: float = None):
+        """
+        Project every query point onto its nearest edge
+
+        Args:
+            points: Array-like of (x, y) query coordinates
+            max_distance (float, optional): Leave points farther than this from
+                every edge unsnapped
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: (edge,
+            fraction, projected, distance) per point: the edge index, the
+            position of the projection along the edge (0 at start, 1 at end),
+            its (n, 2) coordinates and the distance to it. Unsnapped points have
+            edge -1, fraction and projected NaN and distance inf
+        """
+        if len(self) == 0:
+            raise ValueError("Cannot query an empty edge index")
+
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        edge = np.full(len(points), -1, dtype=np.int64)
+        fraction = np.full(len(points), np.nan)
+        projected = np.full((len(points), 2), np.nan)
+        distance = np.full(len(points), np.inf)
+
+        search_distance = max_distance
+        if max_distance is not None and self.metric == 'haversine':
+            # Metres to degrees of latitude, the unit of the index space
+            search_distance = np.degrees(max_distance / EARTH_RADIUS_M)
+
+        query_points = shapely.points(self._to_index_space(points))
+        point_rows, piece_rows = self.tree.query_nearest(query_points, max_distance=search_distance,
+                                                         all_matches=False)
+
+        located = shapely.line_locate_point(self.lines[piece_rows], query_points[point_rows],
+                                            normalized=True)
+        located = np.nan_to_num(located, nan=0.0)  # zero-length edges
+        # Position along the whole edge
+        edge_rows = self._piece_edge[piece_rows]
+        located = (self._piece_k[piece_rows] + located) / self._piece_n[piece_rows]
+        start, end = self.start[edge_rows], self.end[edge_rows]
+        snapped = start + (end - start) * located[:, None]
+
+        if self.metric == 'haversine':
+            snap_distance = haversine_meters(points[point_rows, 0], points[point_rows, 1],
+                                             snapped[:, 0], snapped[:, 1])
+        else:
+            snap_distance = np.hypot(*(points[point_rows] - snapped).T)
+
+        keep = np.ones(len(point_rows), dtype=bool)
+        if max_distance is not None:
+            keep = snap_distance <= max_distance
+        rows = point_rows[keep]
+        edge[rows] = edge_rows[keep]
+        fraction[rows] = located[keep]
+        projected[rows] = snapped[keep]
+        distance[rows] = snap_distance[keep]
+        return edge, fraction, projected, distance
+
+
+def split_edges(source, target, n_nodes: int, edge, fraction, points, tolerance: float = 1e-9):
+    """
+    Plan splitting edges at points snapped onto them
+
+    Points at an end of their edge are attached to that end node. The others
+    become new nodes n_nodes, n_nodes + 1, ... (points snapped to the same
+    position share one), and every edge containing new nodes is replaced by a
+    chain of pieces running through them in order from its source to its target.
+
+    Args:
+        source, target: Endpoint node indices per edge
+        n_nodes (int): Number of existing nodes
+        edge, fraction, points: Snapped edge, position along it and projected
+            coordinates per point, as returned by EdgeIndex.snap
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, dict]: node per point (-1 if the point was
+        not snapped), (m, 2) coordinates of the new nodes, and the pieces as
+        arrays 'edge' (the edge they replace), 'source', 'target' and 'fraction'
+        (their share of the edge length)
+    """
+    source = np.asarray(source, dtype=np.int64)
+    target = np.asarray(target, dtype=np.int64)
+    edge = np.asarray(edge, dtype=np.int64)
+    fraction = np.asarray(fraction, dtype=np.float64)
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+
+    point_nodes = np.full(len(edge), -1, dtype=np.int64)
+    snapped = edge >= 0
+    at_source = snapped & (fraction <= tolerance)
+    at_target = snapped & ~at_source & (fraction >= 1 - tolerance)
+    point_nodes[at_source] = source[edge[at_source]]
+    point_nodes[at_target] = target[edge[at_target]]
+
+    # One new node per distinct (edge, fraction), sorted along each edge
+    inner = np.flatnonzero(snapped & ~at_source & ~at_target)
+    keys, first, inverse = np.unique(np.column_stack((edge[inner], fraction[inner])), axis=0,
+                                     return_index=True, return_inverse=True)
+    new_nodes = n_nodes + np.arange(len(keys), dtype=np.int64)
+    point_nodes[inner] = new_nodes[inverse.reshape(-1)]
+    new_coords = points[inner][first]
+
+    split_edge = keys[:, 0].astype(np.int64)
+    split_fraction = keys[:, 1]
+    boundary = split_edge[1:] != split_edge[:-1]
+    group_start = np.concatenate(([True], boundary))[:len(keys)]
+    group_end = np.concatenate((boundary, [True]))[:len(keys)]
+
+    # A piece leads into every new node, plus a last piece from each chain to the target
+    previous_node = np.where(group_start, source[split_edge],
+                             np.concatenate(([-1], new_nodes))[:len(keys)])
+    previous_fraction = np.where(group_start, 0.0,
+                                 np.concatenate(([0.0], split_fraction))[:len(keys)])
+    pieces = {
+        'edge': np.concatenate((split_edge, split_edge[group_end])),
+        'source': np.concatenate((previous_node, new_nodes[group_end])),
+        'target': np.concatenate((new_nodes, target[split_edge[group_end]])),
+        'fraction': np.concatenate((split_fraction - previous_fraction,
+                                    1 - split_fraction[group_end]))
+    }
+    return point_nodes, new_coords, pieces
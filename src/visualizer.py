@@ -19,6 +19,12 @@ class POIVisualizer:
             'opacity': 1
         }
 
+    def _risk_color(self, value):
+        """Colormap color of a risk value, grey where the value is missing"""
+        if value is None or value != value:
+            return 'gray'
+        return self.risk_colors(value)
+
     def create_risk_maps(self, pois_dict: dict, center_lat: float, center_lon: float):
         """Create interactive maps for each hazard type"""
         
@@ -46,7 +52,7 @@ class POIVisualizer:
                         name=poi_type,
                         style_function=lambda x: {
                             **self.road_style,
-                            'color': self.risk_colors(x['properties'][risk_col])
+                            'color': self._risk_color(x['properties'][risk_col])
                         },
                         tooltip=folium.GeoJsonTooltip(
                             fields=['name', risk_col, 'highway'],
@@ -60,7 +66,7 @@ class POIVisualizer:
                         gdf,
                         name=poi_type,
                         style_function=lambda x: {
-                            'fillColor': self.risk_colors(x['properties'][risk_col]),
+                            'fillColor': self._risk_color(x['properties'][risk_col]),
                             'color': 'black',
                             'weight': 1,
                             'fillOpacity': 0.7
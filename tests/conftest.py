@@ -0,0 +1,9 @@
+import pytest
+
+from benchmarks.route_hierarchy import write_grid_network
+
+
+@pytest.fixture
+def route_files(tmp_path):
+    """Roads, villages and shelters GeoJSON files of a small perturbed grid network"""
+    return write_grid_network(str(tmp_path), size=25, n_villages=15, n_shelters=8)
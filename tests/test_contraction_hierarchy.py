@@ -0,0 +1,93 @@
+import numpy as np
+from scipy.sparse.csgraph import dijkstra
+
+from src.contraction_hierarchy import ContractionHierarchy
+from src.csr_graph import CSRGraph
+
+
+def perturbed_grid(size, seed=0):
+    """Grid road network with jittered nodes, random weights and some edges removed"""
+    rng = np.random.default_rng(seed)
+    coords = np.indices((size, size)).reshape(2, -1).T * 1e-3 + rng.normal(0, 1e-4, (size * size, 2))
+    index = np.arange(size * size).reshape(size, size)
+    source = np.concatenate((index[:, :-1].ravel(), index[:-1, :].ravel()))
+    target = np.concatenate((index[:, 1:].ravel(), index[1:, :].ravel()))
+    keep = rng.random(len(source)) > 0.1
+    source, target = source[keep], target[keep]
+    weight = np.hypot(*(coords[source] - coords[target]).T) * rng.uniform(1, 2, len(source))
+    return CSRGraph.from_edges(coords, source, target, weight)
+
+
+def test_queries_match_dijkstra():
+    graph = perturbed_grid(40)
+    source, target, arcs = graph.edge_list()
+    hierarchy = ContractionHierarchy.build(graph).customized(source, target, graph.weight[arcs])
+
+    pairs = np.random.default_rng(1).integers(0, graph.number_of_nodes(), (30, 2))
+    reference = dijkstra(graph.to_scipy(), indices=pairs[:, 0])
+    for i, (s, t) in enumerate(pairs):
+        distance, path = hierarchy.query(s, t)
+        assert np.isclose(distance, reference[i, t]) or np.isinf(distance) == np.isinf(reference[i, t])
+        if path is not None:
+            assert path[0] == s and path[-1] == t
+            length = sum(graph.weight[graph.edge_index(u, v)] for u, v in zip(path[:-1], path[1:]))
+            assert np.isclose(length, distance)
+
+
+def test_disconnected_nodes():
+    coords = np.array([[0, 0], [1, 0], [2, 0], [10, 0], [11, 0]], dtype=np.float64)
+    graph = CSRGraph.from_edges(coords, np.array([0, 1, 3]), np.array([1, 2, 4]), np.array([1.0, 2.0, 3.0]))
+    source, target, arcs = graph.edge_list()
+    hierarchy = ContractionHierarchy.build(graph).customized(source, target, graph.weight[arcs])
+
+    assert hierarchy.query(0, 2) == (3.0, [0, 1, 2])
+    assert hierarchy.query(0, 4) == (np.inf, None)
+
+
+def customized_grid(size=30):
+    graph = perturbed_grid(size)
+    source, target, arcs = graph.edge_list()
+    return graph, arcs, ContractionHierarchy.build(graph).customized(source, target, graph.weight[arcs])
+
+
+def test_one_to_many_matches_dijkstra():
+    graph, arcs, hierarchy = customized_grid()
+    rng = np.random.default_rng(2)
+    targets = rng.integers(0, graph.number_of_nodes(), 25)
+    buckets = hierarchy.bucket_targets(targets)
+
+    for source in rng.integers(0, graph.number_of_nodes(), 10):
+        reference = dijkstra(graph.to_scipy(), indices=source)[targets]
+        distances, hop_paths = hierarchy.one_to_many(source, buckets)
+        np.testing.assert_allclose(distances, reference)
+
+        paths = hierarchy.unpack([path for path in hop_paths if path is not None])
+        lengths = hierarchy.path_totals([path for path in hop_paths if path is not None],
+                                        hierarchy.arc_totals(graph.weight[arcs]))
+        reached = np.isfinite(reference)
+        np.testing.assert_allclose(lengths, reference[reached])
+        for path, target, length in zip(paths, targets[reached], lengths):
+            assert path[0] == source and path[-1] == target
+            assert np.isclose(sum(graph.weight[graph.edge_index(u, v)] for u, v in zip(path[:-1], path[1:])),
+                              length)
+
+
+def test_arc_totals_min_along_paths():
+    graph, arcs, hierarchy = customized_grid()
+    edge_values = np.random.default_rng(3).random(len(arcs))
+    value_of = dict(zip(map(tuple, np.column_stack(graph.edge_list()[:2]).tolist()), edge_values))
+
+    buckets = hierarchy.bucket_targets([5, 600, 899])
+    _, hop_paths = hierarchy.one_to_many(450, buckets)
+    minimums = hierarchy.path_totals(hop_paths, hierarchy.arc_totals(edge_values, how='min'), how='min')
+    for path, minimum in zip(hierarchy.unpack(hop_paths), minimums):
+        assert minimum == min(value_of[min(u, v), max(u, v)] for u, v in zip(path[:-1], path[1:]))
+
+
+def test_save_keeps_customization(tmp_path):
+    graph, _, hierarchy = customized_grid(10)
+    hierarchy.save(str(tmp_path / "grid.ch.npz"), network_hash="abc")
+
+    loaded, metadata = ContractionHierarchy.load(str(tmp_path / "grid.ch.npz"))
+    assert metadata == {'network_hash': 'abc'}
+    assert loaded.query(0, 99) == hierarchy.query(0, 99)
@@ -0,0 +1,32 @@
+import numpy as np
+import shapely
+
+from src.geometry_utils import representative_points
+
+GEOMETRIES = [
+    shapely.Point(106.8, -6.2),
+    shapely.LineString([(106.8, -6.2), (106.81, -6.2), (106.81, -6.21)]),
+    shapely.Polygon([(106.8, -6.2), (106.82, -6.2), (106.82, -6.19), (106.81, -6.195), (106.8, -6.19)]),
+    shapely.MultiPolygon([shapely.box(106.8, -6.2, 106.801, -6.199), shapely.box(106.9, -6.3, 106.902, -6.298)]),
+    shapely.MultiLineString([[(106.85, -6.25), (106.86, -6.24)], [(106.84, -6.26), (106.845, -6.255)]]),
+]
+
+
+def test_centroids_match_per_geometry_loop():
+    lat, lon = representative_points(np.array(GEOMETRIES, dtype=object))
+
+    for i, geometry in enumerate(GEOMETRIES):
+        if geometry.geom_type == 'MultiLineString':
+            # Other geometry types fall back to the lower-left corner of their bounds
+            expected = geometry.bounds[:2]
+        else:
+            expected = (geometry.centroid.x, geometry.centroid.y)
+        np.testing.assert_allclose((lon[i], lat[i]), expected)
+    assert lat.flags['C_CONTIGUOUS'] and lat.dtype == np.float64
+
+
+def test_point_on_surface_inside_polygons():
+    lat, lon = representative_points(GEOMETRIES[2:4], method='point_on_surface')
+
+    for geometry, x, y in zip(GEOMETRIES[2:4], lon, lat):
+        assert geometry.contains(shapely.Point(x, y))
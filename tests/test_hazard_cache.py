@@ -0,0 +1,64 @@
+import numpy as np
+
+from src import hazard_cache
+from src.hazard_cache import HazardCache
+from src.inarisk_client import INARISKClient
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1e9
+
+    def time(self):
+        return self.now
+
+
+def test_cells_snap_points_to_resolution(tmp_path):
+    cache = HazardCache(str(tmp_path / "cache.sqlite"), resolution=30)
+
+    cells = cache.cells([[0, 0], [29.9, 59.9], [-0.1, 30]])
+    np.testing.assert_array_equal(cells, [[0, 0], [0, 1], [-1, 1]])
+
+
+def test_entries_expire_after_ttl(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(hazard_cache, "time", clock)
+    cache = HazardCache(str(tmp_path / "cache.sqlite"), ttl_days=1)
+
+    cache.put_many('FLOOD', [[0, 0], [1, 1]], [0.5, 0.7])
+    np.testing.assert_array_equal(cache.get_many('FLOOD', [[1, 1], [0, 0], [2, 2], [1, 1]]), [0.7, 0.5, np.nan, 0.7])
+    assert np.isnan(cache.get_many('QUAKE', [[0, 0]])).all()
+    assert (cache.hits, cache.misses) == (3, 2)
+
+    clock.now += 86400 / 2
+    cache.put_many('FLOOD', [[1, 1]], [0.8])
+    clock.now += 86400 / 2 + 1
+    np.testing.assert_array_equal(cache.get_many('FLOOD', [[0, 0], [1, 1]]), [np.nan, 0.8])
+    assert cache.purge_expired() == 1
+    assert cache.stats()['entries'] == 1
+
+
+def test_oldest_entries_evicted_past_max_entries(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(hazard_cache, "time", clock)
+    cache = HazardCache(str(tmp_path / "cache.sqlite"), max_entries=3)
+
+    for i in range(5):
+        clock.now += 1
+        cache.put_many('FLOOD', [[i, 0]], [float(i)])
+
+    assert cache.stats()['entries'] == 3
+    np.testing.assert_array_equal(cache.get_many('FLOOD', [[i, 0] for i in range(5)]), [np.nan, np.nan, 2, 3, 4])
+
+
+def test_client_fetches_only_uncached_cells(tmp_path):
+    client = INARISKClient(cache_path=str(tmp_path / "cache.sqlite"))
+    fetched = []
+    client._fetch_batch = lambda url, points, batch_idx: fetched.extend(points) or [1.0] * len(points)
+    points = [(-6.2, 106.8), (-6.21, 106.8)]
+
+    client.get_risk_matrix(points, ['flood'])
+    assert len(fetched) == 2
+    risk = client.get_risk_matrix(points + [(-6.22, 106.8)], ['flood'])
+    assert len(fetched) == 3
+    np.testing.assert_array_equal(risk[:, 0], [1.0, 1.0, 1.0])
@@ -0,0 +1,58 @@
+import numpy as np
+
+from src.hazard_raster import HazardRaster
+from src.inarisk_client import INARISKClient
+
+# 10 x 8 grid of 0.01 degree pixels, top-left corner at (106.0, -6.0)
+TRANSFORM = (106.0, 0.01, -6.0, -0.01)
+
+
+def linear_grid():
+    """Pixel (row, col) holds 2 * col + 3 * row, which bilinear interpolation reproduces exactly"""
+    row, col = np.indices((8, 10))
+    return 2.0 * col + 3.0 * row
+
+
+def test_bilinear_sampling_across_tiles(monkeypatch):
+    monkeypatch.setattr(HazardRaster, "TILE_SIZE", 3)
+    raster = HazardRaster(linear_grid(), TRANSFORM, crs='EPSG:4326')
+    rng = np.random.default_rng(0)
+    lon = 106.0 + rng.uniform(-0.01, 0.11, 200)
+    lat = -6.0 - rng.uniform(-0.01, 0.09, 200)
+
+    values = raster.sample(lat, lon)
+
+    col = (lon - 106.0) / 0.01
+    row = (-6.0 - lat) / 0.01
+    inside = (col >= 0) & (col < 10) & (row >= 0) & (row < 8)
+    # Half a pixel from the border values are clamped to the outer pixel centres
+    expected = 2 * np.clip(col - 0.5, 0, 9) + 3 * np.clip(row - 0.5, 0, 7)
+    np.testing.assert_allclose(values[inside], expected[inside])
+    assert np.isnan(values[~inside]).all()
+
+
+def test_nodata_neighbours_left_out():
+    grid = linear_grid()
+    grid[2:4, 2:4] = -1
+    raster = HazardRaster(grid, TRANSFORM, crs='EPSG:4326', nodata=-1)
+    # Inside the all-nodata block, and midway between the centres of pixels
+    # (1, 1), (1, 2), (2, 1) and the nodata pixel (2, 2)
+    lat = -6.0 - np.array([3.0, 2.0]) * 0.01
+    lon = 106.0 + np.array([3.0, 2.0]) * 0.01
+
+    values = raster.sample(lat, lon)
+    assert np.isnan(values[0])
+    assert np.isclose(values[1], (grid[1, 1] + grid[1, 2] + grid[2, 1]) / 3)
+
+def test_offline_client_samples_npy_raster(tmp_path):
+    raster = HazardRaster(linear_grid(), TRANSFORM, crs='EPSG:4326')
+    raster.save_npy(str(tmp_path / "INDEKS_BAHAYA_BANJIR.npy"))
+    client = INARISKClient(raster_dir=str(tmp_path))
+    client._fetch_batch = None
+    points = [(-6.0123, 106.0456), (-6.05, 106.09), (-7.0, 106.05)]
+
+    risk = client.get_risk_matrix(points, ['flood'])
+    expected = raster.sample([p[0] for p in points], [p[1] for p in points])
+    np.testing.assert_allclose(risk[:2, 0], expected[:2])
+    # Points outside the raster count as 0.0 risk
+    assert risk[2, 0] == 0.0
@@ -0,0 +1,163 @@
+import numpy as np
+
+from src import inarisk_client
+from src.inarisk_client import AdaptiveRateLimiter, INARISKClient
+
+
+class FakeClock:
+    """Stand-in for the time module whose sleeps advance the clock instantly"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class FakeResponse:
+    def __init__(self, status_code, samples=None, retry_after=None):
+        self.status_code = status_code
+        self.headers = {'Retry-After': retry_after} if retry_after else {}
+        self.samples = samples
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {'samples': [{'value': str(value)} for value in self.samples]}
+
+
+def client_with_batches(checkpoint_dir, fail_batches=()):
+    """Client whose batch requests return the batch index, or fail for the given batches"""
+    client = INARISKClient(checkpoint_dir=str(checkpoint_dir), batch_retry_rounds=0)
+    client._fetch_batch = lambda url, points, batch_idx: (
+        None if batch_idx in fail_batches else [float(batch_idx)] * len(points))
+    return client
+
+
+POINTS = [(-6.2 + i * 1e-3, 106.8) for i in range(10)]
+
+
+def test_journal_removed_after_complete_run(tmp_path):
+    risk = client_with_batches(tmp_path).get_risk_matrix(POINTS, ['flood', 'earthquake'], batch_size=4)
+
+    np.testing.assert_array_equal(risk[:, 0], [0, 0, 0, 0, 1, 1, 1, 1, 2, 2])
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_journal_kept_and_resumed_after_failures(tmp_path):
+    client = client_with_batches(tmp_path, fail_batches={1})
+    risk = client.get_risk_matrix(POINTS, ['flood'], batch_size=4)
+
+    assert np.isnan(risk[4:8, 0]).all()
+    assert client.failures['INDEKS_BAHAYA_BANJIR'] == 4
+    assert len(list(tmp_path.iterdir())) == 1
+
+    risk = client_with_batches(tmp_path).get_risk_matrix(POINTS, ['flood'], batch_size=4)
+    np.testing.assert_array_equal(risk[:, 0], [0, 0, 0, 0, 1, 1, 1, 1, 2, 2])
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_journal_kept_when_concurrent_call_succeeds(tmp_path):
+    client = INARISKClient(checkpoint_dir=str(tmp_path), batch_retry_rounds=0)
+    # The second batch of the first point set fails, every batch of the second succeeds
+    client._fetch_batch = lambda url, points, batch_idx: (
+        None if points[0][0] < 1.2e7 and batch_idx == 1 else [1.0] * len(points))
+    other_points = [(lat, 108.0) for lat, _ in POINTS]
+    fetch_risk = client._fetch_risk
+
+    def fetch_risk_then_other_call(meter_points, hazard_layer, batch_size):
+        # A second call completes between this call's fetch and its journal cleanup
+        result = fetch_risk(meter_points, hazard_layer, batch_size)
+        if meter_points[0, 0] < 1.2e7:
+            assert not np.isnan(client.get_risk_matrix(other_points, ['flood'], batch_size=4)).any()
+        return result
+
+    client._fetch_risk = fetch_risk_then_other_call
+    assert np.isnan(client.get_risk_matrix(POINTS, ['flood'], batch_size=4)).sum() == 4
+    assert len(list(tmp_path.iterdir())) == 1
+    assert client.failures['INDEKS_BAHAYA_BANJIR'] == 4
+
+
+def test_rate_limiter_backs_off_and_recovers(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(inarisk_client, "time", clock)
+    limiter = AdaptiveRateLimiter(rate=4.0, min_rate=1.0, max_rate=8.0, increase=1.0)
+
+    limiter.acquire()
+    assert clock.slept == []
+
+    # Throttling halves the rate and pauses every caller for Retry-After seconds
+    limiter.on_throttle(retry_after=3)
+    assert limiter.rate == 2.0
+    limiter.acquire()
+    assert clock.slept == [3.0]
+
+    # The rate never drops below min_rate, and an empty bucket waits for one token
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.rate == 1.0
+    limiter.acquire()
+    assert clock.slept == [3.0, 1.0]
+
+    # Successes raise the rate additively up to max_rate
+    limiter.on_success()
+    assert limiter.rate == 2.0
+    for _ in range(10):
+        limiter.on_success()
+    assert limiter.rate == 8.0
+
+
+def test_fetch_batch_retries_throttled_requests(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(inarisk_client, "time", clock)
+    client = INARISKClient(requests_per_second=4.0)
+    responses = [FakeResponse(429, retry_after='5'), FakeResponse(503), FakeResponse(200, samples=[0.5, ''])]
+    client.session.get = lambda url, params, timeout: responses.pop(0)
+
+    assert client._fetch_batch("url", [[0, 0], [1, 1]], 0) == [0.5, 0.0]
+    assert responses == []
+    # Halved twice, then one additive increase; the 503 waits 2 ** attempt seconds
+    assert client.rate_limiter.rate == 1.0 + client.rate_limiter.increase
+    assert clock.now >= 5 + 2
+
+
+def test_snap_points_dedups_grid_cells():
+    client = INARISKClient()
+    points = np.array(POINTS + POINTS[:3]) + np.array([1e-6, 0])
+
+    unique_points, inverse = client.snap_points(points)
+
+    assert len(unique_points) < len(points)
+    assert len(np.unique(inverse)) == len(unique_points)
+    # Every point lies in the grid cell centred on its snapped point
+    offsets = client.project_points(points) - client.project_points(unique_points[inverse])
+    assert (np.abs(offsets) <= client.grid_resolution / 2 + 1e-6).all()
+    np.testing.assert_array_equal(inverse[-3:], inverse[:3])
+
+
+def test_risk_matrix_columns_follow_hazard_types(tmp_path):
+    from src.hazard_raster import HazardRaster
+
+    HazardRaster(np.full((4, 4), 0.25), (106.0, 1.0, -6.0, -1.0), crs='EPSG:4326').save_npy(
+        str(tmp_path / "INDEKS_BAHAYA_BANJIR.npy"))
+    client = INARISKClient(raster_dir=str(tmp_path))
+    requested = []
+    client._fetch_batch = lambda url, points, batch_idx: (
+        requested.append(url.split('/')[-3]) or [len(url) / 1000] * len(points))
+
+    risk = client.get_risk_matrix(POINTS, ['earthquake', 'flood', 'landslide'], batch_size=4)
+
+    # Local rasters are sampled in-process, only the other layers are requested
+    assert sorted(set(requested)) == sorted({client.hazard_layers['earthquake'], client.hazard_layers['landslide']})
+    assert (risk[:, 1] == 0.25).all()
+    for column, hazard_type in ((0, 'earthquake'), (2, 'landslide')):
+        np.testing.assert_array_equal(risk[:, column], client.get_risk_for_points(POINTS, hazard_type, batch_size=4))
@@ -0,0 +1,120 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.network_processor import NetworkProcessor
+
+
+def write_pycgr(path, nodes, edges, blank_after=()):
+    """Write a PYCGR file, inserting a blank line after the given node lines"""
+    lines = [f"# comment {i}" for i in range(7)]
+    lines += [str(len(nodes)), str(len(edges))]
+    for i, (node_id, lat, lon) in enumerate(nodes):
+        lines.append(f"{node_id} {lat:.7f} {lon:.7f}")
+        if i in blank_after:
+            lines.append("")
+    for source, target, length, street_type, max_speed, bidirectional in edges:
+        lines.append(f"{source} {target} {length} {street_type} {max_speed} {bidirectional}")
+    path.write_text("\n".join(lines) + "\n")
+
+
+def grid_network(n_nodes):
+    nodes = [(i, -6.2 + i * 1e-4, 106.8 + (i % 17) * 1e-4) for i in range(n_nodes)]
+    edges = [(i, i + 1, 11.5 + i, 'residential' if i % 2 else 'primary', 30, 1)
+             for i in range(n_nodes - 1)]
+    return nodes, edges
+
+
+def test_read_pycgr_arrays_matches_line_reader(tmp_path):
+    nodes, edges = grid_network(50)
+    path = tmp_path / "network.pycgrc"
+    write_pycgr(path, nodes, edges)
+
+    processor = NetworkProcessor(network_cache=False)
+    network = processor.read_pycgr_arrays(str(path))
+    nodes_dict, edges_list = processor.read_pycgr_file(str(path))
+
+    assert len(network.nodes) == len(nodes_dict)
+    assert len(network.edges) == len(edges_list)
+    np.testing.assert_array_equal(network.edges['length'], [e['length'] for e in edges_list])
+
+
+def test_read_pycgr_arrays_blank_line_in_node_section(tmp_path):
+    nodes, edges = grid_network(300)
+    path = tmp_path / "network.pycgrc"
+    write_pycgr(path, nodes, edges, blank_after=(120,))
+
+    network = NetworkProcessor(network_cache=False).read_pycgr_arrays(str(path))
+
+    assert len(network.nodes) == len(nodes)
+    np.testing.assert_array_equal(network.nodes['id'], [n[0] for n in nodes])
+    assert len(network.edges) == len(edges)
+    np.testing.assert_array_equal(network.edges['source'], [e[0] for e in edges])
+    np.testing.assert_array_equal(network.edges['length'], [e[2] for e in edges])
+    assert sorted(network.street_types) == ['primary', 'residential']
+
+
+def test_read_pycgr_arrays_skips_malformed_edge_lines(tmp_path):
+    nodes, edges = grid_network(50)
+    path = tmp_path / "network.pycgrc"
+    write_pycgr(path, nodes, edges)
+    lines = path.read_text().splitlines()
+    lines.insert(9 + len(nodes) + 10, "3 4 12.0 track")
+    lines.insert(9 + len(nodes) + 20, "x 4 12.0 track 30 1")
+    path.write_text("\n".join(lines) + "\n")
+
+    processor = NetworkProcessor(network_cache=False)
+    network = processor.read_pycgr_arrays(str(path))
+    _, edges_list = processor.read_pycgr_file(str(path))
+
+    assert len(network.edges) == len(edges) == len(edges_list) - 1
+    np.testing.assert_array_equal(network.edges['source'], [e[0] for e in edges])
+    np.testing.assert_array_equal(network.edges['length'], [e[2] for e in edges])
+    assert sorted(network.street_types) == ['primary', 'residential']
+
+
+def test_network_cache_reused_until_source_changes(tmp_path, capsys):
+    nodes, edges = grid_network(50)
+    path = tmp_path / "network.pycgrc"
+    write_pycgr(path, nodes, edges)
+    processor = NetworkProcessor()
+
+    parsed = processor.read_pycgr_arrays(str(path))
+    cached = processor.read_pycgr_arrays(str(path))
+    assert isinstance(cached.edges, np.memmap)
+    np.testing.assert_array_equal(cached.nodes, parsed.nodes)
+    np.testing.assert_array_equal(cached.edges, parsed.edges)
+    assert cached.street_types == parsed.street_types
+
+    # A touched file with the same content keeps its cache, a changed one is parsed again
+    os.utime(path, (0, 0))
+    assert isinstance(processor.read_pycgr_arrays(str(path)).edges, np.memmap)
+    write_pycgr(path, nodes, edges[:-1])
+    capsys.readouterr()
+    assert len(processor.read_pycgr_arrays(str(path)).edges) == len(edges) - 1
+    assert "Reading PYCGR file" in capsys.readouterr().out
+
+    graph = processor.create_csr_from_pycgr(str(path))
+    np.testing.assert_array_equal(processor.create_csr_from_pycgr(str(path)).weight, graph.weight)
+
+
+def test_subnetwork_paths_match_pairwise(tmp_path):
+    rng = np.random.default_rng(0)
+    size = 15
+    nodes = [(i, -6.2 + (i // size) * 1e-3, 106.8 + (i % size) * 1e-3) for i in range(size * size)]
+    edges = [(i, j, round(rng.uniform(100, 200), 3), 'residential', 30, 1)
+             for i in range(size * size) for j in (i + 1, i + size)
+             if j < size * size and (j == i + size or j % size) and rng.random() > 0.15]
+    path = tmp_path / "grid.pycgrc"
+    write_pycgr(path, nodes, edges)
+    pois = pd.DataFrame({'node_id': [3, 17, 40, 112, 150, 199, 224, 17, np.nan]})
+
+    processor = NetworkProcessor(network_cache=False)
+    for graph in (processor.create_networkx_from_pycgr(str(path)), processor.create_csr_from_pycgr(str(path))):
+        pairwise = processor.create_subnetwork(pois, graph, method='pairwise')
+        for workers in (1, 2):
+            paths = processor.create_subnetwork(pois, graph, method='paths', workers=workers)
+            assert set(paths.nodes) == set(pairwise.nodes)
+            assert set(map(frozenset, paths.edges)) == set(map(frozenset, pairwise.edges))
+        assert len(pairwise) > 7
@@ -0,0 +1,126 @@
+import os
+
+import geopandas as gpd
+import pytest
+
+osmium = pytest.importorskip("osmium")
+from osmium.osm.mutable import Node, Way
+
+from src.osm_pbf import PBFExtract
+
+BBOX = (106.799, -6.201, 106.804, -6.196)
+
+
+@pytest.fixture
+def extract_path(tmp_path):
+    """Small extract: a 4x4 node grid with a shelter node, three roads and two buildings"""
+    path = tmp_path / "small.osm.pbf"
+    writer = osmium.SimpleWriter(str(path))
+    ids = {}
+    for row in range(4):
+        for col in range(4):
+            node_id = len(ids) + 1
+            tags = {'amenity': 'shelter', 'name': 'S1'} if (row, col) == (0, 0) else {}
+            writer.add_node(Node(id=node_id, location=(106.8 + col * 0.001, -6.2 + row * 0.001), tags=tags))
+            ids[row, col] = node_id
+    writer.add_way(Way(id=100, nodes=[ids[0, c] for c in range(4)],
+                       tags={'highway': 'residential', 'name': 'Jl A'}))
+    writer.add_way(Way(id=101, nodes=[ids[3, 0], ids[3, 1]], tags={'highway': 'primary', 'oneway': 'yes'}))
+    writer.add_way(Way(id=102, nodes=[ids[3, 2], ids[3, 3]], tags={'highway': 'construction'}))
+    writer.add_way(Way(id=200, nodes=[ids[1, 0], ids[1, 1], ids[2, 1], ids[2, 0], ids[1, 0]],
+                       tags={'building': 'yes'}))
+    writer.add_way(Way(id=201, nodes=[ids[1, 2], ids[1, 3], ids[2, 3], ids[2, 2], ids[1, 2]],
+                       tags={'building': 'mosque'}))
+    writer.close()
+    return str(path)
+
+
+@pytest.fixture
+def passes(monkeypatch):
+    """Count the passes made over the extract"""
+    opened = []
+
+    class CountingProcessor(osmium.FileProcessor):
+        def __init__(self, *args, **kwargs):
+            opened.append(args[0])
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(osmium, "FileProcessor", CountingProcessor)
+    return opened
+
+
+def test_features_and_roads(extract_path):
+    extract = PBFExtract(extract_path)
+
+    buildings = extract.features(BBOX, {"building": True})
+    assert list(buildings.index) == [('way', 200), ('way', 201)]
+    assert set(buildings.geometry.geom_type) == {'Polygon'}
+
+    shelters = extract.features(BBOX, {"amenity": ["shelter"]})
+    assert list(shelters.index) == [('node', 1)]
+    assert shelters['name'].tolist() == ['S1']
+
+    roads = extract.road_edges(BBOX)
+    assert roads['osmid'].tolist() == [100, 101]
+    assert roads['oneway'].tolist() == [False, True]
+    assert roads['length'].iloc[0] == pytest.approx(331.6, abs=0.5)
+
+
+def test_load_reads_extract_once(extract_path, passes):
+    extract = PBFExtract(extract_path)
+    extract.load(BBOX, [{"building": True}, {"amenity": ["shelter"]}], roads=True)
+    assert len(passes) == 1
+
+    tile = (106.7995, -6.1995, 106.8005, -6.1985)
+    assert list(extract.features(tile, {"building": True}).index) == [('way', 200)]
+    assert len(extract.features(BBOX, {"amenity": ["shelter"]})) == 1
+    assert extract.road_edges(tile).empty
+    assert len(extract.road_edges(BBOX)) == 2
+    assert len(passes) == 1
+
+    # Slices match a fresh read of the same box
+    fresh = PBFExtract(extract_path).features(tile, {"building": True})
+    assert list(fresh.index) == [('way', 200)]
+    assert len(passes) == 2
+
+
+def test_tile_cache_keyed_by_source(extract_path, tmp_path, monkeypatch):
+    from src import poi_collector
+
+    collector = poi_collector.POICollector(output_dir=str(tmp_path / "out"), tiled=True, osm_pbf=extract_path)
+    tags = {"building": True}
+    assert len(collector._fetch_tile(BBOX, tags)) == 2
+
+    # Replacing the extract invalidates its tiles
+    writer = osmium.SimpleWriter(extract_path, overwrite=True)
+    writer.add_node(Node(id=1, location=(106.8, -6.2), tags={'building': 'yes'}))
+    writer.close()
+    collector.pbf = PBFExtract(extract_path)
+    assert list(collector._fetch_tile(BBOX, tags).index) == [('node', 1)]
+
+    # Overpass tiles do not reuse PBF tiles and expire after the TTL
+    requests = []
+    monkeypatch.setattr(poi_collector.ox, "features_from_bbox",
+                        lambda bbox, tags: requests.append(bbox) or gpd.GeoDataFrame())
+    collector.pbf = None
+    collector._fetch_tile(BBOX, tags)
+    collector._fetch_tile(BBOX, tags)
+    assert len(requests) == 1
+    for name in os.listdir(collector.tile_cache_dir):
+        os.utime(os.path.join(collector.tile_cache_dir, name), (0, 0))
+    collector._fetch_tile(BBOX, tags)
+    assert len(requests) == 2
+
+
+def test_streamed_buildings_read_per_tile(extract_path, tmp_path, passes):
+    from src.poi_collector import POICollector
+
+    collector = POICollector(output_dir=str(tmp_path / "out"), osm_pbf=extract_path, stream_buildings=True,
+                             tile_size_km=0.2)
+    collector.collect_pois(-6.1985, 106.8015, 0.3, ['buildings', 'roads'], assess_risks=False)
+
+    # The up-front pass decodes the roads only; each building tile is its own pass, not kept in memory
+    assert list(collector.pbf._loaded) == ['roads']
+    assert len(passes) == 1 + 9
+    buildings = gpd.read_file(tmp_path / "out" / "buildings.gpkg")
+    assert sorted(buildings['id']) == [200, 201]
@@ -0,0 +1,140 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import LineString, Point
+
+from src import poi_collector
+from src.poi_collector import POICollector
+from src.poi_collector_csv import CSVPOICollector
+
+
+def assess_with_recorded_points(collector, gdf):
+    """Assess risks with a client returning each point's latitude, recording the queried points"""
+    queried = []
+
+    def get_risk_matrix(points, hazard_types, batch_size=20):
+        points = np.asarray(points)
+        queried.append(points)
+        return np.repeat(points[:, :1], len(hazard_types), axis=1)
+
+    collector.inarisk_client.get_risk_matrix = get_risk_matrix
+    return collector._assess_hazard_risks(gdf), queried[0]
+
+
+def test_sampled_lines_skip_representative_point(tmp_path):
+    gdf = gpd.GeoDataFrame(geometry=[
+        LineString([(106.8, -6.2), (106.8, -6.199)]),
+        Point(106.81, -6.3),
+    ], crs="EPSG:4326")
+
+    for collector_class in (POICollector, CSVPOICollector):
+        collector = collector_class(output_dir=str(tmp_path), hazard_types=['flood'], snap_points=False,
+                                    road_sample_spacing=50)
+        result, queried = assess_with_recorded_points(collector, gdf.copy())
+
+        # The point, then samples at the line's ends and every ~50 m in between
+        assert len(queried) == 1 + 4
+        np.testing.assert_allclose(queried[0], (-6.3, 106.81))
+        assert not np.isclose(queried[1:, 0], -6.1995).any()
+        np.testing.assert_allclose(result['flood_risk'], [-6.199, -6.3])
+
+
+def test_tiled_overpass_requests_bounded_by_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(poi_collector, "cpu_count", lambda: 8)
+    collector = POICollector(output_dir=str(tmp_path), tiled=True, workers=2, tile_size_km=0.2)
+    lock, in_flight, peak = threading.Lock(), [0], [0]
+
+    def features_from_bbox(bbox, tags):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.01)
+        with lock:
+            in_flight[0] -= 1
+        return gpd.GeoDataFrame({'name': ['x']}, geometry=[Point(bbox[0], bbox[1])], crs="EPSG:4326",
+                                index=[('node', hash((bbox, str(tags))))])
+
+    monkeypatch.setattr(poi_collector.ox, "features_from_bbox", features_from_bbox)
+    # Two POI types fetched in parallel, as collect_pois does, each splitting into 9 tiles
+    with ThreadPoolExecutor(max_workers=2) as io_pool:
+        results = list(io_pool.map(lambda tags: collector._features_from_point(-6.2, 106.8, 300, tags),
+                                   [{"building": True}, {"amenity": ["shelter"]}]))
+
+    assert [len(features) for features in results] == [9, 9]
+    assert peak[0] == 2
+
+
+def test_streamed_buildings_written_once_across_tiles(tmp_path, monkeypatch):
+    collector = POICollector(output_dir=str(tmp_path), hazard_types=['flood'], snap_points=False,
+                             stream_buildings=True, tile_size_km=0.2, chunk_size=3)
+    collector.inarisk_client.get_risk_matrix = lambda points, hazard_types, batch_size=20: (
+        np.asarray(points)[:, :1].repeat(len(hazard_types), axis=1))
+
+    # Buildings every ~70 m across the area, many crossing tile borders
+    centres = np.stack(np.meshgrid(np.linspace(106.798, 106.802, 7), np.linspace(-6.202, -6.198, 7)), -1)
+    buildings = gpd.GeoDataFrame(
+        {'building': 'yes', 'name': [f'B{i}' for i in range(49)]},
+        geometry=[Point(x, y).buffer(2e-4, cap_style='square') for x, y in centres.reshape(-1, 2)],
+        index=pd.MultiIndex.from_tuples([('way', i) for i in range(49)], names=['element', 'id']),
+        crs="EPSG:4326")
+    monkeypatch.setattr(poi_collector.ox, "features_from_bbox",
+                        lambda bbox, tags: buildings[buildings.intersects(shapely.box(*bbox))])
+
+    output_file = collector._stream_buildings(-6.2, 106.8, 300)
+
+    written = gpd.read_file(output_file)
+    assert sorted(written['id']) == list(range(49))
+    np.testing.assert_allclose(written['flood_risk'], shapely.get_y(shapely.centroid(written.geometry.values)), atol=1e-9)
+
+
+def test_shelters_classified_by_first_matching_category(tmp_path):
+    collector = POICollector(output_dir=str(tmp_path))
+    pois = pd.DataFrame({
+        'emergency': ['assembly_point', None, None, None, None, None],
+        'amenity': ['hospital', 'community_centre', None, 'clinic', 'place_of_worship', None],
+        'building': ['mosque', 'hospital', 'public', 'church', None, 'religious'],
+    })
+
+    assert collector._classify_shelters(pois).tolist() == [
+        'emergency', 'community', 'public_building', 'healthcare', 'worship', 'worship']
+    # Tag keys missing from the features are ignored
+    assert collector._classify_shelters(pois[['building']]).tolist() == [
+        'worship', 'healthcare', 'public_building', 'worship', 'other', 'worship']
+
+
+class NoVisualizer:
+    def __init__(self, output_dir):
+        pass
+
+    def create_risk_maps(self, results, latitude, longitude):
+        pass
+
+
+def test_parallel_collection_matches_sequential(tmp_path, monkeypatch):
+    monkeypatch.setattr(poi_collector, "cpu_count", lambda: 8)
+    monkeypatch.setattr(poi_collector, "POIVisualizer", NoVisualizer)
+    features = {
+        'shelter': gpd.GeoDataFrame({'name': ['S1', 'S2']}, geometry=[Point(106.8, -6.2), Point(106.81, -6.21)],
+                                    crs="EPSG:4326"),
+        'roads': gpd.GeoDataFrame({'highway': ['primary']}, geometry=[LineString([(106.8, -6.2), (106.8, -6.19)])],
+                                  crs="EPSG:4326"),
+    }
+
+    results = []
+    for parallel in (False, True):
+        collector = POICollector(output_dir=str(tmp_path / str(parallel)), hazard_types=['flood'],
+                                 snap_points=False, parallel=parallel, workers=2)
+        collector._process_poi_type = lambda args: (args[0], features[args[0]].copy())
+        collector.inarisk_client.get_risk_matrix = lambda points, hazard_types, batch_size=20: (
+            np.asarray(points)[:, :1].repeat(len(hazard_types), axis=1))
+        results.append(collector.collect_pois(-6.2, 106.8, 1, ['shelter', 'roads']))
+
+    assert sorted(results[0]) == sorted(results[1]) == ['roads', 'shelter']
+    for poi_type in results[0]:
+        pd.testing.assert_frame_equal(results[0][poi_type], results[1][poi_type])
+        assert (tmp_path / "True" / f"{poi_type}.geojson").exists()
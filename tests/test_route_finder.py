@@ -0,0 +1,119 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from src.contraction_hierarchy import ContractionHierarchy
+from src.route_finder import RouteFinder
+
+
+def assert_same_routes(expected, actual):
+    pd.testing.assert_frame_equal(expected.drop(columns='path'), actual.drop(columns='path'),
+                                  check_exact=False, rtol=1e-9)
+    for expected_path, actual_path in zip(expected['path'], actual['path']):
+        np.testing.assert_allclose(np.asarray(expected_path, dtype=float), np.asarray(actual_path, dtype=float))
+
+
+def test_hierarchy_routes_match_csr(route_files, tmp_path, monkeypatch):
+    csr = RouteFinder(*route_files, backend='csr')
+    hierarchy_file = str(tmp_path / "roads.ch.npz")
+    ch = RouteFinder(*route_files, backend='csr', hierarchy=hierarchy_file)
+
+    for max_routes in (3, 0):
+        assert_same_routes(csr.find_best_routes(max_routes=max_routes), ch.find_best_routes(max_routes=max_routes))
+    assert_same_routes(csr.find_best_routes(one_to_many=False), ch.find_best_routes(one_to_many=False))
+
+    # A rerun on the same network and weights reuses the stored customization
+    monkeypatch.setattr(ContractionHierarchy, "customized", None)
+    rerun = RouteFinder(*route_files, backend='csr', hierarchy=hierarchy_file)
+    assert_same_routes(csr.find_best_routes(), rerun.find_best_routes())
+
+
+def test_one_to_many_matches_pair_queries(route_files):
+    finder = RouteFinder(*route_files)
+
+    routes = finder.find_best_routes()
+    assert len(routes) > 0
+    assert_same_routes(finder.find_best_routes(one_to_many=False), routes)
+
+
+def test_csr_routes_match_networkx(route_files):
+    networkx = RouteFinder(*route_files)
+    csr = RouteFinder(*route_files, backend='csr')
+
+    for max_routes in (3, 0):
+        assert_same_routes(networkx.find_best_routes(max_routes=max_routes),
+                           csr.find_best_routes(max_routes=max_routes))
+    assert_same_routes(networkx.find_best_routes(one_to_many=False), csr.find_best_routes(one_to_many=False))
+
+
+def test_nearest_nodes_match_brute_force(route_files):
+    for backend in ('networkx', 'csr'):
+        finder = RouteFinder(*route_files, backend=backend)
+        coords = finder.graph.coords if backend == 'csr' else np.array(list(finder.G.nodes()))
+        points = np.vstack((finder._centroid_points(finder.villages), finder._centroid_points(finder.shelters)))
+
+        nearest = np.argmin(np.hypot(*(points[:, None] - coords[None]).transpose(2, 0, 1)), axis=1)
+        snapped = list(finder.village_nodes) + list(finder.shelter_nodes)
+        if backend == 'csr':
+            np.testing.assert_array_equal(snapped, nearest)
+        else:
+            assert snapped == [tuple(coords[i]) for i in nearest]
+
+
+def test_road_network_matches_per_segment_loop(route_files, tmp_path):
+    roads = gpd.read_file(route_files[0])
+    # Multi-vertex and multi-part roads, and a road without a risk value
+    roads.loc[0, 'geometry'] = shapely.LineString([(106.8, -6.2), (106.8005, -6.2003), (106.801, -6.2)])
+    roads.loc[1, 'geometry'] = shapely.MultiLineString([[(106.81, -6.2), (106.811, -6.2)],
+                                                        [(106.812, -6.2), (106.813, -6.201)]])
+    roads.loc[2, 'flood_risk'] = np.nan
+    roads.to_file(tmp_path / "mixed_roads.geojson")
+    finder = RouteFinder(str(tmp_path / "mixed_roads.geojson"), *route_files[1:])
+
+    expected = {}
+    for _, road in roads.iterrows():
+        weight = {'primary': 1.0, 'secondary': 0.9, 'residential': 0.7, 'service': 0.6, 'path': 0.3}[road['highway']]
+        risk = 0 if np.isnan(road['flood_risk']) else road['flood_risk']
+        for part in getattr(road.geometry, 'geoms', [road.geometry]):
+            coords = list(part.coords)
+            for start, end in zip(coords[:-1], coords[1:]):
+                distance = np.hypot(start[0] - end[0], start[1] - end[1])
+                expected[frozenset((start, end))] = distance / weight * (1 + risk)
+
+    assert finder.G.number_of_edges() == len(expected)
+    for u, v, data in finder.G.edges(data=True):
+        assert np.isclose(data['weight'], expected[frozenset((u, v))])
+
+
+def test_parallel_routes_match_sequential(route_files):
+    for backend in ('networkx', 'csr'):
+        finder = RouteFinder(*route_files, backend=backend)
+        assert_same_routes(finder.find_best_routes(), finder.find_best_routes_parallel(workers=2))
+        assert sum(stats['villages'] for stats in finder.worker_stats) == len(finder.villages)
+
+
+def test_edge_snapping_no_farther_than_node_snapping(route_files):
+    by_node = RouteFinder(*route_files, backend='csr')
+    by_edge = RouteFinder(*route_files, backend='csr', snap='edge')
+    points = np.vstack((by_node._centroid_points(by_node.villages), by_node._centroid_points(by_node.shelters)))
+
+    def snap_distances(finder):
+        nodes = np.concatenate((finder.village_nodes, finder.shelter_nodes))
+        return np.hypot(*(points - finder.graph.coords[nodes]).T)
+
+    assert (snap_distances(by_edge) <= snap_distances(by_node) + 1e-12).all()
+    assert (snap_distances(by_edge) < snap_distances(by_node)).any()
+    # Split pieces keep the network's total weight
+    assert np.isclose(by_edge.graph.weight.sum(), by_node.graph.weight.sum())
+    assert_same_routes(RouteFinder(*route_files, snap='edge').find_best_routes(), by_edge.find_best_routes())
+
+
+def test_worker_stats_aggregate_chunks_per_worker():
+    chunk_results = [([{}, {}], 20, 2, 1.0), ([{}], 10, 3, 0.5), ([], 20, 1, 1.0), ([{}], 30, 1, 0.0)]
+
+    stats = RouteFinder._summarize_worker_stats(chunk_results)
+
+    assert [(s['worker'], s['pid'], s['villages'], s['routes']) for s in stats] == [
+        (1, 10, 3, 1), (2, 20, 3, 2), (3, 30, 1, 1)]
+    assert [s['villages_per_second'] for s in stats] == [6.0, 1.5, 0.0]
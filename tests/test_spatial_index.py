@@ -0,0 +1,65 @@
+import numpy as np
+
+from src.spatial_index import EdgeIndex, NodeIndex, haversine_meters
+
+
+def random_lon_lat(rng, n, centre=(106.8, -6.2), spread=0.05):
+    return np.column_stack((centre[0] + rng.uniform(-spread, spread, n), centre[1] + rng.uniform(-spread, spread, n)))
+
+
+def brute_force_distances(points, nodes):
+    return haversine_meters(points[:, None, 0], points[:, None, 1], nodes[None, :, 0], nodes[None, :, 1])
+
+
+def test_haversine_nearest_matches_brute_force():
+    rng = np.random.default_rng(0)
+    nodes = random_lon_lat(rng, 500)
+    points = random_lon_lat(rng, 200, spread=0.06)
+    # Across the antimeridian, where lon/lat euclidean distances are wrong
+    nodes = np.vstack((nodes, [[179.9999, 0.0], [-179.9, 0.0]]))
+    points = np.vstack((points, [[-179.9999, 0.0]]))
+    index = NodeIndex(nodes, metric='haversine')
+
+    distances, indices = index.query(points)
+
+    expected = brute_force_distances(points, nodes)
+    np.testing.assert_array_equal(indices, expected.argmin(axis=1))
+    np.testing.assert_allclose(distances, expected.min(axis=1), rtol=1e-9, atol=1e-6)
+
+
+def test_haversine_k_nearest_and_max_distance():
+    rng = np.random.default_rng(1)
+    nodes = random_lon_lat(rng, 300)
+    points = random_lon_lat(rng, 50)
+    index = NodeIndex(nodes, keys=[f"n{i}" for i in range(len(nodes))], metric='haversine')
+
+    expected = np.argsort(brute_force_distances(points, nodes), axis=1)[:, :4]
+    assert index.k_nearest(points, 4) == [[f"n{i}" for i in row] for row in expected]
+
+    distances, indices = index.query(points, max_distance=150)
+    nearest = brute_force_distances(points, nodes).min(axis=1)
+    assert ((nearest <= 150) == (indices < len(nodes))).all()
+    assert np.isinf(distances[nearest > 150]).all()
+
+
+def test_edge_snap_matches_brute_force_projection():
+    rng = np.random.default_rng(2)
+    start = rng.uniform(0, 100, (300, 2))
+    end = start + rng.normal(0, 3, (300, 2))
+    # A few long edges, indexed as several pieces
+    end[:5] = start[:5] + rng.uniform(-80, 80, (5, 2))
+    points = rng.uniform(0, 100, (200, 2))
+
+    edge, fraction, projected, distance = EdgeIndex(start, end).snap(points)
+
+    delta = end - start
+    t = np.clip(np.einsum('pek,ek->pe', points[:, None] - start[None], delta) / (delta ** 2).sum(axis=1), 0, 1)
+    closest = start[None] + t[..., None] * delta[None]
+    brute = np.hypot(*(points[:, None] - closest).transpose(2, 0, 1))
+    np.testing.assert_allclose(distance, brute.min(axis=1), atol=1e-9)
+    np.testing.assert_allclose(projected, start[edge] + fraction[:, None] * delta[edge], atol=1e-9)
+
+    # Points beyond max_distance are left unsnapped
+    edge, _, _, distance = EdgeIndex(start, end).snap(points, max_distance=1.0)
+    assert ((edge >= 0) == (brute.min(axis=1) <= 1.0)).all()
+    assert np.isinf(distance[edge < 0]).all()